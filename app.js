@@ -50,6 +50,7 @@ const appData = {
 let currentUser = null;
 let charts = {};
 let updateInterval = null;
+let liveStream = null;
 
 // Initialize Application
 document.addEventListener('DOMContentLoaded', function() {
@@ -430,12 +431,42 @@ function approveSchedule() {
 }
 
 function startRealTimeUpdates() {
+  // With a backend session, let the server push changes instead of polling
+  const token = localStorage.getItem('auth_token');
+  if (token && window.EventSource) {
+    liveStream = new EventSource(`http://localhost:5000/api/live-stream?jwt=${encodeURIComponent(token)}`);
+    const applyLive = (event) => {
+      const live = JSON.parse(event.data);
+      if (live.active_buses !== undefined) {
+        appData.dashboard_stats.active_buses = live.active_buses;
+      }
+      updateDashboardData();
+    };
+    liveStream.addEventListener('snapshot', applyLive);
+    liveStream.addEventListener('delta', applyLive);
+    liveStream.onerror = () => {
+      if (liveStream.readyState === EventSource.CLOSED) {
+        liveStream = null;
+        startLocalUpdates();
+      }
+    };
+    return;
+  }
+
+  startLocalUpdates();
+}
+
+function startLocalUpdates() {
   updateInterval = setInterval(() => {
     updateDashboardData();
   }, 30000); // Update every 30 seconds
 }
 
 function stopRealTimeUpdates() {
+  if (liveStream) {
+    liveStream.close();
+    liveStream = null;
+  }
   if (updateInterval) {
     clearInterval(updateInterval);
     updateInterval = null;
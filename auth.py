@@ -0,0 +1,362 @@
+"""
+Login fast path: bounded password hashing, cached lookups, batched writes.
+
+Passwords are hashed with PASSWORD_HASH_METHOD, pinned to werkzeug's
+pbkdf2:sha256 (600k iterations on werkzeug 2.3, ~0.25 s of CPU per check)
+rather than left to whatever default the installed werkzeug picks.
+Checks run in a fixed-size thread pool; hashlib.pbkdf2_hmac releases the
+GIL, so they use every core without letting a login storm queue unbounded
+work. Stored hashes carry their own method, so older rows still verify. Logins beyond max_pending fail
+fast with Busy so the client can retry. Active users are cached by
+username for a short TTL (unknown usernames are not), and a successful
+check is remembered under a keyed digest of (user, hash, password) so a
+conductor logging in again on another device skips pbkdf2. Both caches are
+LRU-capped at MAX_CACHED_ENTRIES.
+
+Session rows, last_login stamps and logouts are not written on the
+request path. They are queued and a flusher thread writes each batch in
+one transaction, so a burst of logins costs a handful of commits instead
+of one write-locked commit per login. Rows carry the time of the event,
+not of the flush; call flush() before reading them back.
+"""
+
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime, timezone
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import database
+import metrics
+
+ROLE_PERMISSIONS = {
+    'admin': ('read', 'write', 'delete', 'manage_users', 'approve_schedules'),
+    'manager': ('read', 'write', 'approve_schedules'),
+    'operator': ('read', 'update_status'),
+    'viewer': ('read',),
+}
+DEFAULT_PERMISSIONS = ('read',)
+
+# Sizing of the hash pool assumes this method; see the module docstring
+PASSWORD_HASH_METHOD = 'pbkdf2:sha256'
+DEFAULT_HASH_WORKERS = os.cpu_count() or 1
+DEFAULT_MAX_PENDING = 64
+DEFAULT_HASH_TIMEOUT_SECONDS = 10
+DEFAULT_USER_CACHE_SECONDS = 60
+DEFAULT_VERIFIED_CACHE_SECONDS = 900
+DEFAULT_FLUSH_SECONDS = 0.5
+FLUSH_BATCH_SIZE = 500
+# Cached users and remembered logins each: expired entries are pruned, then the least recently used
+MAX_CACHED_ENTRIES = 10000
+
+USER_COLUMNS = ('id', 'username', 'password_hash', 'role', 'department', 'email')
+
+logger = logging.getLogger('transport.auth')
+
+
+class Busy(Exception):
+    """Too many password checks are already queued"""
+
+
+def get_permissions(role):
+    """Permissions granted to a role (shared tuple, do not mutate)"""
+    return ROLE_PERMISSIONS.get(role, DEFAULT_PERMISSIONS)
+
+
+def hash_password(password):
+    """Hash a new password with the pinned PASSWORD_HASH_METHOD"""
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+
+def _timestamp():
+    # Same format and timezone as SQLite's CURRENT_TIMESTAMP
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class Authenticator:
+    """Checks credentials against cached users on a bounded hashing pool"""
+
+    def __init__(self, workers=DEFAULT_HASH_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 user_ttl=DEFAULT_USER_CACHE_SECONDS, verified_ttl=DEFAULT_VERIFIED_CACHE_SECONDS,
+                 timeout=DEFAULT_HASH_TIMEOUT_SECONDS):
+        self.workers = max(1, workers)
+        self.user_ttl = user_ttl
+        self.verified_ttl = verified_ttl
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._executor = None
+        self._lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._users = OrderedDict()
+        self._verified = OrderedDict()
+        # Per-process key, so remembered digests are useless outside this process
+        self._key = secrets.token_bytes(32)
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='auth-hash')
+            return self._executor
+
+    def _cached(self, cache, key):
+        """Unexpired value for key, marking it recently used"""
+        with self._cache_lock:
+            entry = cache.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            cache.move_to_end(key)
+            return entry[1]
+
+    def _remember(self, cache, key, value, ttl):
+        with self._cache_lock:
+            now = time.monotonic()
+            cache[key] = (now + ttl, value)
+            cache.move_to_end(key)
+            if len(cache) > MAX_CACHED_ENTRIES:
+                for stale in [k for k, (expires, _) in cache.items() if expires <= now]:
+                    del cache[stale]
+                while len(cache) > MAX_CACHED_ENTRIES:
+                    cache.popitem(last=False)
+
+    def get_user(self, conn, username):
+        """Active user row as a dict, or None; found users are cached for user_ttl seconds"""
+        user = self._cached(self._users, username)
+        if user is not None:
+            return user
+        row = conn.execute(
+            f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE username = ? AND is_active = TRUE", (username,)
+        ).fetchone()
+        if row is None:
+            # Not cached: arbitrary usernames from the login form must not grow the cache
+            return None
+        user = dict(zip(USER_COLUMNS, row))
+        self._remember(self._users, username, user, self.user_ttl)
+        return user
+
+    def _digest(self, user, password):
+        message = '\0'.join((user['id'], user['password_hash'], password)).encode()
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    def check_password(self, user, password):
+        """Verify password against user's hash; raises Busy when the pool is saturated"""
+        digest = self._digest(user, password) if self.verified_ttl > 0 else None
+        if digest is not None and self._cached(self._verified, digest):
+            self.hits += 1
+            return True
+        self.misses += 1
+
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise Busy()
+        try:
+            future = self._get_executor().submit(check_password_hash, user['password_hash'], password)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The permit is held until the hash finishes, even when this request stops waiting for it
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            valid = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise Busy()
+
+        if valid and digest is not None:
+            self._remember(self._verified, digest, True, self.verified_ttl)
+        return valid
+
+    def authenticate(self, conn, username, password):
+        """The user dict when the credentials are valid, else None"""
+        user = self.get_user(conn, username)
+        if user is None or not self.check_password(user, password):
+            return None
+        return user
+
+    def invalidate(self, username=None):
+        """Forget cached users (all of them when username is None) and remembered logins"""
+        with self._cache_lock:
+            if username is None:
+                self._users.clear()
+            else:
+                self._users.pop(username, None)
+            self._verified.clear()
+
+    def stats(self):
+        return {'workers': self.workers, 'cached_users': len(self._users), 'verified_hits': self.hits,
+                'verified_misses': self.misses, 'rejected': self.rejected}
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+class SessionWriter:
+    """Write-behind queue for session rows, last_login stamps and logouts"""
+
+    def __init__(self, interval=DEFAULT_FLUSH_SECONDS, batch_size=FLUSH_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sessions = []
+        self._logouts = []
+        self._last_login = {}
+        self._thread = None
+        self._stopped = False
+        self.flushes = 0
+        self.rows_written = 0
+
+    def record_login(self, user_id, ip_address=None, user_agent=None):
+        """Queue a session row and last_login stamp; returns the new session id"""
+        session_id = str(uuid.uuid4())
+        now = _timestamp()
+        with self._lock:
+            self._sessions.append((session_id, user_id, now, ip_address, user_agent))
+            self._last_login[user_id] = now
+            pending = len(self._sessions)
+        self._ensure_started()
+        if pending >= self.batch_size:
+            self._wake.set()
+        return session_id
+
+    def record_logout(self, session_id):
+        with self._lock:
+            self._logouts.append((_timestamp(), session_id))
+        self._ensure_started()
+
+    def pending_last_login(self, user_id):
+        """last_login of a login not yet flushed, or None"""
+        with self._lock:
+            return self._last_login.get(user_id)
+
+    def pending(self):
+        with self._lock:
+            return len(self._sessions) + len(self._logouts)
+
+    def flush(self):
+        """Write everything queued so far in one transaction; returns the number of rows"""
+        with self._flush_lock:
+            with self._lock:
+                sessions, self._sessions = self._sessions, []
+                logouts, self._logouts = self._logouts, []
+                last_login, self._last_login = self._last_login, {}
+            if not (sessions or logouts or last_login):
+                return 0
+            try:
+                with metrics.profiled('auth:flush_sessions'), database.get_pool().connection() as conn:
+                    with database.transaction(conn) as cursor:
+                        cursor.executemany("""
+                        INSERT OR IGNORE INTO user_sessions (id, user_id, login_time, ip_address, user_agent)
+                        VALUES (?, ?, ?, ?, ?)
+                        """, sessions)
+                        cursor.executemany("""
+                        UPDATE users SET last_login = ? WHERE id = ? AND (last_login IS NULL OR last_login < ?)
+                        """, [(stamp, user_id, stamp) for user_id, stamp in last_login.items()])
+                        # After the inserts, so a logout queued right behind its login still finds the row
+                        cursor.executemany("UPDATE user_sessions SET logout_time = ? WHERE id = ?", logouts)
+            except Exception:
+                # Put the batch back for the next attempt, ahead of anything queued meanwhile
+                with self._lock:
+                    self._sessions[:0] = sessions
+                    self._logouts[:0] = logouts
+                    for user_id, stamp in last_login.items():
+                        self._last_login[user_id] = max(stamp, self._last_login.get(user_id, stamp))
+                raise
+            written = len(sessions) + len(last_login) + len(logouts)
+            self.flushes += 1
+            self.rows_written += written
+            return written
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stopped:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='auth-session-writer', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Session flush failed; retrying on the next tick")
+
+    def stats(self):
+        return {'pending': self.pending(), 'flushes': self.flushes, 'rows_written': self.rows_written}
+
+    def shutdown(self):
+        """Stop the flusher and write whatever is still queued"""
+        self._stopped = True
+        self._wake.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+        self.flush()
+
+
+_authenticator = None
+_session_writer = None
+
+
+def configure(workers=DEFAULT_HASH_WORKERS, max_pending=DEFAULT_MAX_PENDING, user_ttl=DEFAULT_USER_CACHE_SECONDS,
+              verified_ttl=DEFAULT_VERIFIED_CACHE_SECONDS, flush_interval=DEFAULT_FLUSH_SECONDS):
+    """Create (or replace) the process-wide authenticator and session writer"""
+    global _authenticator, _session_writer
+    if _authenticator is not None:
+        _authenticator.shutdown()
+    if _session_writer is not None:
+        _session_writer.shutdown()
+    _authenticator = Authenticator(workers, max_pending, user_ttl, verified_ttl)
+    _session_writer = SessionWriter(flush_interval)
+    return _authenticator
+
+
+def get_authenticator():
+    if _authenticator is None:
+        configure()
+    return _authenticator
+
+
+def get_session_writer():
+    if _session_writer is None:
+        configure()
+    return _session_writer
+
+
+def shutdown():
+    """Flush queued session writes and stop the hashing pool"""
+    if _session_writer is not None:
+        _session_writer.shutdown()
+    if _authenticator is not None:
+        _authenticator.shutdown()
+
+
+def init_app(app):
+    """Configure the login pipeline from AUTH_* settings"""
+    app.config.setdefault('AUTH_HASH_WORKERS', int(os.environ.get('TRANSPORT_AUTH_WORKERS', DEFAULT_HASH_WORKERS)))
+    app.config.setdefault('AUTH_MAX_PENDING', int(os.environ.get('TRANSPORT_AUTH_MAX_PENDING', DEFAULT_MAX_PENDING)))
+    app.config.setdefault('AUTH_USER_CACHE_SECONDS', DEFAULT_USER_CACHE_SECONDS)
+    app.config.setdefault('AUTH_VERIFIED_CACHE_SECONDS',
+                          int(os.environ.get('TRANSPORT_AUTH_VERIFIED_CACHE_SECONDS', DEFAULT_VERIFIED_CACHE_SECONDS)))
+    app.config.setdefault('AUTH_SESSION_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS)
+    return configure(app.config['AUTH_HASH_WORKERS'], app.config['AUTH_MAX_PENDING'],
+                     app.config['AUTH_USER_CACHE_SECONDS'], app.config['AUTH_VERIFIED_CACHE_SECONDS'],
+                     app.config['AUTH_SESSION_FLUSH_SECONDS'])
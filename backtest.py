@@ -0,0 +1,299 @@
+"""
+Rolling-origin backtest of demand forecasts.
+
+Replays recorded demand history from the demand cube: each fold lets every model
+variant see only the days before its test window and forecast the next
+--horizon days. Errors are aggregated into MAPE and RMSE per route and hour.
+Each variant's wall-clock time and peak traced memory are stored with the
+results in backtest_runs and backtest_route_hour_errors, where the
+dashboard reads them.
+
+    python backtest.py --train-days 21 --horizon 1
+    python backtest.py --variants rule_based demand_model --no-save
+"""
+
+import argparse
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+
+import demand_cube
+import demand_model
+import prediction_engine
+from database import transaction
+from route_registry import load_registry
+
+HOURS_PER_DAY = 24
+VARIANTS = ('rule_based', 'seasonal_naive', 'demand_model')
+DEFAULT_VARIANT = 'demand_model'
+DEFAULT_TRAIN_DAYS = demand_model.MIN_HISTORY_DAYS + 7
+DEFAULT_HORIZON = 1
+DEFAULT_STEP = 1
+
+
+@dataclass
+class History:
+    """Observed demand as (routes, days, hours) with the factors recorded for each day"""
+    route_ids: list
+    dates: list
+    actual: np.ndarray
+    weather: np.ndarray
+    festival: np.ndarray
+    market: np.ndarray
+
+
+@dataclass
+class VariantResult:
+    variant: str
+    folds: int
+    samples: int
+    mape: float
+    rmse: float
+    wall_seconds: float
+    peak_memory_kb: float
+    route_hour_samples: np.ndarray
+    route_hour_mape: np.ndarray
+    route_hour_rmse: np.ndarray
+
+    @property
+    def accuracy(self):
+        return None if self.mape is None else round(max(0.0, 100.0 * (1.0 - self.mape)), 2)
+
+
+def load_history(conn, route_ids, start=None, end=None):
+    """Observed (non-predicted) demand between start and end, default all complete days, from the demand cube"""
+    end = end or date.today() - timedelta(days=1)
+    cube = demand_cube.refresh(conn)
+    if start is None:
+        recorded = np.flatnonzero((cube.counts >= 0).any(axis=(0, 2))) if cube is not None else []
+        start = cube.start + timedelta(days=int(recorded[0])) if len(recorded) else end
+    dates = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    if cube is not None:
+        actual, festival, market = cube.history(route_ids, start, end)
+    else:
+        actual = np.full((len(route_ids), len(dates), HOURS_PER_DAY), np.nan)
+        festival, market = np.ones(len(dates)), np.ones((len(route_ids), len(dates)))
+
+    weather_by_day = demand_model.weather_history(conn)
+    weather = np.array([weather_by_day.get(day.isoformat(), 1.0) or 1.0 for day in dates])
+    return History(list(route_ids), dates, actual, weather, festival, market)
+
+
+def fold_starts(day_count, train_days, horizon, step):
+    """Index of the first test day of each fold"""
+    return list(range(train_days, day_count - horizon + 1, step))
+
+
+class ErrorAccumulator:
+    """Running per route-hour absolute-percentage and squared errors"""
+
+    def __init__(self, route_count):
+        shape = (route_count, HOURS_PER_DAY)
+        self.samples = np.zeros(shape, dtype=np.int64)
+        self.pct_samples = np.zeros(shape, dtype=np.int64)
+        self.abs_pct = np.zeros(shape)
+        self.squared = np.zeros(shape)
+
+    def add(self, predicted, actual):
+        """predicted and actual are (routes, days, hours); NaN cells are skipped"""
+        valid = ~(np.isnan(predicted) | np.isnan(actual))
+        error = np.where(valid, predicted - actual, 0.0)
+        positive = valid & (actual > 0)
+        self.samples += valid.sum(axis=1)
+        self.squared += (error ** 2).sum(axis=1)
+        self.pct_samples += positive.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.abs_pct += np.where(positive, np.abs(error) / actual, 0.0).sum(axis=1)
+
+    def totals(self):
+        samples = int(self.samples.sum())
+        pct_samples = int(self.pct_samples.sum())
+        mape = float(self.abs_pct.sum() / pct_samples) if pct_samples else None
+        rmse = float(np.sqrt(self.squared.sum() / samples)) if samples else None
+        return samples, mape, rmse
+
+    def by_route_hour(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mape = np.where(self.pct_samples > 0, self.abs_pct / np.maximum(self.pct_samples, 1), np.nan)
+            rmse = np.where(self.samples > 0, np.sqrt(self.squared / np.maximum(self.samples, 1)), np.nan)
+        return mape, rmse
+
+
+def _rule_based(history, registry, conn):
+    def predict(start, stop):
+        days = slice(start, stop)
+        return prediction_engine.predict_demand(
+            registry.base_patterns, history.weather[days], history.festival[days],
+            history.market[:, days]).astype(np.float64)
+    return predict
+
+
+def _seasonal_naive(history, registry, conn):
+    """Same weekday one week earlier"""
+    def predict(start, stop):
+        return history.actual[:, start - 7:stop - 7]
+    return predict
+
+
+def _demand_model(history, registry, conn):
+    """Production path: incrementally trained models, rule-based fallback for routes without one"""
+    model = demand_model.DemandModel()
+    cube = demand_cube.get_cube()
+    rule_based = _rule_based(history, registry, conn)
+
+    def predict(start, stop):
+        model.update(conn, through=history.dates[start], route_ids=history.route_ids, cube=cube)
+        days = slice(start, stop)
+        predicted = model.predict(history.route_ids, history.dates[days], history.weather[days],
+                                  history.festival[days], history.market[:, days])
+        return np.where(np.isnan(predicted), rule_based(start, stop), predicted)
+    return predict
+
+
+VARIANT_BUILDERS = {
+    'rule_based': _rule_based,
+    'seasonal_naive': _seasonal_naive,
+    'demand_model': _demand_model,
+}
+
+
+def run_variant(variant, history, registry, conn, starts, horizon):
+    """Replay every fold through one variant, timing it and tracing its peak memory"""
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+
+    predict = VARIANT_BUILDERS[variant](history, registry, conn)
+    errors = ErrorAccumulator(len(history.route_ids))
+    for start in starts:
+        stop = start + horizon
+        errors.add(predict(start, stop), history.actual[:, start:stop])
+
+    wall_seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    samples, mape, rmse = errors.totals()
+    route_hour_mape, route_hour_rmse = errors.by_route_hour()
+    return VariantResult(variant, len(starts), samples, mape, rmse, wall_seconds, peak / 1024,
+                         errors.samples, route_hour_mape, route_hour_rmse)
+
+
+def run_backtest(conn, variants=VARIANTS, train_days=DEFAULT_TRAIN_DAYS, horizon=DEFAULT_HORIZON,
+                 step=DEFAULT_STEP, start=None, end=None):
+    """Run each variant over the same rolling folds; returns (history, [VariantResult])"""
+    if 'seasonal_naive' in variants and train_days < 7:
+        raise ValueError('seasonal_naive needs at least 7 training days')
+    registry = load_registry(conn)
+    history = load_history(conn, registry.route_ids, start, end)
+    starts = fold_starts(len(history.dates), train_days, horizon, step)
+    if not starts:
+        raise ValueError(f'need more than {train_days + horizon - 1} days of history, '
+                         f'found {len(history.dates)}')
+
+    # Keep one-off library imports out of the variant's time and memory
+    if 'demand_model' in variants:
+        demand_model.import_backend()
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        results = [run_variant(variant, history, registry, conn, starts, horizon) for variant in variants]
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return history, results
+
+
+def save_results(conn, history, results, run_id=None):
+    """Store one run's variant summaries and route-hour errors; returns the run id"""
+    run_id = run_id or uuid.uuid4().hex
+    start, end = history.dates[0].isoformat(), history.dates[-1].isoformat()
+    with transaction(conn) as cursor:
+        for result in results:
+            cursor.execute("""
+            INSERT INTO backtest_runs
+            (run_id, variant, start_date, end_date, folds, route_count, samples,
+             mape, rmse, accuracy, wall_seconds, peak_memory_kb)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (run_id, result.variant, start, end, result.folds, len(history.route_ids),
+                  result.samples, result.mape, result.rmse, result.accuracy,
+                  result.wall_seconds, result.peak_memory_kb))
+            cursor.executemany("""
+            INSERT INTO backtest_route_hour_errors (run_id, variant, route_id, hour, samples, mape, rmse)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (run_id, result.variant, route_id, hour, int(result.route_hour_samples[r, hour]),
+                 _nullable(result.route_hour_mape[r, hour]), _nullable(result.route_hour_rmse[r, hour]))
+                for r, route_id in enumerate(history.route_ids)
+                for hour in range(HOURS_PER_DAY)
+            ])
+    return run_id
+
+
+def _nullable(value):
+    return None if np.isnan(value) else float(value)
+
+
+def latest_run(conn, variant=DEFAULT_VARIANT):
+    """Most recent stored summary for a variant, or None"""
+    cursor = conn.execute("""
+    SELECT run_id, variant, start_date, end_date, folds, route_count, samples,
+           mape, rmse, accuracy, wall_seconds, peak_memory_kb, created_at
+    FROM backtest_runs WHERE variant = ? ORDER BY id DESC LIMIT 1
+    """, (variant,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([column[0] for column in cursor.description], row))
+
+
+def route_accuracy(conn, run_id, variant=DEFAULT_VARIANT):
+    """Sample-weighted accuracy per route for a stored run"""
+    rows = conn.execute("""
+    SELECT route_id, SUM(mape * samples) / SUM(samples)
+    FROM backtest_route_hour_errors
+    WHERE run_id = ? AND variant = ? AND mape IS NOT NULL
+    GROUP BY route_id
+    """, (run_id, variant)).fetchall()
+    return {route_id: round(max(0.0, 100.0 * (1.0 - mape)), 2) for route_id, mape in rows}
+
+
+def main():
+    from database import get_pool
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument('--train-days', type=int, default=DEFAULT_TRAIN_DAYS,
+                        help='days of history before the first test window')
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help='days forecast per fold')
+    parser.add_argument('--step', type=int, default=DEFAULT_STEP, help='days between fold origins')
+    parser.add_argument('--start', type=date.fromisoformat, default=None)
+    parser.add_argument('--end', type=date.fromisoformat, default=None)
+    parser.add_argument('--no-save', action='store_true', help='print results without storing them')
+    args = parser.parse_args()
+
+    migrate()
+    with get_pool().connection() as conn:
+        history, results = run_backtest(conn, args.variants, args.train_days, args.horizon,
+                                        args.step, args.start, args.end)
+        print(f"📊 {len(history.route_ids)} routes, {history.dates[0]} to {history.dates[-1]}, "
+              f"{results[0].folds} folds of {args.horizon} day(s)")
+        print(f"{'variant':<16}{'MAPE':>9}{'RMSE':>9}{'accuracy':>10}{'time':>12}{'peak mem':>12}")
+        for result in results:
+            mape = f"{result.mape * 100:.1f}%" if result.mape is not None else '-'
+            rmse = f"{result.rmse:.1f}" if result.rmse is not None else '-'
+            accuracy = f"{result.accuracy:.1f}%" if result.accuracy is not None else '-'
+            print(f"{result.variant:<16}{mape:>9}{rmse:>9}{accuracy:>10}"
+                  f"{result.wall_seconds * 1000:>10.1f}ms{result.peak_memory_kb / 1024:>10.2f}MB")
+        if not args.no_save:
+            run_id = save_results(conn, history, results)
+            print(f"💾 Stored as run {run_id}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+API latency and throughput benchmark.
+
+Builds a fresh database for each data scale, then times the main endpoints
+(login, routes, dashboard-stats, live-updates, daily-update) in-process with
+the Flask test client. By default requests run one at a time; --concurrency
+N sends them from N threads at once to generate load. --url runs the same
+requests against a live server instead, and --serve-workers starts
+serve.py on each scale's database once per worker count to show how
+throughput scales with processes. The report gives p50/p95/p99 latency and
+throughput per endpoint, and the JSON written under benchmarks/results can
+be compared with an earlier run through --compare.
+
+Usage:
+    python benchmarks/bench_api.py --scales 3 100 500
+    python benchmarks/bench_api.py --scales 100 --concurrency 8 --requests 400
+    python benchmarks/bench_api.py --url http://localhost:5000 --concurrency 16
+    python benchmarks/bench_api.py --scales 100 --serve-workers 1 2 4 --min-speedup 1.5
+    python benchmarks/bench_api.py --compare benchmarks/results/<earlier>.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix='bench_api_')
+os.environ.setdefault('TRANSPORT_DB_PATH', os.path.join(WORKDIR, 'bench_api.db'))
+os.environ.setdefault('TRANSPORT_MODEL_PATH', os.path.join(WORKDIR, 'demand_model.joblib'))
+
+import database  # noqa: E402
+import demand_model  # noqa: E402
+import response_cache  # noqa: E402
+import route_registry  # noqa: E402
+from enhanced_backend_server_2025 import (  # noqa: E402
+    _create_schema, _seed_demo_data, app, generate_initial_data,
+)
+from migrations import apply_migrations  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+CREDENTIALS = {'username': 'admin', 'password': 'admin123'}
+
+# name -> (method, path, sends the bearer token, heavy)
+ENDPOINTS = {
+    'login': ('POST', '/api/auth/login', False, True),
+    'routes': ('GET', '/api/routes', True, False),
+    'dashboard-stats': ('GET', '/api/dashboard-stats', True, False),
+    'live-updates': ('GET', '/api/live-updates', True, False),
+    # The update runs as a background job; ?wait= times it through to completion
+    'daily-update': ('POST', '/api/daily-update?wait=60', True, True),
+}
+
+
+class InProcessClient:
+    """Flask test client; one per thread"""
+
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, headers, body):
+        response = self.client.open(path, method=method, headers=headers, json=body)
+        response.close()
+        return response.status_code
+
+
+class HttpClient:
+    """requests session against a running server"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def request(self, method, path, headers, body):
+        response = self.session.request(method, self.base_url + path, headers=headers, json=body, timeout=60)
+        return response.status_code
+
+
+def build_scale(route_count, days):
+    """Fresh database with the demo data plus synthetic routes up to route_count"""
+    path = os.path.join(WORKDIR, f'scale_{route_count}.db')
+    pool = database.configure(path, max_size=max(8, app.config['DATABASE_POOL_SIZE']))
+    os.environ['TRANSPORT_MODEL_PATH'] = os.path.join(WORKDIR, f'model_{route_count}.joblib')
+    rng = np.random.default_rng(route_count)
+
+    with pool.connection() as conn:
+        with database.transaction(conn) as cursor:
+            _create_schema(cursor)
+            apply_migrations(cursor)
+            _seed_demo_data(cursor)
+            existing = cursor.execute("SELECT COUNT(*) FROM routes").fetchone()[0]
+            for i in range(existing, route_count):
+                route = (f'bench_{i:04d}', f'Benchmark route {i}', int(rng.integers(30, 130)),
+                         int(rng.integers(40, 180)), int(rng.integers(5, 20)), int(rng.integers(800, 5000)))
+                route_registry.save_route(cursor, route, rng.integers(10, 650, size=24).tolist(),
+                                          rng.choice(7, size=2, replace=False).tolist())
+        route_registry.invalidate()
+        if days:
+            with database.transaction(conn) as cursor:
+                generate_initial_data(cursor, route_registry.load_registry(conn), days)
+        conn.execute("ANALYZE")
+
+        # Benchmark steady-state daily updates, not the first full model fit
+        demand_model.update_model(conn)
+    response_cache.get_cache().clear()
+    return pool
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serve_process(db_path, workers, threads, ready_timeout=120):
+    """Run serve.py on db_path and yield its base URL once it reports ready"""
+    import requests
+    base_url = f"http://127.0.0.1:{free_port()}"
+    env = dict(os.environ, TRANSPORT_DB_PATH=db_path, TRANSPORT_NIGHTLY_AT='')
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'serve.py'), '--workers', str(workers), '--threads', str(threads),
+         '--bind', base_url.rsplit('/', 1)[1]],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + ready_timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"serve.py exited with status {process.returncode}")
+            try:
+                if requests.get(base_url + '/api/health/ready', timeout=2).status_code == 200:
+                    break
+            except requests.ConnectionError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"serve.py was not ready after {ready_timeout}s")
+            time.sleep(0.25)
+        yield base_url
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def summarize(latencies, errors, wall_seconds):
+    values = np.asarray(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3),
+        'throughput_rps': round(len(latencies) / wall_seconds, 2) if wall_seconds > 0 else None,
+    }
+
+
+def run_endpoint(make_client, token, name, requests_count, concurrency):
+    """Send requests_count requests to one endpoint from concurrency threads"""
+    method, path, authenticated, _ = ENDPOINTS[name]
+    headers = {'Authorization': f'Bearer {token}'} if authenticated else {}
+    body = CREDENTIALS if name == 'login' else None
+    shares = [requests_count // concurrency + (1 if i < requests_count % concurrency else 0)
+              for i in range(concurrency)]
+
+    def worker(count):
+        client = make_client()
+        latencies, errors = [], 0
+        for _ in range(count):
+            started = time.perf_counter()
+            status = client.request(method, path, headers, body)
+            latencies.append(time.perf_counter() - started)
+            errors += status >= 400
+        return latencies, errors
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        results = [worker(requests_count)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(worker, [share for share in shares if share]))
+    wall_seconds = time.perf_counter() - started
+
+    latencies = [value for result in results for value in result[0]]
+    return summarize(latencies, sum(result[1] for result in results), wall_seconds)
+
+
+def login(make_client):
+    client = make_client()
+    if isinstance(client, InProcessClient):
+        response = client.client.post('/api/auth/login', json=CREDENTIALS)
+        return response.get_json()['access_token']
+    response = client.session.post(client.base_url + '/api/auth/login', json=CREDENTIALS, timeout=60)
+    return response.json()['access_token']
+
+
+def benchmark_endpoints(make_client, args, concurrency, label, over_budget):
+    token = login(make_client)
+    endpoints = {}
+    for name in args.endpoints:
+        heavy = ENDPOINTS[name][3]
+        count = args.heavy_requests if heavy else args.requests
+        stats = run_endpoint(make_client, token, name, count, concurrency)
+        endpoints[name] = stats
+        print(f"   {name:<18}p50 {stats['p50_ms']:>9.2f}  p95 {stats['p95_ms']:>9.2f}  "
+              f"p99 {stats['p99_ms']:>9.2f} ms  {stats['throughput_rps']:>9.1f} req/s"
+              + (f"  ❌ {stats['errors']} errors" if stats['errors'] else ''))
+        if args.budget_p95 is not None and not heavy and stats['p95_ms'] > args.budget_p95:
+            over_budget.append(f"{label} {name}")
+    return endpoints
+
+
+def speedups(runs):
+    """Throughput of the most workers over the fewest, per endpoint"""
+    fewest = min(runs, key=lambda run: run['workers'])
+    most = max(runs, key=lambda run: run['workers'])
+    return {name: round(most['endpoints'][name]['throughput_rps'] / stats['throughput_rps'], 2)
+            for name, stats in fewest['endpoints'].items() if stats['throughput_rps']}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline_path):
+    """Print p95 and throughput changes against an earlier report"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(scale['label'], name): stats
+                for scale in baseline['scales'] for name, stats in scale['endpoints'].items()}
+    print(f"\n📊 Compared with {os.path.basename(baseline_path)} (commit {baseline['meta'].get('commit')})")
+    for scale in report['scales']:
+        for name, stats in scale['endpoints'].items():
+            old = previous.get((scale['label'], name))
+            if not old:
+                continue
+            p95_change = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+            print(f"   {scale['label']:<12}{name:<18}p95 {old['p95_ms']:>9.2f} -> {stats['p95_ms']:>9.2f} ms "
+                  f"({p95_change:+.1f}%)   rps {old['throughput_rps']} -> {stats['throughput_rps']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[3, 100], help='route counts to benchmark')
+    parser.add_argument('--days', type=int, default=30, help='days of demand history per scale')
+    parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument('--requests', type=int, default=200, help='requests per light endpoint')
+    parser.add_argument('--heavy-requests', type=int, default=20, help='requests for login and daily-update')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='threads sending requests at once (default 1, or every server thread with --serve-workers)')
+    parser.add_argument('--cold-cache', action='store_true', help='disable the response cache')
+    parser.add_argument('--url', default=None, help='benchmark a running server instead of in-process')
+    parser.add_argument('--serve-workers', type=int, nargs='+', default=None,
+                        help='benchmark serve.py with each of these worker process counts')
+    parser.add_argument('--serve-threads', type=int, default=4, help='threads per serve.py worker')
+    parser.add_argument('--min-speedup', type=float, default=None,
+                        help='fail unless the most --serve-workers reach this multiple of the fewest '
+                             'on every light endpoint')
+    parser.add_argument('--output', default=None, help='JSON report path (default: benchmarks/results/)')
+    parser.add_argument('--compare', default=None, help='earlier JSON report to compare against')
+    parser.add_argument('--budget-p95', type=float, default=None,
+                        help='fail if any light endpoint p95 exceeds this many ms')
+    args = parser.parse_args()
+
+    if args.concurrency is None:
+        args.concurrency = max(args.serve_workers) * args.serve_threads if args.serve_workers else 1
+
+    if args.cold_cache:
+        response_cache.configure(ttls={namespace: 0 for namespace in response_cache.DEFAULT_TTLS})
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'mode': 'http' if args.url else ('serve' if args.serve_workers else 'in-process'),
+            'concurrency': args.concurrency,
+            'cold_cache': args.cold_cache,
+        },
+        'scales': [],
+    }
+
+    if args.url:
+        scales = [('live', None)]
+    else:
+        scales = [(f'{count}-routes', count) for count in args.scales]
+    worker_counts = args.serve_workers or [None]
+
+    over_budget = []
+    slow_scaling = []
+    try:
+        for label, route_count in scales:
+            if route_count is not None:
+                started = time.perf_counter()
+                pool = build_scale(route_count, args.days)
+                print(f"\n🗄️  {label}: built {args.days} days of history in {time.perf_counter() - started:.1f}s")
+            else:
+                print(f"\n🌐 {args.url}")
+
+            runs = []
+            for workers in worker_counts:
+                if workers is None:
+                    run_label = label
+                    server = nullcontext(args.url)
+                else:
+                    run_label = f"{label}/{workers}w"
+                    pool.close_all()
+                    server = serve_process(pool.path, workers, args.serve_threads)
+                    print(f"   🚀 serve.py: {workers} workers x {args.serve_threads} threads, "
+                          f"concurrency {args.concurrency}")
+                with server as base_url:
+                    make_client = (lambda: HttpClient(base_url)) if base_url else InProcessClient  # noqa: E731
+                    endpoints = benchmark_endpoints(make_client, args, args.concurrency, run_label, over_budget)
+                runs.append({'label': run_label, 'routes': route_count, 'days': args.days, 'workers': workers,
+                             'endpoints': endpoints})
+            report['scales'].extend(runs)
+
+            if len(runs) > 1:
+                ratios = speedups(runs)
+                print(f"   ⚡ {max(worker_counts)} vs {min(worker_counts)} workers: "
+                      + ', '.join(f"{name} x{ratio}" for name, ratio in ratios.items()))
+                if args.min_speedup is not None:
+                    slow_scaling += [f"{label} {name}" for name, ratio in ratios.items()
+                                     if not ENDPOINTS[name][3] and ratio < args.min_speedup]
+            if route_count is not None:
+                pool.close_all()
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench_api-{datetime.now():%Y%m%d-%H%M%S}-{report['meta']['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Saved {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+    if over_budget:
+        print(f"❌ p95 over {args.budget_p95:.0f} ms: {', '.join(over_budget)}")
+    if slow_scaling:
+        print(f"❌ throughput speedup under x{args.min_speedup}: {', '.join(slow_scaling)}")
+    if over_budget or slow_scaling:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
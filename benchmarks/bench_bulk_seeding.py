@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Timing test for bulk demand seeding and daily prediction writes.
+
+Seeds a year of hourly history for 500 routes through generate_initial_data
+(chunked executemany UPSERTs inside one transaction) and fails if it takes
+longer than the budget.
+
+Usage:
+    python benchmarks/bench_bulk_seeding.py --routes 500 --days 365 --budget 60
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('TRANSPORT_DB_PATH', os.path.join(tempfile.mkdtemp(), 'bench_seed.db'))
+
+import database  # noqa: E402
+import prediction_engine  # noqa: E402
+from route_registry import RouteRegistry  # noqa: E402
+from enhanced_backend_server_2025 import _create_schema, generate_initial_data  # noqa: E402
+from migrations import apply_migrations  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=500)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--chunk-size', type=int, default=database.DEFAULT_BULK_CHUNK_SIZE)
+    parser.add_argument('--budget', type=float, default=60.0, help='fail if seeding exceeds this many seconds')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    pool = database.configure(os.path.join(workdir, 'bench_seed.db'), max_size=1)
+
+    rng = np.random.default_rng(7)
+    route_ids = [f'r{i:04d}' for i in range(args.routes)]
+    market_mask = np.zeros((args.routes, 7), dtype=bool)
+    market_mask[np.arange(args.routes), rng.integers(0, 7, size=args.routes)] = True
+    registry = RouteRegistry(
+        route_ids, route_ids, rng.integers(40, 130, args.routes), rng.integers(60, 180, args.routes),
+        np.full(args.routes, 10), rng.integers(10, 650, size=(args.routes, 24)), market_mask,
+    )
+
+    try:
+        with pool.connection() as conn:
+            with database.transaction(conn) as cursor:
+                _create_schema(cursor)
+                apply_migrations(cursor)
+
+            started = time.perf_counter()
+            with database.transaction(conn) as cursor:
+                written = generate_initial_data(cursor, registry, args.days, args.chunk_size)
+            seed_seconds = time.perf_counter() - started
+
+            dates = [date.today() + timedelta(days=i) for i in range(1, 15)]
+            batch = prediction_engine.run_predictions(
+                route_ids, dates, registry.base_patterns, registry.distances,
+                market_factor=registry.market_factor(dates),
+            )
+            started = time.perf_counter()
+            with database.transaction(conn) as cursor:
+                predicted = database.bulk_write(cursor, database.UPSERT_SCHEDULE_PREDICTION,
+                                                batch.rows(), args.chunk_size)
+            predict_seconds = time.perf_counter() - started
+    finally:
+        pool.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"🚌 Seeded {written:,} demand rows ({args.routes} routes x {args.days} days) "
+          f"in {seed_seconds:.2f}s ({written / seed_seconds:,.0f} rows/s, chunk {args.chunk_size})")
+    print(f"📈 Wrote {predicted:,} prediction rows (14-day horizon) in {predict_seconds:.2f}s")
+
+    if seed_seconds > args.budget:
+        print(f"❌ Over budget: {seed_seconds:.1f}s > {args.budget:.1f}s")
+        sys.exit(1)
+    print(f"✅ Within budget ({args.budget:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmark history reads from the demand cube against row-by-row SQL.
+
+Seeds --days of hourly demand for --routes routes, exports the cube, then
+times the reads the backtest and model training do: the whole history as a
+(routes, days, hours) array, and each route's history one route at a time.
+Each read runs once through SELECT and Python tuples and once as a slice of
+the memory-mapped cube. Also times an incremental sync after one more day
+is recorded, and checks that both paths return the same counts.
+
+Usage:
+    python benchmarks/bench_demand_cube.py --routes 500 --days 730 --min-speedup 10
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('TRANSPORT_DB_PATH', os.path.join(tempfile.mkdtemp(), 'bench_cube.db'))
+
+import database  # noqa: E402
+import demand_cube  # noqa: E402
+import rollups  # noqa: E402
+from database import DEMAND_VIEW  # noqa: E402
+from enhanced_backend_server_2025 import _create_schema  # noqa: E402
+from migrations import apply_migrations  # noqa: E402
+
+HOURS_PER_DAY = 24
+
+
+def demand_rows(route_ids, base, days, rng):
+    counts = (base[:, np.newaxis, :] * rng.uniform(0.7, 1.3, size=(len(route_ids), len(days), 1))).astype(np.int64)
+    for r, route_id in enumerate(route_ids):
+        for d, day in enumerate(days):
+            iso, weekday = day.isoformat(), day.weekday()
+            for hour, count in enumerate(counts[r, d].tolist()):
+                yield (route_id, hour, weekday, count, iso, 0, 1.0, 1.0)
+
+
+def sql_history(conn, route_ids, start, end):
+    """The pre-cube read: every row through the cursor into a float array"""
+    route_index = {route_id: r for r, route_id in enumerate(route_ids)}
+    actual = np.full((len(route_ids), (end - start).days + 1, HOURS_PER_DAY), np.nan)
+    for route_id, day, hour, count in conn.execute(f"""
+    SELECT route_id, date_recorded, hour, passenger_count FROM {DEMAND_VIEW}
+    WHERE is_predicted = 0 AND date_recorded BETWEEN ? AND ?
+    """, (start.isoformat(), end.isoformat())):
+        actual[route_index[route_id], (date.fromisoformat(day) - start).days, hour] = count
+    return actual
+
+
+def sql_per_route(conn, route_ids, end):
+    total = 0
+    for route_id in route_ids:
+        rows = conn.execute(f"""
+        SELECT date_recorded, hour, day_of_week, passenger_count, festival_factor, market_factor
+        FROM {DEMAND_VIEW} WHERE route_id = ? AND date_recorded < ? AND is_predicted = 0
+        """, (route_id, end.isoformat())).fetchall()
+        total += sum(row[3] for row in rows)
+    return total
+
+
+def cube_per_route(cube, route_ids, end):
+    stop = cube.day_index(end)
+    total = 0
+    for row in cube.rows(route_ids).tolist():
+        counts = cube.counts[row, :stop]
+        total += int(counts[counts >= 0].sum())
+    return total
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=500)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--min-speedup', type=float, default=None,
+                        help='fail if the cube is less than this many times faster for the full-history read')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    pool = database.configure(os.path.join(workdir, 'bench_cube.db'), max_size=1)
+    cube_dir = os.path.join(workdir, 'cube')
+
+    rng = np.random.default_rng(3)
+    route_ids = [f'r{i:04d}' for i in range(args.routes)]
+    base = rng.integers(10, 650, size=(args.routes, HOURS_PER_DAY))
+    # Yesterday is left for the incremental sync; sync() never publishes today
+    end = date.today() - timedelta(days=2)
+    start = end - timedelta(days=args.days - 1)
+    days = [start + timedelta(days=offset) for offset in range(args.days)]
+
+    try:
+        with pool.connection() as conn:
+            with database.transaction(conn) as cursor:
+                _create_schema(cursor)
+                apply_migrations(cursor)
+                cursor.executemany("""
+                INSERT INTO routes (id, name, distance, travel_time, current_buses, daily_passengers)
+                VALUES (?, ?, 50, 60, 10, 1000)
+                """, [(route_id, route_id) for route_id in route_ids])
+                with rollups.deferred(cursor, demand_range=(start, end)):
+                    written = database.bulk_write(cursor, database.UPSERT_PASSENGER_DEMAND,
+                                                  demand_rows(route_ids, base, days, rng))
+
+            summary, export_ms = timed(lambda: demand_cube.sync(conn, cube_dir, through=end))
+            cube = demand_cube.get_cube(cube_dir)
+            size_mb = sum(os.path.getsize(os.path.join(cube_dir, name)) for name in os.listdir(cube_dir)) / 1e6
+            print(f"🧊 {written:,} rows ({args.routes} routes x {args.days} days) exported in {export_ms / 1000:.1f}s; "
+                  f"cube files {size_mb:.0f} MB")
+
+            sql_actual, sql_ms = timed(lambda: sql_history(conn, route_ids, start, end))
+            (cube_actual, _, _), cube_ms = timed(lambda: cube.history(route_ids, start, end))
+            if not np.array_equal(sql_actual, cube_actual, equal_nan=True):
+                print("❌ Cube and SQL histories differ")
+                sys.exit(1)
+            sql_route_total, sql_route_ms = timed(lambda: sql_per_route(conn, route_ids, end))
+            cube_route_total, cube_route_ms = timed(lambda: cube_per_route(cube, route_ids, end))
+            if sql_route_total != cube_route_total:
+                print("❌ Cube and SQL per-route totals differ")
+                sys.exit(1)
+
+            yesterday = end + timedelta(days=1)
+            with database.transaction(conn) as cursor:
+                database.bulk_write(cursor, database.UPSERT_PASSENGER_DEMAND,
+                                    demand_rows(route_ids, base, [yesterday], rng))
+            summary, sync_ms = timed(lambda: demand_cube.sync(conn, cube_dir))
+            if summary['copied'] or summary['days_loaded'] != 1:
+                print(f"❌ Incremental sync should fill one unpublished day in place: {summary}")
+                sys.exit(1)
+    finally:
+        pool.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    speedup = sql_ms / cube_ms
+    print(f"   full history: SQL {sql_ms:.0f} ms, cube {cube_ms:.0f} ms ({speedup:.1f}x)")
+    print(f"   per-route history: SQL {sql_route_ms:.0f} ms, cube {cube_route_ms:.0f} ms "
+          f"({sql_route_ms / cube_route_ms:.1f}x)")
+    print(f"   incremental sync of one new day: {sync_ms:.0f} ms ({summary['days_loaded']} days, "
+          f"{summary['rows_loaded']:,} rows)")
+    if args.min_speedup is not None and speedup < args.min_speedup:
+        print(f"❌ Cube only {speedup:.1f}x faster than SQL (need {args.min_speedup:.1f}x)")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
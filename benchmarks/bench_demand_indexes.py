@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark dashboard query latency on a large passenger_demand table,
+before and after the schema migration that adds composite indexes.
+
+Usage:
+    python benchmarks/bench_demand_indexes.py --rows 20000000
+    python benchmarks/bench_demand_indexes.py --rows 200000 --keep /tmp/demand.db
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+from migrations import MIGRATIONS  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE passenger_demand (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    route_id TEXT NOT NULL,
+    hour INTEGER NOT NULL CHECK (hour >= 0 AND hour <= 23),
+    day_of_week INTEGER NOT NULL CHECK (day_of_week >= 0 AND day_of_week <= 6),
+    passenger_count INTEGER NOT NULL,
+    date_recorded DATE NOT NULL,
+    is_predicted BOOLEAN DEFAULT FALSE,
+    weather_factor REAL DEFAULT 1.0,
+    festival_factor REAL DEFAULT 1.0,
+    market_factor REAL DEFAULT 1.0,
+    confidence_score REAL DEFAULT 0.8
+);
+CREATE TABLE daily_schedule_predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    route_id TEXT NOT NULL,
+    prediction_date DATE NOT NULL,
+    hour INTEGER NOT NULL,
+    predicted_passengers INTEGER NOT NULL,
+    recommended_buses INTEGER NOT NULL,
+    frequency_minutes INTEGER NOT NULL,
+    cost_per_hour REAL NOT NULL,
+    utilization_rate REAL NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    message TEXT NOT NULL,
+    type TEXT DEFAULT 'info',
+    user_id TEXT,
+    is_read BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+QUERIES = {
+    'dashboard_passengers_today': (
+        "SELECT SUM(passenger_count) FROM passenger_demand WHERE date_recorded = ? AND hour <= ?",
+        lambda last_day: (last_day, 17),
+    ),
+    'route_day_profile': (
+        "SELECT hour, passenger_count FROM passenger_demand WHERE route_id = ? AND date_recorded = ?",
+        lambda last_day: ('r0001', last_day),
+    ),
+    'route_hour_lookup': (
+        "SELECT passenger_count FROM passenger_demand WHERE route_id = ? AND date_recorded = ? AND hour = ?",
+        lambda last_day: ('r0001', last_day, 8),
+    ),
+}
+
+
+def populate(conn, rows):
+    """Fill passenger_demand with routes x days x 24 hours of synthetic counts"""
+    days = max(1, min(365, rows // (24 * 50)))
+    routes = max(1, rows // (24 * days))
+    start = date.today() - timedelta(days=days - 1)
+
+    conn.execute("BEGIN")
+    conn.execute(f"""
+    WITH RECURSIVE
+        r(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM r WHERE n + 1 < {routes}),
+        d(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM d WHERE n + 1 < {days}),
+        h(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM h WHERE n + 1 < 24)
+    INSERT INTO passenger_demand (route_id, hour, day_of_week, passenger_count, date_recorded)
+    SELECT printf('r%04d', r.n), h.n,
+           CAST(strftime('%w', date(?, '+' || d.n || ' days')) AS INTEGER),
+           abs(random() % 600),
+           date(?, '+' || d.n || ' days')
+    FROM d, r, h
+    """, (start.isoformat(), start.isoformat()))
+    conn.execute("COMMIT")
+    return routes, days, (start + timedelta(days=days - 1)).isoformat()
+
+
+def time_query(conn, sql, params, repeat):
+    """Return per-execution latencies in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def run_suite(conn, last_day, repeat):
+    results = {}
+    for name, (sql, params) in QUERIES.items():
+        samples = time_query(conn, sql, params(last_day), repeat)
+        plan = ' | '.join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params(last_day)))
+        results[name] = {'median_ms': statistics.median(samples), 'max_ms': max(samples), 'plan': plan}
+    return results
+
+
+def print_results(title, results):
+    print(f"\n{title}")
+    print("-" * 78)
+    for name, stats in results.items():
+        print(f"{name:<30} median {stats['median_ms']:>10.3f} ms   max {stats['max_ms']:>10.3f} ms")
+        print(f"{'':<30} plan: {stats['plan']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20_000_000, help='approximate passenger_demand rows')
+    parser.add_argument('--repeat', type=int, default=5, help='executions per query')
+    parser.add_argument('--keep', help='write the database here instead of a temp file')
+    args = parser.parse_args()
+
+    path = args.keep or os.path.join(tempfile.mkdtemp(), 'bench_demand.db')
+    if os.path.exists(path):
+        os.remove(path)
+    pool = database.configure(path, max_size=1)
+
+    with pool.connection() as conn:
+        conn.executescript(SCHEMA)
+
+        started = time.perf_counter()
+        routes, days, last_day = populate(conn, args.rows)
+        count = conn.execute("SELECT COUNT(*) FROM passenger_demand").fetchone()[0]
+        print(f"🚌 Populated {count:,} rows ({routes} routes x {days} days x 24 h) "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        before = run_suite(conn, last_day, args.repeat)
+        print_results("Before migration (no indexes)", before)
+
+        started = time.perf_counter()
+        # Only the demand index migration: later ones need the full schema this benchmark leaves out
+        version, _, demand_indexes = MIGRATIONS[0]
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+        demand_indexes(cursor)
+        cursor.execute(f"PRAGMA user_version = {version}")
+        conn.execute("COMMIT")
+        conn.execute("ANALYZE")
+        print(f"\n🛠️  Migration (dedupe + index build) took {time.perf_counter() - started:.1f}s")
+
+        after = run_suite(conn, last_day, args.repeat)
+        print_results("After migration", after)
+
+        print("\nSpeed-up (median)")
+        print("-" * 78)
+        for name in QUERIES:
+            ratio = before[name]['median_ms'] / max(after[name]['median_ms'], 1e-6)
+            print(f"{name:<30} {ratio:>10.1f}x")
+
+    pool.close_all()
+    if not args.keep:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == '__main__':
+    main()
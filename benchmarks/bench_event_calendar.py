@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark event-calendar lookups for long forecasts.
+
+Builds a calendar of --events events (a mix of single- and multi-day ones,
+some with lead/trail windows) spread over --years years, then times the
+per-day multipliers of a --horizon day forecast two ways: one dict lookup
+per date string, as the old hardcoded calendar did, and one vector gather
+from the per-year arrays. Also times upcoming-event and range queries on
+the bisect index.
+
+Usage:
+    python benchmarks/bench_event_calendar.py --events 5000 --horizon 365 --budget-ms 1
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_calendar import EventCalendar  # noqa: E402
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--horizon', type=int, default=365, help='forecast days to look up')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='fail if a warm horizon lookup takes longer than this many milliseconds')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(11)
+    first = date(2020, 1, 1)
+    offsets = rng.integers(0, 365 * args.years, size=args.events)
+    spans = np.where(rng.random(args.events) < 0.2, rng.integers(2, 6, size=args.events), 1)
+    events = [{
+        'id': i, 'name': f'event{i}', 'type': 'custom',
+        'start_date': first + timedelta(days=int(offset)),
+        'end_date': first + timedelta(days=int(offset + span - 1)),
+        'multiplier': float(rng.uniform(1.1, 2.0)),
+        'lead_days': int(rng.integers(0, 4)), 'trail_days': int(rng.integers(0, 3)),
+    } for i, (offset, span) in enumerate(zip(offsets, spans))]
+    # The old calendar: one entry per event day, keyed by date string
+    by_day = {}
+    for event in events:
+        day = event['start_date']
+        while day <= event['end_date']:
+            by_day[day.strftime('%Y-%m-%d')] = {'name': event['name'], 'multiplier': event['multiplier']}
+            day += timedelta(days=1)
+
+    started = time.perf_counter()
+    calendar = EventCalendar(events)
+    print(f"📅 {args.events} events over {args.years} years indexed in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    start = first + timedelta(days=365 * args.years // 2)
+    dates = [start + timedelta(days=offset) for offset in range(args.horizon)]
+    cold_ms = best_of(1, lambda: calendar.factors(dates))
+    dict_ms = best_of(args.repeat, lambda: [by_day.get(day.strftime('%Y-%m-%d'), {}).get('multiplier', 1.0)
+                                             for day in dates])
+    gather_ms = best_of(args.repeat, lambda: calendar.factors(dates))
+    upcoming_ms = best_of(args.repeat, lambda: calendar.upcoming(start, 10))
+    range_ms = best_of(args.repeat, lambda: calendar.between(start, start + timedelta(days=30)))
+
+    print(f"   {args.horizon}-day factors: dict lookups {dict_ms:.3f} ms, gather {gather_ms:.3f} ms "
+          f"({dict_ms / gather_ms:.1f}x), first gather incl. building year arrays {cold_ms:.3f} ms")
+    print(f"   next 10 events {upcoming_ms * 1000:.1f} µs, 30-day range query {range_ms * 1000:.1f} µs")
+    if args.budget_ms is not None and gather_ms > args.budget_ms:
+        print(f"❌ Over budget: {gather_ms:.3f} ms > {args.budget_ms:.3f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
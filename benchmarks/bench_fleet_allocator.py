@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Benchmark the fleet allocator on a depot-scale day.
+
+Usage:
+    python benchmarks/bench_fleet_allocator.py --routes 200 --fleet 1500
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fleet_allocator  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=200)
+    parser.add_argument('--fleet', type=int, default=1500)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=2.0, help='fail if the slowest solve exceeds this many seconds')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    route_ids = [f'r{i:04d}' for i in range(args.routes)]
+    demand = rng.integers(0, 650, size=(args.routes, 24))
+    distances = rng.integers(30, 130, size=args.routes)
+    travel_times = rng.integers(40, 180, size=args.routes)
+
+    for fleet_size, label in ((args.fleet, 'fleet-limited'), (10 ** 9, 'unconstrained')):
+        timings = []
+        for _ in range(args.repeat):
+            result = fleet_allocator.allocate_fleet(route_ids, demand, distances, travel_times, fleet_size)
+            timings.append(result.solve_seconds)
+        summary = result.summary()
+        print(f"🚌 {args.routes} routes x 24 h, {label}: status {summary['status']}, "
+              f"peak in service {summary['peak_buses_in_service']}/{summary['peak_buses_required']} required, "
+              f"unserved {summary['unserved_passengers']:,}")
+        print(f"   solve best {min(timings) * 1000:.1f} ms, worst {max(timings) * 1000:.1f} ms")
+        if max(timings) > args.budget:
+            print(f"❌ Over budget: {max(timings):.3f}s > {args.budget:.3f}s")
+            sys.exit(1)
+    print(f"✅ Within budget ({args.budget:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Login storm benchmark.
+
+Creates --users accounts with distinct passwords, then has them all log in
+at once from --concurrency threads (the shift-change case), twice: a cold
+round where every password goes through pbkdf2 and a warm round where the
+remembered logins skip it. Reports logins/s and p50/p95 latency per round
+and how many write transactions the session writer used for all of them,
+then checks every session row reached the database. Fails if the cold
+round is below --min-rate logins/s.
+
+Usage:
+    python benchmarks/bench_login.py --users 64 --concurrency 32
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORKDIR = tempfile.mkdtemp(prefix='bench_login_')
+os.environ.setdefault('TRANSPORT_DB_PATH', os.path.join(WORKDIR, 'bench_login.db'))
+os.environ.setdefault('TRANSPORT_MODEL_PATH', os.path.join(WORKDIR, 'demand_model.joblib'))
+
+import auth  # noqa: E402
+import database  # noqa: E402
+from enhanced_backend_server_2025 import app, init_schema, shutdown_background_services  # noqa: E402
+
+
+def create_users(count):
+    credentials = [(f'conductor{i:04d}', f'pass-{uuid.uuid4().hex[:12]}') for i in range(count)]
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+        hashes = list(pool.map(lambda c: auth.hash_password(c[1]), credentials))
+    with database.get_pool().connection() as conn, database.transaction(conn) as cursor:
+        cursor.executemany("""
+        INSERT INTO users (id, username, email, password_hash, role, department)
+        VALUES (?, ?, ?, ?, 'operator', 'Field Operations')
+        """, [(str(uuid.uuid4()), username, f'{username}@tnbusoptimizer.gov.in', password_hash)
+              for (username, _), password_hash in zip(credentials, hashes)])
+    return credentials
+
+
+def login_round(credentials, concurrency):
+    client = app.test_client()
+
+    def one(credential):
+        started = time.perf_counter()
+        response = client.post('/api/auth/login', json={'username': credential[0], 'password': credential[1]})
+        return response.status_code, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, credentials))
+    elapsed = time.perf_counter() - started
+    latencies = np.array([ms for _, ms in results])
+    return {
+        'rate': len(results) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'statuses': sorted({status for status, _ in results}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--min-rate', type=float, default=None, help='fail below this many cold logins/s')
+    args = parser.parse_args()
+
+    init_schema()
+    # Admit the whole storm, so the numbers measure throughput rather than rejections
+    auth.configure(max_pending=args.concurrency)
+    started = time.perf_counter()
+    credentials = create_users(args.users)
+    print(f"👥 Created {args.users} users in {time.perf_counter() - started:.1f}s "
+          f"({auth.get_authenticator().workers} hashing threads)")
+
+    failed = False
+    rounds = {}
+    for name in ('cold', 'warm'):
+        result = rounds[name] = login_round(credentials, args.concurrency)
+        print(f"   {name:<5} {result['rate']:>8.1f} logins/s  p50 {result['p50_ms']:>8.1f}  "
+              f"p95 {result['p95_ms']:>8.1f} ms  statuses {result['statuses']}")
+        failed |= result['statuses'] != [200]
+
+    writer = auth.get_session_writer()
+    shutdown_background_services()
+    with database.get_pool().connection() as conn:
+        sessions = conn.execute("SELECT COUNT(*) FROM user_sessions").fetchone()[0]
+    print(f"💾 {sessions} sessions written in {writer.flushes} transactions")
+    if sessions != 2 * args.users:
+        print(f"❌ Expected {2 * args.users} session rows")
+        failed = True
+    if args.min_rate is not None and rounds['cold']['rate'] < args.min_rate:
+        print(f"❌ Cold login rate {rounds['cold']['rate']:.1f}/s is below {args.min_rate:.1f}/s")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Benchmark a what-if cost sweep over millions of demand cells using the
+optimizer lookup table, against a per-cell Python loop.
+
+Usage:
+    python benchmarks/bench_optimizer_sweep.py --cells 10000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import optimizer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cells', type=int, default=10_000_000)
+    parser.add_argument('--scalar-cells', type=int, default=200_000, help='cells timed with the scalar path')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(11)
+    demand = rng.integers(0, 900, size=args.cells)
+    distance = rng.integers(40, 130, size=args.cells).astype(np.float64)
+
+    table = optimizer.get_table()
+    started = time.perf_counter()
+    buses, frequency = table.schedule(demand)
+    cost = table.cost_for_demand(demand, distance)
+    vector_seconds = time.perf_counter() - started
+
+    sample = slice(0, min(args.scalar_cells, args.cells))
+    started = time.perf_counter()
+    scalar_cost = []
+    for d, km in zip(demand[sample].tolist(), distance[sample].tolist()):
+        b, f = table.buses[min(d, table.max_demand)], table.frequency[min(d, table.max_demand)]
+        scalar_cost.append(0.0 if b == 0 else km * table.rates.per_km * 60 / f * b + b * table.rates.driver_per_hour)
+    scalar_seconds = (time.perf_counter() - started) * args.cells / len(scalar_cost)
+
+    assert np.allclose(cost[sample], scalar_cost)
+    print(f"🚌 {args.cells:,} demand cells, {int(buses.sum()):,} bus-hours, ₹{cost.sum():,.0f}")
+    print(f"   lookup table:  {vector_seconds * 1000:.1f} ms ({args.cells / vector_seconds / 1e6:.1f} M cells/s)")
+    print(f"   scalar (est.): {scalar_seconds * 1000:.1f} ms ({scalar_seconds / vector_seconds:.0f}x slower)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark the vectorized prediction engine on a large route x day grid.
+
+Usage:
+    python benchmarks/bench_prediction_engine.py --routes 3000 --days 30
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prediction_engine  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=3000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=1.0, help='fail if the best run exceeds this many seconds')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(2025)
+    route_ids = [f'r{i:04d}' for i in range(args.routes)]
+    dates = [date.today() + timedelta(days=i) for i in range(args.days)]
+    base = rng.integers(10, 650, size=(args.routes, 24))
+    distances = rng.integers(40, 130, size=args.routes)
+    weather = rng.choice([1.0, 1.1, 1.2], size=args.days)
+    festival = rng.choice([1.0, 1.0, 1.0, 1.5, 1.8], size=args.days)
+    market_days = {route_id: list(rng.choice(7, size=2, replace=False)) for route_id in route_ids}
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        market = prediction_engine.market_factor_matrix(route_ids, dates, market_days)
+        batch = prediction_engine.run_predictions(
+            route_ids, dates, base, distances,
+            weather_factor=weather, festival_factor=festival, market_factor=market, rng=rng,
+        )
+        timings.append(time.perf_counter() - started)
+
+    cells = batch.demand.size
+    best = min(timings)
+    print(f"🚌 {args.routes} routes x {args.days} days x 24 h = {cells:,} cells")
+    print(f"   best {best * 1000:.1f} ms, mean {sum(timings) / len(timings) * 1000:.1f} ms "
+          f"({cells / best / 1e6:.1f} M cells/s)")
+    print(f"   total buses {batch.total_buses:,}, total cost ₹{batch.total_cost:,.0f}")
+
+    if best > args.budget:
+        print(f"❌ Over budget: {best:.3f}s > {args.budget:.3f}s")
+        sys.exit(1)
+    print(f"✅ Within budget ({args.budget:.3f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Benchmark demand retention over years of simulated history.
+
+Writes --years of hourly demand for --routes routes a month at a time, the
+way the nightly job would see it, and runs retention.compact() after each
+month. At the end of every simulated year it reports the database size and
+the latency of the reads that depend on history: one route's last 30 days
+from passenger_demand_all (model training), a week for all routes from the
+view, 90 days of per-route daily rollups and today's dashboard total. With
+retention the size and latencies level off once the raw and daily windows
+are full instead of growing with history. Finally it checks that per-trip
+counts ingested late for an already sealed day add onto its sealed total.
+
+Usage:
+    python benchmarks/bench_retention.py --routes 500 --years 3 --max-growth 1.25 --budget-ms 250
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('TRANSPORT_DB_PATH', os.path.join(tempfile.mkdtemp(), 'bench_retention.db'))
+
+import database  # noqa: E402
+import ingest  # noqa: E402
+import retention  # noqa: E402
+import rollups  # noqa: E402
+from database import DEMAND_VIEW  # noqa: E402
+from enhanced_backend_server_2025 import _create_schema  # noqa: E402
+from migrations import apply_migrations  # noqa: E402
+
+
+def month_rows(route_ids, base, first, last, rng):
+    """Hourly upsert rows for every route and day in first..last"""
+    days = [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+    counts = (base[:, np.newaxis, :] * rng.uniform(0.7, 1.3, size=(len(route_ids), len(days), 1))).astype(np.int64)
+    for r, route_id in enumerate(route_ids):
+        for d, day in enumerate(days):
+            iso, weekday = day.isoformat(), day.weekday()
+            for hour, count in enumerate(counts[r, d].tolist()):
+                yield (route_id, hour, weekday, count, iso, 0, 1.0, 1.0)
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def measure(conn, route_ids, today, repeat):
+    """Database size and the latency of the history reads"""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    route_id = route_ids[len(route_ids) // 2]
+    month_ago, week_ago, quarter_ago = (today - timedelta(days=days) for days in (30, 7, 90))
+    return {
+        'file_mb': pages * page_size / 1e6,
+        'live_mb': (pages - free) * page_size / 1e6,
+        'hot_rows': conn.execute("SELECT COUNT(*) FROM passenger_demand").fetchone()[0],
+        'partitions': conn.execute(
+            "SELECT COUNT(*) FROM demand_partitions WHERE table_name IS NOT NULL").fetchone()[0],
+        'route_30d_ms': best_of(repeat, lambda: conn.execute(f"""
+            SELECT date_recorded, hour, passenger_count FROM {DEMAND_VIEW}
+            WHERE route_id = ? AND date_recorded > ? AND date_recorded < ? AND is_predicted = 0
+            """, (route_id, month_ago.isoformat(), today.isoformat())).fetchall()),
+        'week_all_ms': best_of(repeat, lambda: conn.execute(f"""
+            SELECT route_id, SUM(passenger_count) FROM {DEMAND_VIEW}
+            WHERE date_recorded BETWEEN ? AND ? GROUP BY route_id
+            """, (week_ago.isoformat(), today.isoformat())).fetchall()),
+        'daily_90d_ms': best_of(repeat, lambda: conn.execute("""
+            SELECT route_id, SUM(passengers) FROM demand_route_daily_rollup
+            WHERE date_recorded BETWEEN ? AND ? GROUP BY route_id
+            """, (quarter_ago.isoformat(), today.isoformat())).fetchall()),
+        'dashboard_ms': best_of(repeat, lambda: conn.execute("""
+            SELECT SUM(passengers) FROM demand_hourly_rollup WHERE date_recorded = ?
+            """, ((today - timedelta(days=1)).isoformat(),)).fetchone()),
+    }
+
+
+def late_accumulate_check(conn, policy, route_id, today):
+    """
+    Accumulate +5 onto one hour of a sealed day, then compact again. Returns
+    (day, expected, after the write, after compaction) as ((rows, passengers)
+    for the hour from the view, daily rollup passengers).
+    """
+    day = (policy.seal_before(today) - timedelta(days=10)).isoformat()
+
+    def totals():
+        hour = conn.execute(f"""
+        SELECT COUNT(*), SUM(passenger_count) FROM {DEMAND_VIEW} WHERE route_id = ? AND date_recorded = ? AND hour = 8
+        """, (route_id, day)).fetchone()
+        daily = conn.execute("""
+        SELECT passengers FROM demand_route_daily_rollup WHERE route_id = ? AND date_recorded = ?
+        """, (route_id, day)).fetchone()
+        return hour, daily[0] if daily else None
+
+    (rows, passengers), daily = totals()
+    expected = ((rows, passengers + 5), daily + 5)
+    late_row = (route_id, 8, date.fromisoformat(day).weekday(), 5, day, False, 1.0, 1.0)
+    ingest.write_batches(conn, [late_row], database.ACCUMULATE_PASSENGER_DEMAND, 1, ingest.IngestReport())
+    after_write = totals()
+    retention.compact(conn, policy, today=today)
+    return day, expected, after_write, totals()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=500)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--hot-days', type=int, default=35)
+    parser.add_argument('--raw-days', type=int, default=90)
+    parser.add_argument('--daily-days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-growth', type=float, default=None,
+                        help='fail if the final live size exceeds this multiple of the size after year 1')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='fail if any history read in the final year takes longer than this')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    pool = database.configure(os.path.join(workdir, 'bench_retention.db'), max_size=1)
+    policy = retention.RetentionPolicy(args.hot_days, args.raw_days, args.daily_days)
+
+    rng = np.random.default_rng(5)
+    route_ids = [f'r{i:04d}' for i in range(args.routes)]
+    base = rng.integers(10, 650, size=(args.routes, 24))
+    first_day = date(2020, 1, 1)
+    end_day = first_day.replace(year=first_day.year + args.years)
+
+    yearly = []
+    write_seconds = compact_seconds = 0.0
+    written = steps = 0
+    try:
+        with pool.connection() as conn:
+            with database.transaction(conn) as cursor:
+                _create_schema(cursor)
+                apply_migrations(cursor)
+
+            month = first_day
+            while month < end_day:
+                last = (month + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+                started = time.perf_counter()
+                with database.transaction(conn) as cursor:
+                    with rollups.deferred(cursor, demand_range=(month, last)):
+                        written += database.bulk_write(cursor, database.UPSERT_PASSENGER_DEMAND,
+                                                       month_rows(route_ids, base, month, last, rng))
+                write_seconds += time.perf_counter() - started
+
+                today = last + timedelta(days=1)
+                started = time.perf_counter()
+                steps += retention.compact(conn, policy, today=today)['steps']
+                compact_seconds += time.perf_counter() - started
+
+                if today.month == first_day.month and today.day == 1:
+                    stats = measure(conn, route_ids, today, args.repeat)
+                    yearly.append(stats)
+                    print(f"📅 Year {len(yearly)}: {stats['live_mb']:.0f} MB live ({stats['file_mb']:.0f} MB file), "
+                          f"{stats['hot_rows']:,} hot rows, {stats['partitions']} partitions")
+                    print(f"   route 30d {stats['route_30d_ms']:.2f} ms, week all routes {stats['week_all_ms']:.1f} ms, "
+                          f"daily 90d {stats['daily_90d_ms']:.1f} ms, dashboard {stats['dashboard_ms']:.3f} ms")
+                month = today
+
+            late = late_accumulate_check(conn, policy, route_ids[0], end_day)
+    finally:
+        pool.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"🚌 Wrote {written:,} hourly rows ({args.routes} routes x {args.years} years) in {write_seconds:.1f}s; "
+          f"{steps:,} compaction steps took {compact_seconds:.1f}s")
+    failed = False
+    day, expected, after_write, after_compact = late
+    if after_write == expected and after_compact == expected:
+        print(f"   Late per-trip counts for sealed day {day} added onto its sealed total")
+    else:
+        print(f"❌ Late counts for sealed day {day}: expected {expected}, "
+              f"got {after_write} after the write and {after_compact} after compaction")
+        failed = True
+    if args.max_growth is not None and len(yearly) > 1:
+        growth = yearly[-1]['live_mb'] / yearly[0]['live_mb']
+        print(f"   Live size year {len(yearly)} / year 1: {growth:.2f}x")
+        if growth > args.max_growth:
+            print(f"❌ Database kept growing: {growth:.2f}x > {args.max_growth:.2f}x")
+            failed = True
+    if args.budget_ms is not None and yearly:
+        slowest = max(value for key, value in yearly[-1].items() if key.endswith('_ms'))
+        if slowest > args.budget_ms:
+            print(f"❌ Over budget: {slowest:.1f} ms > {args.budget_ms:.1f} ms")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
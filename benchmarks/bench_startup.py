@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Cold-start timing for the API server.
+
+Prepares a seeded database once, then starts fresh interpreters that import
+enhanced_backend_server_2025 and answer /api/health/ready, the same work an
+autoscaled worker does before it takes traffic. Reports the import time,
+the time to the first ready response and the whole process wall time, and
+checks that heavy optional modules (feedparser, the ML libraries) were not
+loaded along the way. Fails if the slowest start exceeds the budget.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 1000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('feedparser', 'sklearn', 'joblib', 'pandas', 'backtest', 'forecasting')
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import enhanced_backend_server_2025 as server
+imported = time.perf_counter()
+response = server.app.test_client().get('/api/health/ready')
+ready = time.perf_counter()
+print(json.dumps({{
+    'status': response.status_code,
+    'import_ms': (imported - started) * 1000,
+    'ready_ms': (ready - started) * 1000,
+    'loaded': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def prepare(db_path, days):
+    env = dict(os.environ, TRANSPORT_DB_PATH=db_path)
+    subprocess.run([sys.executable, os.path.join(ROOT, 'seed_data.py'), '--days', str(days)],
+                   env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def cold_start(db_path, model_path):
+    env = dict(os.environ, TRANSPORT_DB_PATH=db_path, TRANSPORT_MODEL_PATH=model_path,
+               TRANSPORT_NIGHTLY_AT='')
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD.format(root=ROOT, heavy=HEAVY_MODULES)],
+                            env=env, check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['wall_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--days', type=int, default=30, help='days of demo history to seed')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='fail if the slowest process wall time exceeds this many milliseconds')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, 'bench_startup.db')
+    started = time.perf_counter()
+    prepare(db_path, args.days)
+    print(f"🌱 Seeded {args.days} days in {time.perf_counter() - started:.1f}s (not part of startup)")
+
+    runs = [cold_start(db_path, os.path.join(workdir, 'model.joblib')) for _ in range(args.runs)]
+    for i, run in enumerate(runs, 1):
+        print(f"  run {i}: import {run['import_ms']:7.1f} ms  ready {run['ready_ms']:7.1f} ms  "
+              f"process {run['wall_ms']:7.1f} ms  status {run['status']}")
+
+    failed = False
+    walls = sorted(run['wall_ms'] for run in runs)
+    print(f"⏱️  Cold start: median {walls[len(walls) // 2]:.1f} ms, worst {walls[-1]:.1f} ms")
+    if any(run['status'] != 200 for run in runs):
+        print("❌ /api/health/ready did not return 200")
+        failed = True
+    loaded = sorted({name for run in runs for name in run['loaded']})
+    if loaded:
+        print(f"❌ Heavy modules loaded at startup: {', '.join(loaded)}")
+        failed = True
+    if args.budget_ms is not None and walls[-1] > args.budget_ms:
+        print(f"❌ Slowest start {walls[-1]:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""
+Shared SQLite data-access layer for the Transport Optimizer.
+
+Every endpoint borrows a pooled connection instead of opening and closing
+its own. Connections run in WAL mode so dashboard reads keep flowing while
+the daily-update job writes, and each connection keeps its own prepared
+statement cache alive between requests.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+from flask import g, has_app_context
+
+try:
+    import fcntl
+except ImportError:  # Windows runs a single server process
+    fcntl = None
+
+DEFAULT_DB_PATH = 'transport_optimizer.db'
+DB_PATH_ENV = 'TRANSPORT_DB_PATH'
+
+# Pragmas applied to every pooled connection
+CONNECTION_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', 5000),
+    ('cache_size', -16000),      # ~16 MB page cache per connection
+    ('temp_store', 'MEMORY'),
+    ('mmap_size', 268435456),    # 256 MB memory-mapped reads
+)
+
+DEFAULT_BULK_CHUNK_SIZE = int(os.environ.get('TRANSPORT_BULK_CHUNK_SIZE', 5000))
+
+# Hot demand table plus every monthly partition (see retention.py); read history through this
+DEMAND_VIEW = 'passenger_demand_all'
+
+# Shared write statements; keyed on the unique indexes added by migration 1
+UPSERT_PASSENGER_DEMAND = """
+INSERT INTO passenger_demand
+(route_id, hour, day_of_week, passenger_count, date_recorded, is_predicted, festival_factor, market_factor)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (route_id, date_recorded, hour) DO UPDATE SET
+    day_of_week = excluded.day_of_week,
+    passenger_count = excluded.passenger_count,
+    is_predicted = excluded.is_predicted,
+    festival_factor = excluded.festival_factor,
+    market_factor = excluded.market_factor
+"""
+
+# Observed counts added onto whatever the hour already holds (per-trip feeds)
+ACCUMULATE_PASSENGER_DEMAND = """
+INSERT INTO passenger_demand
+(route_id, hour, day_of_week, passenger_count, date_recorded, is_predicted, festival_factor, market_factor)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (route_id, date_recorded, hour) DO UPDATE SET
+    day_of_week = excluded.day_of_week,
+    passenger_count = passenger_count + excluded.passenger_count,
+    is_predicted = excluded.is_predicted,
+    festival_factor = excluded.festival_factor,
+    market_factor = excluded.market_factor
+"""
+
+UPSERT_SCHEDULE_PREDICTION = """
+INSERT INTO daily_schedule_predictions
+(route_id, prediction_date, hour, predicted_passengers, recommended_buses,
+ frequency_minutes, cost_per_hour, utilization_rate)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (route_id, prediction_date, hour) DO UPDATE SET
+    predicted_passengers = excluded.predicted_passengers,
+    recommended_buses = excluded.recommended_buses,
+    frequency_minutes = excluded.frequency_minutes,
+    cost_per_hour = excluded.cost_per_hour,
+    utilization_rate = excluded.utilization_rate,
+    created_at = CURRENT_TIMESTAMP
+"""
+
+
+def resolve_db_path(path=None):
+    """Resolve the database path from an explicit value or the environment"""
+    return path or os.environ.get(DB_PATH_ENV, DEFAULT_DB_PATH)
+
+
+@contextmanager
+def init_lock(path=None):
+    """
+    Exclusive lock on <db>.lock held while one process creates or migrates
+    the database; other server processes block here until it is done.
+    """
+    lock_path = f"{resolve_db_path(path)}.lock"
+    with open(lock_path, 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived WAL-mode SQLite connections"""
+
+    def __init__(self, path=None, max_size=8, cached_statements=256, timeout=30.0, factory=None):
+        self.path = resolve_db_path(path)
+        self.max_size = max_size
+        self.factory = factory
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._pid = os.getpid()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            isolation_level=None,          # explicit BEGIN/COMMIT via transaction()
+            check_same_thread=False,       # connections move between worker threads
+            cached_statements=self.cached_statements,
+            factory=self.factory or _connection_factory,
+        )
+        for name, value in CONNECTION_PRAGMAS:
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _reset_after_fork(self):
+        # Connections must never be shared across processes
+        if os.getpid() != self._pid:
+            self._idle = queue.LifoQueue()
+            self._created = 0
+            self._pid = os.getpid()
+
+    def acquire(self):
+        """Borrow a connection, opening a new one while under max_size"""
+        self._reset_after_fork()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+
+        return self._idle.get(timeout=self.timeout)
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any open transaction"""
+        if os.getpid() != self._pid:
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager for code running outside a Flask request"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown and in tests)"""
+        with self._lock:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
+                self._created -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_connection_factory = sqlite3.Connection
+
+
+def set_connection_factory(factory):
+    """Use a sqlite3.Connection subclass for connections opened from now on"""
+    global _connection_factory
+    _connection_factory = factory or sqlite3.Connection
+    if _pool is not None:
+        _pool.close_all()
+
+
+def configure(path=None, **pool_options):
+    """Create (or replace) the process-wide connection pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = ConnectionPool(path, **pool_options)
+    return _pool
+
+
+def get_pool():
+    """Return the process-wide pool, creating it from the environment if needed"""
+    if _pool is None:
+        return configure()
+    return _pool
+
+
+def get_db():
+    """Get the pooled connection bound to the current request"""
+    if not has_app_context():
+        raise RuntimeError('get_db() needs an app context; use get_pool().connection()')
+    if 'db_conn' not in g:
+        g.db_conn = get_pool().acquire()
+    return g.db_conn
+
+
+def release_db(exc=None):
+    """Return the request's connection to the pool"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        get_pool().release(conn)
+
+
+@contextmanager
+def transaction(conn=None):
+    """Run a block inside BEGIN IMMEDIATE ... COMMIT and yield a cursor"""
+    conn = conn or get_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def bulk_write(cursor, sql, rows, chunk_size=None):
+    """
+    Write an iterable of parameter tuples with executemany in fixed-size chunks.
+
+    Meant to run inside transaction(); chunking bounds memory for generators
+    without committing partial batches. Returns the number of rows written.
+    """
+    chunk_size = chunk_size or DEFAULT_BULK_CHUNK_SIZE
+    rows = iter(rows)
+    written = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return written
+        cursor.executemany(sql, chunk)
+        written += len(chunk)
+
+
+def init_app(app):
+    """Configure the pool from app.config and release connections per request"""
+    app.config.setdefault('DATABASE_PATH', resolve_db_path())
+    app.config.setdefault('DATABASE_POOL_SIZE', 8)
+    app.config.setdefault('BULK_WRITE_CHUNK_SIZE', DEFAULT_BULK_CHUNK_SIZE)
+    configure(app.config['DATABASE_PATH'], max_size=app.config['DATABASE_POOL_SIZE'])
+    app.teardown_appcontext(release_db)
@@ -0,0 +1,386 @@
+"""
+Dense (route x day x hour) demand cube on disk for analytics and training.
+
+Observed hourly counts are exported to an int32 .npy array shaped (routes,
+days, 24), with -1 for hours that have no row, next to (days,) festival and
+(routes, days) market factor arrays and a meta.json that names the files,
+the route order, the first date and how many days are filled. Readers
+memory-map the arrays read-only, so the model, the backtest and analytics
+slice years of history without building Python tuples, and every worker
+process shares the same page-cache pages.
+
+sync() keeps the cube current through yesterday; today is still being
+recorded, so publishing it would force a copy on every later sync. It
+compares each retained day's per-hour totals with demand_hourly_rollup,
+less the predicted rows the cube leaves out, and re-reads only the days
+that differ (new days, late ingest, corrections) from passenger_demand_all. Routes and
+days are allocated with headroom. Only days past the published day count,
+which no reader can see yet, are filled in place. When a published day
+changes, capacity runs out or older history appears, the cube is copied
+into new files under a new generation instead, so readers holding the old
+files keep a consistent snapshot. Days whose hourly rows retention has
+since dropped stay in the cube.
+
+    python demand_cube.py            # bring the cube up to date
+    python demand_cube.py --rebuild  # export every retained day again
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from database import DEMAND_VIEW, resolve_db_path
+from rollups import retained_from
+
+try:
+    import fcntl
+except ImportError:  # Windows runs a single server process
+    fcntl = None
+
+HOURS_PER_DAY = 24
+MISSING = -1
+CUBE_FORMAT_VERSION = 1
+CUBE_DIR_ENV = 'TRANSPORT_CUBE_DIR'
+META_FILE = 'meta.json'
+ARRAYS = ('counts', 'festival', 'market')
+
+# Capacity grows in these steps so appends rarely copy the cube
+ROUTE_HEADROOM = 64
+DAY_HEADROOM = 366
+
+
+def resolve_cube_dir(path=None):
+    """Cube directory: path, TRANSPORT_CUBE_DIR, or <database name>_cube beside the database"""
+    return path or os.environ.get(CUBE_DIR_ENV) or f"{os.path.splitext(resolve_db_path())[0]}_cube"
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, META_FILE)) as handle:
+            meta = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == CUBE_FORMAT_VERSION else None
+
+
+def _write_meta(path, meta):
+    """Write atomically so readers never see a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=path, suffix='.tmp')
+    with os.fdopen(fd, 'w') as handle:
+        json.dump(meta, handle)
+    os.replace(tmp_path, os.path.join(path, META_FILE))
+
+
+class DemandCube:
+    """Read-only snapshot of the cube files; arrays are memory-mapped, not loaded"""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.generation = meta['generation']
+        self.route_ids = list(meta['route_ids'])
+        self.route_index = {route_id: r for r, route_id in enumerate(self.route_ids)}
+        self.start = date.fromisoformat(meta['start_date'])
+        self.day_count = meta['days']
+        routes, days = len(self.route_ids), self.day_count
+        arrays = {name: np.load(os.path.join(path, meta['files'][name]), mmap_mode='r') for name in ARRAYS}
+        self.counts = arrays['counts'][:routes, :days]
+        self.festival = arrays['festival'][:days]
+        self.market = arrays['market'][:routes, :days]
+
+    @property
+    def end(self):
+        return self.start + timedelta(days=self.day_count - 1)
+
+    def dates(self, first=0, stop=None):
+        stop = self.day_count if stop is None else stop
+        return [self.start + timedelta(days=offset) for offset in range(first, stop)]
+
+    def day_index(self, day):
+        """Offset of day in the cube (may fall outside 0..day_count-1)"""
+        return (day - self.start).days
+
+    def rows(self, route_ids):
+        """Cube row of each route, or -1 for routes the cube has not seen"""
+        return np.array([self.route_index.get(route_id, -1) for route_id in route_ids], dtype=np.int64)
+
+    def history(self, route_ids, start, end):
+        """
+        (actual, festival, market) for start..end inclusive: actual is float
+        (routes, days, hours) with NaN where nothing was recorded.
+        """
+        day_count = (end - start).days + 1
+        actual = np.full((len(route_ids), day_count, HOURS_PER_DAY), np.nan)
+        festival = np.ones(day_count)
+        market = np.ones((len(route_ids), day_count))
+        lo, hi = max(self.day_index(start), 0), min(self.day_index(end) + 1, self.day_count)
+        if lo < hi:
+            out = slice(lo - self.day_index(start), hi - self.day_index(start))
+            rows = self.rows(route_ids)
+            known = rows >= 0
+            block = self.counts[rows[known], lo:hi]
+            actual[known, out] = np.where(block >= 0, block, np.nan)
+            festival[out] = self.festival[lo:hi]
+            market[known, out] = self.market[rows[known], lo:hi]
+        return actual, festival, market
+
+    def hourly_profile(self, days=None, route_id=None):
+        """(7, 24) mean recorded passengers per route-hour by weekday over the last days"""
+        first = 0 if days is None else max(self.day_count - days, 0)
+        counts = self.counts[[self.route_index[route_id]] if route_id else slice(None), first:]
+        recorded = counts >= 0
+        weekdays = (np.arange(first, self.day_count) + self.start.weekday()) % 7
+        totals = np.zeros((7, HOURS_PER_DAY))
+        samples = np.zeros((7, HOURS_PER_DAY))
+        np.add.at(totals, weekdays, np.where(recorded, counts, 0).sum(axis=0, dtype=np.int64))
+        np.add.at(samples, weekdays, recorded.sum(axis=0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(samples > 0, totals / np.maximum(samples, 1), np.nan)
+
+
+def _capacity(needed, headroom):
+    return needed + headroom - needed % headroom
+
+
+def _allocate(path, generation, route_capacity, day_capacity, old=None, offset=0):
+    """New generation of array files, copying an old cube's contents in at a day offset"""
+    files = {name: f'{name}-{generation}.npy' for name in ARRAYS}
+    shapes = {
+        'counts': ((route_capacity, day_capacity, HOURS_PER_DAY), np.int32, MISSING),
+        'festival': ((day_capacity,), np.float32, 1.0),
+        'market': ((route_capacity, day_capacity), np.float32, 1.0),
+    }
+    for name, (shape, dtype, fill) in shapes.items():
+        array = np.lib.format.open_memmap(os.path.join(path, files[name]), mode='w+', dtype=dtype, shape=shape)
+        array[...] = fill
+        if old is not None:
+            source = getattr(old, name)
+            if name == 'festival':
+                array[offset:offset + source.shape[0]] = source
+            else:
+                array[:source.shape[0], offset:offset + source.shape[1]] = source
+        array.flush()
+        del array
+    return files
+
+
+def _changed_days(conn, cube_counts, start, first_day, through):
+    """Day offsets from first_day..through whose observed per-hour totals differ from the cube's"""
+    day_count = (through - first_day).days + 1
+    expected = np.zeros((day_count, HOURS_PER_DAY), dtype=np.int64)
+    expected_hours = np.zeros((day_count, HOURS_PER_DAY), dtype=np.int64)
+    for day, hour, passengers, route_hours in conn.execute("""
+    SELECT date_recorded, hour, passengers, route_hours FROM demand_hourly_rollup
+    WHERE date_recorded BETWEEN ? AND ?
+    """, (first_day.isoformat(), through.isoformat())):
+        d = (date.fromisoformat(day) - first_day).days
+        expected[d, hour], expected_hours[d, hour] = passengers, route_hours
+
+    lo = (first_day - start).days
+    block = cube_counts[:, lo:lo + day_count]
+    recorded = block >= 0
+    actual = np.zeros_like(expected)
+    actual_hours = np.zeros_like(expected_hours)
+    actual[:block.shape[1]] = np.where(recorded, block, 0).sum(axis=0, dtype=np.int64)
+    actual_hours[:block.shape[1]] = recorded.sum(axis=0)
+    differs = ((expected != actual) | (expected_hours != actual_hours)).any(axis=1)
+    # The rollup also counts predicted rows, which the cube never holds; only look them up for days that differ
+    for first, last in _runs(np.flatnonzero(differs)):
+        for day, hour, passengers, route_hours in conn.execute(f"""
+        SELECT date_recorded, hour, SUM(passenger_count), COUNT(*) FROM {DEMAND_VIEW}
+        WHERE is_predicted IS NOT 0 AND date_recorded BETWEEN ? AND ?
+        GROUP BY date_recorded, hour
+        """, ((first_day + timedelta(days=first)).isoformat(), (first_day + timedelta(days=last)).isoformat())):
+            d = (date.fromisoformat(day) - first_day).days
+            expected[d, hour] -= passengers
+            expected_hours[d, hour] -= route_hours
+    differs = ((expected != actual) | (expected_hours != actual_hours)).any(axis=1)
+    return lo + np.flatnonzero(differs)
+
+
+def _runs(offsets):
+    """Contiguous (first, last) runs of sorted day offsets"""
+    runs = []
+    for offset in offsets.tolist():
+        if runs and offset == runs[-1][1] + 1:
+            runs[-1][1] = offset
+        else:
+            runs.append([offset, offset])
+    return runs
+
+
+def _load_days(conn, arrays, route_index, start, first, last):
+    """Overwrite day offsets first..last with observed rows from every demand partition"""
+    counts, festival, market = arrays
+    counts[:, first:last + 1] = MISSING
+    festival[first:last + 1] = 1.0
+    market[:, first:last + 1] = 1.0
+    rows = 0
+    for route_id, day, hour, count, festival_factor, market_factor in conn.execute(f"""
+    SELECT route_id, date_recorded, hour, passenger_count, festival_factor, market_factor
+    FROM {DEMAND_VIEW}
+    WHERE is_predicted = 0 AND date_recorded BETWEEN ? AND ?
+    """, ((start + timedelta(days=first)).isoformat(), (start + timedelta(days=last)).isoformat())):
+        r = route_index.get(route_id)
+        if r is None:
+            continue
+        d = (date.fromisoformat(day) - start).days
+        counts[r, d, hour] = count
+        festival[d] = festival_factor or 1.0
+        market[r, d] = market_factor or 1.0
+        rows += 1
+    return rows
+
+
+_lock = threading.Lock()
+
+
+def sync(conn, path=None, through=None, rebuild=False):
+    """
+    Bring the cube up to date with recorded demand through the given day
+    (default and latest: yesterday, the last completed day). Returns
+    {'generation', 'days', 'routes', 'days_loaded', 'rows_loaded', 'grown',
+    'copied'}.
+    """
+    path = resolve_cube_dir(path)
+    yesterday = date.today() - timedelta(days=1)
+    through = min(through or yesterday, yesterday)
+    os.makedirs(path, exist_ok=True)
+    with _lock, open(os.path.join(path, '.lock'), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            return _sync(conn, path, through, rebuild)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _sync(conn, path, through, rebuild):
+    previous = _read_meta(path)
+    meta = None if rebuild else previous
+    first_recorded = conn.execute("SELECT MIN(date_recorded) FROM demand_hourly_rollup").fetchone()[0]
+    if first_recorded is None and meta is None:
+        return {'generation': None, 'days': 0, 'routes': 0, 'days_loaded': 0, 'rows_loaded': 0, 'grown': False,
+                'copied': False}
+
+    route_ids = list(meta['route_ids']) if meta else []
+    known = set(route_ids)
+    route_ids += [row[0] for row in conn.execute("SELECT id FROM routes ORDER BY id") if row[0] not in known]
+    start = date.fromisoformat(meta['start_date']) if meta else date.fromisoformat(first_recorded)
+    if first_recorded is not None:
+        start = min(start, date.fromisoformat(first_recorded))
+    day_count = max((through - start).days + 1, meta['days'] if meta else 0)
+
+    grown = (meta is None or len(route_ids) > meta['route_capacity'] or day_count > meta['day_capacity']
+             or start.isoformat() != meta['start_date'])
+    if grown:
+        old = DemandCube(path, meta) if meta else None
+        generation = previous['generation'] + 1 if previous else 1
+        route_capacity = _capacity(len(route_ids), ROUTE_HEADROOM)
+        day_capacity = _capacity(day_count, DAY_HEADROOM)
+        files = _allocate(path, generation, route_capacity, day_capacity, old,
+                          (old.start - start).days if old else 0)
+        stale = list(previous['files'].values()) if previous else []
+        del old
+    else:
+        generation, files, stale = meta['generation'], meta['files'], []
+        route_capacity, day_capacity = meta['route_capacity'], meta['day_capacity']
+
+    # Only days that still have hourly rows can be compared and re-read
+    compare_from = max(start, date.fromisoformat(retained_from(conn) or start.isoformat()))
+    counts = np.load(os.path.join(path, files['counts']), mmap_mode='r')
+    changed = (_changed_days(conn, counts[:len(route_ids)], start, compare_from, through)
+               if compare_from <= through else np.array([], dtype=np.int64))
+    del counts
+    copied = not grown and changed.size > 0 and changed[0] < meta['days']
+    if copied:
+        # Readers have these days mapped: re-read them into a copy, never under a reader
+        old = DemandCube(path, meta)
+        generation = meta['generation'] + 1
+        files = _allocate(path, generation, route_capacity, day_capacity, old)
+        stale = list(meta['files'].values())
+        del old
+
+    arrays = [np.load(os.path.join(path, files[name]), mmap_mode='r+') for name in ARRAYS]
+    route_index = {route_id: r for r, route_id in enumerate(route_ids)}
+    rows_loaded = sum(_load_days(conn, arrays, route_index, start, first, last) for first, last in _runs(changed))
+    for array in arrays:
+        array.flush()
+    del arrays
+
+    _write_meta(path, {
+        'version': CUBE_FORMAT_VERSION,
+        'generation': generation,
+        'files': files,
+        'route_ids': route_ids,
+        'start_date': start.isoformat(),
+        'days': day_count,
+        'route_capacity': route_capacity,
+        'day_capacity': day_capacity,
+        'synced_at': date.today().isoformat(),
+    })
+    for name in stale:
+        try:
+            os.remove(os.path.join(path, name))
+        except OSError:
+            pass  # A reader still has it open on a platform that refuses to delete it
+    return {'generation': generation, 'days': day_count, 'routes': len(route_ids),
+            'days_loaded': int(changed.size), 'rows_loaded': rows_loaded, 'grown': grown, 'copied': copied}
+
+
+_cube = None
+_cube_mtime = None
+_cube_lock = threading.Lock()
+
+
+def get_cube(path=None):
+    """
+    Return the shared read-only cube, reopening it whenever a sync has
+    written newer metadata; None if no cube has been exported yet.
+    """
+    global _cube, _cube_mtime
+    path = resolve_cube_dir(path)
+    try:
+        mtime = os.path.getmtime(os.path.join(path, META_FILE))
+    except OSError:
+        return None
+    with _cube_lock:
+        if _cube is None or _cube.path != path or mtime != _cube_mtime:
+            meta = _read_meta(path)
+            _cube = DemandCube(path, meta) if meta else None
+            _cube_mtime = mtime
+        return _cube
+
+
+def refresh(conn, path=None):
+    """sync() and return the reopened cube"""
+    sync(conn, path)
+    return get_cube(path)
+
+
+def main():
+    from database import get_pool
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--path', default=None, help=f'cube directory (default ${CUBE_DIR_ENV} or beside the database)')
+    parser.add_argument('--rebuild', action='store_true', help='export every retained day again')
+    args = parser.parse_args()
+
+    with get_pool().connection() as conn:
+        summary = sync(conn, args.path, rebuild=args.rebuild)
+    if summary['generation'] is None:
+        print("📭 No recorded demand to export yet")
+        return
+    print(f"🧊 Cube generation {summary['generation']}: {summary['routes']} routes x {summary['days']} days; "
+          f"loaded {summary['days_loaded']} days ({summary['rows_loaded']:,} rows)"
+          + (", reallocated" if summary['grown'] else ", copied" if summary['copied'] else ""))
+    print(f"💾 {resolve_cube_dir(args.path)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""
+Per-route demand models trained on recorded passenger demand history.
+
+Each route gets a linear model of log ridership over one-hot hour and
+weekday plus the logged weather, festival and market multipliers, so the
+factors act multiplicatively as they do in the rule-based engine. Models
+are updated with partial_fit on days recorded since they were last
+trained, persisted with joblib and loaded lazily. Training slices history
+out of the memory-mapped demand cube (demand_cube.py) instead of reading
+rows. Inference for any number of routes and days is one einsum over the
+stacked coefficients; routes without enough history are left to the
+rule-based engine.
+
+    python demand_model.py            # train on new days and save
+    python demand_model.py --rebuild  # retrain every route from scratch
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+import demand_cube
+import external_factors
+
+HOURS_PER_DAY = 24
+MODEL_PATH_ENV = 'TRANSPORT_MODEL_PATH'
+DEFAULT_MODEL_PATH = os.path.join('models', 'demand_model.joblib')
+MODEL_FORMAT_VERSION = 1
+
+# Days of history a route needs before its model replaces the rule-based engine
+MIN_HISTORY_DAYS = 14
+INITIAL_EPOCHS = 20
+UPDATE_EPOCHS = 3
+
+FEATURE_NAMES = (
+    [f'hour_{hour}' for hour in range(HOURS_PER_DAY)]
+    + [f'weekday_{day}' for day in range(7)]
+    + ['log_weather', 'log_festival', 'log_market']
+)
+WEATHER_COLUMN = HOURS_PER_DAY + 7
+FESTIVAL_COLUMN = WEATHER_COLUMN + 1
+MARKET_COLUMN = WEATHER_COLUMN + 2
+
+
+def resolve_model_path(path=None):
+    return path or os.environ.get(MODEL_PATH_ENV, DEFAULT_MODEL_PATH)
+
+
+def design_matrix(hours, weekdays, weather, festival, market):
+    """Feature rows for equal-length arrays of observations"""
+    hours = np.asarray(hours, dtype=np.int64)
+    features = np.zeros((hours.size, len(FEATURE_NAMES)), dtype=np.float64)
+    rows = np.arange(hours.size)
+    features[rows, hours] = 1.0
+    features[rows, HOURS_PER_DAY + np.asarray(weekdays, dtype=np.int64)] = 1.0
+    features[:, WEATHER_COLUMN] = np.log(np.asarray(weather, dtype=np.float64))
+    features[:, FESTIVAL_COLUMN] = np.log(np.asarray(festival, dtype=np.float64))
+    features[:, MARKET_COLUMN] = np.log(np.asarray(market, dtype=np.float64))
+    return features
+
+
+def import_backend():
+    """Import scikit-learn now rather than on the first fit"""
+    import sklearn.linear_model  # noqa: F401
+
+
+def _new_regressor():
+    from sklearn.linear_model import SGDRegressor
+    return SGDRegressor(loss='squared_error', penalty='l2', alpha=1e-5,
+                        learning_rate='invscaling', eta0=0.05, random_state=0)
+
+
+def weather_history(conn, district=None):
+    """Recorded weather multiplier for each date in the service's district"""
+    district = district or external_factors.get_service().district
+    return dict(conn.execute("""
+    SELECT date_recorded, weather_factor FROM external_factors
+    WHERE district = ? AND weather_factor IS NOT NULL
+    """, (district,)).fetchall())
+
+
+class DemandModel:
+    """Per-route regressors plus the last date each was trained through"""
+
+    def __init__(self):
+        self.models = {}
+        self.trained_through = {}
+        self.samples = {}
+        self._coefficients = None
+
+    def __contains__(self, route_id):
+        return route_id in self.models
+
+    def fit_route(self, route_id, features, target, epochs, rng):
+        """partial_fit one route for a few shuffled passes"""
+        model = self.models.get(route_id) or _new_regressor()
+        for _ in range(epochs):
+            order = rng.permutation(len(target))
+            model.partial_fit(features[order], target[order])
+        self.models[route_id] = model
+        self.samples[route_id] = self.samples.get(route_id, 0) + len(target)
+        self._coefficients = None
+
+    def update(self, conn, through=None, route_ids=None, seed=0, cube=None):
+        """
+        Train each route on observed days after its trained_through date and
+        before through (default today, whose counts are still arriving).
+        History is sliced from the demand cube (synced first unless one is
+        passed). Returns {route_id: days_learned}.
+        """
+        through = through or date.today()
+        cube = cube or demand_cube.refresh(conn)
+        if cube is None:
+            return {}
+        if route_ids is None:
+            route_ids = [row[0] for row in conn.execute("SELECT id FROM routes ORDER BY id")]
+        weather_by_day = weather_history(conn)
+        stop = min(cube.day_index(through), cube.day_count)
+        weather = np.array([weather_by_day.get(day.isoformat(), 1.0) or 1.0
+                            for day in cube.dates(0, max(stop, 0))])
+        weekdays = (np.arange(cube.day_count) + cube.start.weekday()) % 7
+        rng = np.random.default_rng(seed)
+        learned = {}
+
+        for route_id, row in zip(route_ids, cube.rows(route_ids).tolist()):
+            since = self.trained_through.get(route_id)
+            first = 0 if since is None else max(cube.day_index(date.fromisoformat(since)) + 1, 0)
+            if row < 0 or first >= stop:
+                continue
+            counts = cube.counts[row, first:stop]
+            recorded = counts >= 0
+            days_recorded = np.flatnonzero(recorded.any(axis=1))
+            if days_recorded.size == 0:
+                continue
+            if route_id not in self.models and days_recorded.size < MIN_HISTORY_DAYS:
+                continue
+
+            day_offsets, hours = np.nonzero(recorded)
+            features = design_matrix(
+                hours, weekdays[first + day_offsets], weather[first + day_offsets],
+                cube.festival[first + day_offsets], cube.market[row, first + day_offsets],
+            )
+            target = np.log1p(counts[day_offsets, hours].astype(np.float64))
+            epochs = UPDATE_EPOCHS if route_id in self.models else INITIAL_EPOCHS
+            self.fit_route(route_id, features, target, epochs, rng)
+            last = cube.start + timedelta(days=first + int(days_recorded[-1]))
+            self.trained_through[route_id] = last.isoformat()
+            learned[route_id] = int(days_recorded.size)
+        return learned
+
+    def coefficients(self, route_ids):
+        """Stacked (routes, features) weights, intercepts and a fitted mask"""
+        key = tuple(route_ids)
+        if self._coefficients is not None and self._coefficients[0] == key:
+            return self._coefficients[1:]
+        coef = np.zeros((len(route_ids), len(FEATURE_NAMES)), dtype=np.float64)
+        intercept = np.zeros(len(route_ids), dtype=np.float64)
+        fitted = np.zeros(len(route_ids), dtype=bool)
+        for r, route_id in enumerate(route_ids):
+            model = self.models.get(route_id)
+            if model is not None:
+                coef[r] = model.coef_
+                intercept[r] = model.intercept_[0]
+                fitted[r] = True
+        self._coefficients = (key, coef, intercept, fitted)
+        return coef, intercept, fitted
+
+    def predict(self, route_ids, dates, weather_factor=1.0, festival_factor=1.0, market_factor=1.0):
+        """
+        (routes, days, hours) demand; rows of routes without a model are NaN.
+
+        Weather and festival factors are per-day arrays or scalars, the
+        market factor is (routes, days) or scalar.
+        """
+        coef, intercept, fitted = self.coefficients(route_ids)
+        day_count = len(dates)
+        weekdays = np.array([day.weekday() for day in dates], dtype=np.int64)
+
+        # Day/hour features shared by every route; market varies by route so it is added separately
+        hours = np.tile(np.arange(HOURS_PER_DAY), day_count)
+        features = design_matrix(
+            hours, np.repeat(weekdays, HOURS_PER_DAY),
+            np.repeat(np.broadcast_to(weather_factor, (day_count,)), HOURS_PER_DAY),
+            np.repeat(np.broadcast_to(festival_factor, (day_count,)), HOURS_PER_DAY),
+            np.ones(hours.size),
+        ).reshape(day_count, HOURS_PER_DAY, -1)
+
+        log_demand = np.einsum('rf,dhf->rdh', coef, features) + intercept[:, np.newaxis, np.newaxis]
+        market = np.broadcast_to(np.asarray(market_factor, dtype=np.float64), (len(route_ids), day_count))
+        log_demand += (coef[:, MARKET_COLUMN, np.newaxis] * np.log(market))[:, :, np.newaxis]
+
+        demand = np.floor(np.maximum(np.expm1(log_demand), 0))
+        demand[~fitted] = np.nan
+        return demand
+
+    def save(self, path=None):
+        """Write atomically so other processes never load a partial file"""
+        import joblib
+        path = resolve_model_path(path)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+        os.close(fd)
+        joblib.dump({
+            'version': MODEL_FORMAT_VERSION,
+            'features': FEATURE_NAMES,
+            'models': self.models,
+            'trained_through': self.trained_through,
+            'samples': self.samples,
+        }, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path=None):
+        import joblib
+        state = joblib.load(resolve_model_path(path))
+        model = cls()
+        if state.get('version') == MODEL_FORMAT_VERSION and list(state.get('features', ())) == FEATURE_NAMES:
+            model.models = state['models']
+            model.trained_through = state['trained_through']
+            model.samples = state['samples']
+        return model
+
+    def summary(self):
+        return {
+            'routes': len(self.models),
+            'samples': int(sum(self.samples.values())),
+            'trained_through': max(self.trained_through.values()) if self.trained_through else None,
+        }
+
+
+_model = None
+_model_mtime = None
+_model_lock = threading.Lock()
+
+
+def get_model(path=None):
+    """
+    Return the shared model, loading it on first use and again whenever
+    another process has saved a newer file. Empty if nothing is saved yet.
+    """
+    global _model, _model_mtime
+    path = resolve_model_path(path)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    with _model_lock:
+        if _model is None or mtime != _model_mtime:
+            _model = DemandModel.load(path) if mtime is not None else DemandModel()
+            _model_mtime = mtime
+        return _model
+
+
+def predict_for(registry, dates, weather_factor=1.0, festival_factor=1.0):
+    """Model demand for every registry route, or None when no route has a model yet"""
+    model = get_model()
+    if not model.models:
+        return None
+    return model.predict(registry.route_ids, dates, weather_factor, festival_factor,
+                         registry.market_factor(dates))
+
+
+def update_model(conn, path=None, rebuild=False):
+    """Train the shared model on new history and save it; returns {route_id: days_learned}"""
+    global _model, _model_mtime
+    model = DemandModel() if rebuild else get_model(path)
+    with _model_lock:
+        learned = model.update(conn)
+        if learned or rebuild:
+            path = model.save(path)
+            _model, _model_mtime = model, os.path.getmtime(path)
+    return learned
+
+
+def main():
+    from database import get_pool
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model-path', default=None)
+    parser.add_argument('--rebuild', action='store_true', help='retrain every route from scratch')
+    args = parser.parse_args()
+
+    with get_pool().connection() as conn:
+        learned = update_model(conn, args.model_path, args.rebuild)
+    model = get_model(args.model_path)
+    print(f"🧠 Trained {len(learned)} routes on new history; model covers {model.summary()['routes']} routes")
+    print(f"💾 Saved to {resolve_model_path(args.model_path)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,216 +0,0 @@
-#!/usr/bin/env python3
-"""
-Enhanced Transport Optimizer 2025 - Live Demo Test
-Tests all major system components and provides demo data
-"""
-
-import requests
-import json
-import time
-import sys
-from datetime import datetime
-
-class TransportOptimizerDemo:
-    def __init__(self):
-        self.api_base = 'http://localhost:5000/api'
-        self.auth_token = None
-        self.demo_users = {
-            'admin': {'password': 'admin123', 'role': 'admin'},
-            'manager': {'password': 'manager123', 'role': 'manager'},
-            'operator': {'password': 'operator123', 'role': 'operator'},
-            'viewer': {'password': 'viewer123', 'role': 'viewer'}
-        }
-        
-    def print_header(self, title):
-        print(f"\n{'='*60}")
-        print(f"🚌 {title}")
-        print(f"{'='*60}")
-        
-    def print_step(self, step, message):
-        print(f"\n{step}. {message}")
-        
-    def print_success(self, message):
-        print(f"   ✅ {message}")
-        
-    def print_error(self, message):
-        print(f"   ❌ {message}")
-        
-    def print_info(self, message):
-        print(f"   ℹ️  {message}")
-
-    def check_server(self):
-        """Check if the server is running"""
-        self.print_step("1", "Checking server connectivity...")
-        try:
-            response = requests.get('http://localhost:5000/', timeout=5)
-            if response.status_code == 200:
-                self.print_success("Server is running and accessible")
-                return True
-            else:
-                self.print_error(f"Server returned status code: {response.status_code}")
-                return False
-        except requests.exceptions.ConnectionError:
-            self.print_error("Cannot connect to server at http://localhost:5000")
-            self.print_info("Please run: python enhanced_backend_server_2025.py")
-            return False
-        except Exception as e:
-            self.print_error(f"Server check failed: {e}")
-            return False
-
-    def test_authentication(self):
-        """Test all user authentication"""
-        self.print_step("2", "Testing authentication system...")
-        
-        for username, user_data in self.demo_users.items():
-            try:
-                login_data = {
-                    'username': username,
-                    'password': user_data['password']
-                }
-                
-                response = requests.post(f"{self.api_base}/auth/login", 
-                                       json=login_data, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    self.print_success(f"{username.upper()} login successful (Role: {data['user']['role']})")
-                    
-                    # Store admin token for further tests
-                    if username == 'admin':
-                        self.auth_token = data['access_token']
-                        
-                else:
-                    self.print_error(f"{username.upper()} login failed: {response.status_code}")
-                    
-            except Exception as e:
-                self.print_error(f"{username.upper()} login error: {e}")
-
-    def test_dashboard_data(self):
-        """Test dashboard data endpoints"""
-        self.print_step("3", "Testing dashboard data endpoints...")
-        
-        if not self.auth_token:
-            self.print_error("No auth token available, skipping dashboard tests")
-            return
-            
-        headers = {'Authorization': f'Bearer {self.auth_token}'}
-        
-        endpoints = [
-            ('/routes', 'Routes data'),
-            ('/dashboard-stats', 'Dashboard statistics'),
-            ('/live-updates', 'Live updates'),
-            ('/events/upcoming', 'Upcoming events'),
-            ('/news/transport', 'Transport news')
-        ]
-        
-        for endpoint, description in endpoints:
-            try:
-                response = requests.get(f"{self.api_base}{endpoint}", 
-                                      headers=headers, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    self.print_success(f"{description}: {len(data) if isinstance(data, list) else 'OK'}")
-                else:
-                    self.print_error(f"{description} failed: {response.status_code}")
-                    
-            except Exception as e:
-                self.print_error(f"{description} error: {e}")
-
-    def test_predictions(self):
-        """Test prediction system"""
-        self.print_step("4", "Testing prediction system...")
-        
-        if not self.auth_token:
-            self.print_error("No auth token available, skipping prediction tests")
-            return
-            
-        headers = {'Authorization': f'Bearer {self.auth_token}'}
-        
-        try:
-            self.print_info("Triggering daily prediction update...")
-            response = requests.post(f"{self.api_base}/daily-update", 
-                                   headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.print_success("Prediction system working")
-                self.print_info(f"Prediction date: {data['data']['prediction_date']}")
-                self.print_info(f"Total buses needed: {data['data']['total_buses_needed']}")
-                self.print_info(f"Estimated cost: ₹{data['data']['estimated_cost']}")
-            else:
-                self.print_error(f"Prediction system failed: {response.status_code}")
-                
-        except Exception as e:
-            self.print_error(f"Prediction system error: {e}")
-
-    def display_demo_info(self):
-        """Display demo access information"""
-        self.print_step("5", "Demo access information")
-        
-        print(f"\n{'Login Credentials':<20} {'Username':<12} {'Password':<12} {'Role':<10}")
-        print("-" * 60)
-        for username, data in self.demo_users.items():
-            print(f"{'Demo ' + username.title():<20} {username:<12} {data['password']:<12} {data['role']:<10}")
-            
-        print(f"\n📱 Access URLs:")
-        print(f"   • Login Page:  http://localhost:5000/login.html")
-        print(f"   • Dashboard:   http://localhost:5000/dashboard.html")
-        print(f"   • API Docs:    http://localhost:5000/")
-        
-        print(f"\n🎯 Quick Demo Steps:")
-        print(f"   1. Click on any demo credential in the login page")
-        print(f"   2. Explore the real-time dashboard")
-        print(f"   3. Check analytics with live charts")
-        print(f"   4. Review tomorrow's smart schedule")
-        print(f"   5. Browse upcoming Tamil Nadu events")
-
-    def run_live_demo(self):
-        """Run the complete live demo"""
-        self.print_header("ENHANCED TRANSPORT OPTIMIZER 2025 - LIVE DEMO")
-        print(f"Demo started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S IST')}")
-        
-        # Run all tests
-        if not self.check_server():
-            return False
-            
-        self.test_authentication()
-        time.sleep(1)
-        
-        self.test_dashboard_data()
-        time.sleep(1)
-        
-        self.test_predictions()
-        time.sleep(1)
-        
-        self.display_demo_info()
-        
-        self.print_header("DEMO COMPLETED SUCCESSFULLY! 🎉")
-        print(f"\n🚀 Your Enhanced Transport Optimizer 2025 is ready for demonstration!")
-        print(f"📊 All systems operational - real-time data, authentication, and AI predictions working")
-        print(f"🎯 Perfect for college project presentation and government deployment")
-        
-        return True
-
-    def run_quick_check(self):
-        """Run a quick system health check"""
-        print("🔍 Quick System Health Check...")
-        
-        if self.check_server():
-            print("✅ System Ready - Server is running")
-            print("🌐 Access at: http://localhost:5000/login.html")
-            print("🔑 Use: admin / admin123 for full access")
-        else:
-            print("❌ System Not Ready - Please start the server first")
-            print("▶️  Run: python enhanced_backend_server_2025.py")
-
-def main():
-    demo = TransportOptimizerDemo()
-    
-    if len(sys.argv) > 1 and sys.argv[1] == '--quick':
-        demo.run_quick_check()
-    else:
-        demo.run_live_demo()
-
-if __name__ == '__main__':
-    main()
\ No newline at end of file
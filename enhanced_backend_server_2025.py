@@ -1,68 +1,85 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, render_template_string, stream_with_context
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta, date
-import sqlite3
 import json
 import os
 import random
+import sys
+import threading
 import math
 import uuid
-import feedparser
-
-app = Flask(__name__)
-CORS(app)
-
-# JWT Configuration
-app.config['JWT_SECRET_KEY'] = 'tn-transport-secret-2025'
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=8)
-jwt = JWTManager(app)
-
-# Enhanced Tamil Nadu Events Calendar 2025-2026
-TAMIL_NADU_EVENTS_2025_2026 = {
-    # September 2025
-    '2025-09-12': {'name': 'Ganesh Chaturthi', 'multiplier': 1.8, 'type': 'major'},
-    '2025-09-17': {'name': 'Onam', 'multiplier': 1.5, 'type': 'regional'},
-    
-    # October 2025
-    '2025-10-02': {'name': 'Gandhi Jayanti', 'multiplier': 1.4, 'type': 'national'},
-    '2025-10-12': {'name': 'Vijaya Dashami', 'multiplier': 1.7, 'type': 'major'},
-    '2025-10-31': {'name': 'Halloween', 'multiplier': 1.2, 'type': 'cultural'},
-    
-    # November 2025
-    '2025-11-01': {'name': 'Diwali', 'multiplier': 1.9, 'type': 'major'},
-    '2025-11-15': {'name': 'Karthikai Deepam', 'multiplier': 1.6, 'type': 'regional'},
-    
-    # December 2025
-    '2025-12-25': {'name': 'Christmas', 'multiplier': 1.5, 'type': 'national'},
-    '2025-12-31': {'name': 'New Year Eve', 'multiplier': 1.8, 'type': 'celebration'},
-    
-    # 2026 Events
-    '2026-01-14': {'name': 'Thai Pusam', 'multiplier': 1.7, 'type': 'regional'},
-    '2026-01-26': {'name': 'Republic Day', 'multiplier': 1.4, 'type': 'national'},
-    '2026-02-13': {'name': 'Maha Shivratri', 'multiplier': 1.5, 'type': 'religious'},
-    '2026-03-13': {'name': 'Holi', 'multiplier': 1.6, 'type': 'national'},
-    '2026-04-14': {'name': 'Tamil New Year', 'multiplier': 1.8, 'type': 'regional'},
-    '2026-08-15': {'name': 'Independence Day', 'multiplier': 1.4, 'type': 'national'},
-    
-    # Special Events
-    '2025-12-01': {'name': 'Global Investors Meet TN', 'multiplier': 1.3, 'type': 'economic'},
-    '2026-01-20': {'name': 'Auto Expo Chennai', 'multiplier': 1.4, 'type': 'industrial'},
-}
-
-# Market days for each route
-MARKET_DAYS = {
-    'tp_pc': [1, 4],  # Tuesday, Friday
-    'tp_cb': [0, 2, 5],  # Monday, Wednesday, Saturday
-    'tp_sl': [2, 5]  # Wednesday, Saturday
-}
+import numpy as np
+
+import auth
+import database
+import demand_cube
+import demand_model
+import event_calendar
+import external_factors
+from database import get_db, get_pool, transaction
+from migrations import MIGRATIONS, apply_migrations, current_version, migrate
+import optimizer
+import prediction_engine
+import fleet_allocator
+import http_caching
+import ingest
+import jobs
+import live_stream
+import metrics
+import response_cache
+import retention
+import rollups
+import route_registry
+from route_registry import get_registry
+from seed_data import DEMO_BASE_PROFILES, DEMO_MARKET_DAYS, DEMO_ROUTES
+
+# Routes live on a blueprint so create_app() can build configured app instances
+api = Blueprint('api', __name__)
+
+def init_schema():
+    """Create every table and apply pending migrations, without loading any data"""
+    with get_pool().connection() as conn, transaction(conn) as cursor:
+        _create_schema(cursor)
+        apply_migrations(cursor)
+
+def seed_demo_data(days=30):
+    """Load demo users, routes, demand history and notifications into an existing schema"""
+    with get_pool().connection() as conn, transaction(conn) as cursor:
+        _seed_demo_data(cursor, days)
+    auth.get_authenticator().invalidate()
+    route_registry.invalidate()
+    response_cache.fire('demand_loaded')
 
 def init_enhanced_db():
-    """Initialize enhanced database with all tables"""
-    conn = sqlite3.connect('transport_optimizer.db')
-    cursor = conn.cursor()
-    
+    """Initialize enhanced database with all tables and demo data"""
+    init_schema()
+    seed_demo_data()
+
+def prepare_database():
+    """
+    Create the schema on first start, otherwise apply pending migrations.
+    Demo data is loaded separately (python seed_data.py) so startup never
+    pays for password hashing or history generation. Safe to call from
+    several server processes at once: the first takes the init lock and the
+    rest find the work already done. Returns (created, applied_migrations).
+    """
+    with database.init_lock():
+        with get_pool().connection() as conn:
+            created = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'").fetchone() is None
+        if created:
+            init_schema()
+            return True, []
+        return False, migrate()
+
+def user_count():
+    """Number of user accounts; 0 means nobody can log in until data is seeded"""
+    with get_pool().connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+def _create_schema(cursor):
+    """Create base tables using an open transaction cursor"""
     # Users table for authentication
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS users (
@@ -170,10 +187,12 @@ def init_enhanced_db():
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )
     """)
-    
+
+def _seed_demo_data(cursor, days=30):
+    """Insert demo users, routes, demand history and notifications"""
     # Create default admin user
     admin_id = str(uuid.uuid4())
-    admin_password = generate_password_hash('admin123')
+    admin_password = auth.hash_password('admin123')
     cursor.execute("""
     INSERT OR IGNORE INTO users (id, username, email, password_hash, role, department, phone)
     VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -188,28 +207,22 @@ def init_enhanced_db():
     
     for username, password, email, role, dept in demo_users:
         user_id = str(uuid.uuid4())
-        password_hash = generate_password_hash(password)
+        password_hash = auth.hash_password(password)
         cursor.execute("""
         INSERT OR IGNORE INTO users (id, username, email, password_hash, role, department)
         VALUES (?, ?, ?, ?, ?, ?)
         """, (user_id, username, email, password_hash, role, dept))
     
-    # Insert route data
-    routes = [
-        ('tp_pc', 'Tiruppur to Pollachi', 85, 120, 12, 2800),
-        ('tp_cb', 'Tiruppur to Coimbatore', 65, 90, 18, 4200),
-        ('tp_sl', 'Tiruppur to Salem', 113, 150, 15, 3500)
-    ]
-    
-    cursor.executemany("""
-    INSERT OR REPLACE INTO routes (id, name, distance, travel_time, current_buses, daily_passengers)
-    VALUES (?, ?, ?, ?, ?, ?)
-    """, routes)
+    # Insert route data with base profiles and market days
+    for route in DEMO_ROUTES:
+        route_registry.save_route(cursor, route, DEMO_BASE_PROFILES[route[0]], DEMO_MARKET_DAYS[route[0]])
     
     # Generate initial sample data
-    generate_initial_data(cursor)
+    generate_initial_data(cursor, days=days)
     
-    # Create sample notifications
+    # Create sample notifications once
+    if cursor.execute("SELECT 1 FROM notifications LIMIT 1").fetchone():
+        return
     notifications = [
         ("Weather Alert", "Heavy rainfall expected tomorrow. Increased demand predicted.", "warning"),
         ("Festival Update", "Diwali approaching - expect 90% increase in passenger demand", "info"),
@@ -222,79 +235,41 @@ def init_enhanced_db():
         INSERT OR IGNORE INTO notifications (title, message, type)
         VALUES (?, ?, ?)
         """, (title, message, msg_type))
-    
-    conn.commit()
-    conn.close()
 
-def generate_initial_data(cursor):
+def generate_initial_data(cursor, registry=None, days=30, chunk_size=None):
     """Generate initial passenger demand data with realistic patterns"""
-    base_patterns = {
-        'tp_pc': [35, 25, 15, 10, 20, 60, 140, 380, 320, 180, 150, 130, 115, 100, 90, 75, 220, 450, 350, 240, 140, 90, 60, 45],
-        'tp_cb': [50, 35, 25, 20, 30, 90, 200, 580, 460, 280, 220, 190, 165, 145, 125, 110, 320, 620, 520, 360, 220, 150, 90, 70],
-        'tp_sl': [40, 30, 22, 18, 28, 75, 175, 440, 380, 240, 195, 165, 145, 125, 110, 95, 280, 500, 400, 290, 185, 125, 75, 55]
-    }
+    registry = registry or route_registry.load_registry(cursor.connection)
+    route_ids = registry.route_ids
+    base = registry.base_patterns
+    hours = np.arange(base.shape[1])
+    # Festival multiplier for every day in one gather from the event calendar
+    dates = [date.today() - timedelta(days=days_back) for days_back in range(days)]
+    festival = event_calendar.get_calendar(cursor.connection).factors(dates).tolist()
     
-    # Generate data for last 30 days
-    for days_back in range(30):
-        target_date = date.today() - timedelta(days=days_back)
+    def day_rows(days_back):
+        target_date = dates[days_back]
         day_of_week = target_date.weekday()
-        
-        # Check if it's a festival day
         date_str = target_date.strftime('%Y-%m-%d')
-        is_festival = date_str in TAMIL_NADU_EVENTS_2025_2026
-        festival_multiplier = TAMIL_NADU_EVENTS_2025_2026.get(date_str, {}).get('multiplier', 1.0)
         
-        for route_id, pattern in base_patterns.items():
-            # Check if it's a market day for this route
-            is_market_day = day_of_week in MARKET_DAYS.get(route_id, [])
-            market_multiplier = 1.3 if is_market_day else 1.0
-            
-            for hour, base_passengers in enumerate(pattern):
-                # Apply multipliers and variation
-                passengers = base_passengers * festival_multiplier * market_multiplier
-                passengers = int(passengers * random.uniform(0.8, 1.2))
-                passengers = max(0, passengers)
-                
-                cursor.execute("""
-                INSERT OR REPLACE INTO passenger_demand 
-                (route_id, hour, day_of_week, passenger_count, date_recorded, is_predicted, festival_factor, market_factor)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (route_id, hour, day_of_week, passengers, target_date, False, festival_multiplier, market_multiplier))
-
-def get_weather_data():
-    """Get simulated weather data based on current season"""
-    now = datetime.now()
-    month = now.month
-    
-    if month in [6, 7, 8, 9]:  # Monsoon
-        temp = random.uniform(22, 32)
-        rainfall = random.uniform(5, 30)
-        condition = random.choice(['Rain', 'Heavy Rain', 'Cloudy'])
-        weather_factor = 1.2
-    elif month in [3, 4, 5]:  # Summer
-        temp = random.uniform(28, 38)
-        rainfall = 0
-        condition = random.choice(['Clear', 'Hot', 'Sunny'])
-        weather_factor = 1.1
-    else:  # Winter/Post-monsoon
-        temp = random.uniform(18, 28)
-        rainfall = random.uniform(0, 5)
-        condition = random.choice(['Clear', 'Partly Cloudy'])
-        weather_factor = 1.0
+        # Festival multiplier for the day, market multiplier per route
+        festival_multiplier = festival[days_back]
+        market = registry.market_factor([target_date])[:, 0]
+        
+        # Apply multipliers and variation to every route-hour of the day
+        passengers = base * festival_multiplier * market[:, np.newaxis]
+        passengers = np.floor(passengers * np.random.uniform(0.8, 1.2, size=base.shape))
+        passengers = np.maximum(passengers, 0).astype(np.int64).tolist()
+        
+        market = market.tolist()
+        for r, route_id in enumerate(route_ids):
+            for hour, count in zip(hours.tolist(), passengers[r]):
+                yield (route_id, hour, day_of_week, count, date_str, False, festival_multiplier, market[r])
     
-    return {
-        'temperature': temp,
-        'condition': condition,
-        'rainfall': rainfall,
-        'humidity': random.uniform(60, 85),
-        'weather_factor': weather_factor
-    }
-
-def is_festival_day(date_obj):
-    """Check if date is a festival with enhanced event data"""
-    date_str = date_obj.strftime('%Y-%m-%d')
-    festival_data = TAMIL_NADU_EVENTS_2025_2026.get(date_str, {})
-    return bool(festival_data), festival_data
+    rows = (row for days_back in range(days) for row in day_rows(days_back))
+    demand_range = (date.today() - timedelta(days=days - 1), date.today())
+    retention.unseal_days(cursor, [(date.today() - timedelta(days=days_back)).isoformat() for days_back in range(days)])
+    with rollups.deferred(cursor, demand_range=demand_range):
+        return database.bulk_write(cursor, database.UPSERT_PASSENGER_DEMAND, rows, chunk_size)
 
 def get_transportation_news():
     """Fetch latest transportation news"""
@@ -325,7 +300,7 @@ def get_transportation_news():
         return []
 
 # Authentication Routes
-@app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/auth/login', methods=['POST'])
 def login():
     """User authentication endpoint"""
     data = request.json
@@ -335,81 +310,62 @@ def login():
     if not username or not password:
         return jsonify({'error': 'Username and password required'}), 400
     
-    conn = sqlite3.connect('transport_optimizer.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT id, username, password_hash, role, department, email FROM users WHERE username = ? AND is_active = TRUE", (username,))
-    user = cursor.fetchone()
+    try:
+        user = auth.get_authenticator().authenticate(get_db(), username, password)
+    except auth.Busy:
+        response = jsonify({'error': 'Too many logins in progress, retry shortly'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     
-    if user and check_password_hash(user[2], password):
-        # Update last login
-        cursor.execute("UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?", (user[0],))
-        
-        # Create session record
-        session_id = str(uuid.uuid4())
-        cursor.execute("""
-        INSERT INTO user_sessions (id, user_id, ip_address, user_agent)
-        VALUES (?, ?, ?, ?)
-        """, (session_id, user[0], request.remote_addr, request.headers.get('User-Agent')))
-        
-        conn.commit()
-        conn.close()
+    if user:
+        # Session row and last_login are written in batches by the session writer
+        session_id = auth.get_session_writer().record_login(
+            user['id'], request.remote_addr, request.headers.get('User-Agent'))
         
         # Create JWT token with enhanced data
         access_token = create_access_token(identity={
-            'user_id': user[0],
-            'username': user[1],
-            'role': user[3],
-            'department': user[4],
-            'email': user[5],
+            'user_id': user['id'],
+            'username': user['username'],
+            'role': user['role'],
+            'department': user['department'],
+            'email': user['email'],
             'session_id': session_id
         })
         
         return jsonify({
             'access_token': access_token,
             'user': {
-                'id': user[0],
-                'username': user[1],
-                'role': user[3],
-                'department': user[4],
-                'email': user[5]
+                'id': user['id'],
+                'username': user['username'],
+                'role': user['role'],
+                'department': user['department'],
+                'email': user['email']
             },
-            'permissions': get_user_permissions(user[3])
+            'permissions': get_user_permissions(user['role'])
         })
     else:
-        conn.close()
         return jsonify({'error': 'Invalid credentials'}), 401
 
-@app.route('/api/auth/logout', methods=['POST'])
+@api.route('/api/auth/logout', methods=['POST'])
 @jwt_required()
 def logout():
     """User logout endpoint"""
     current_user = get_jwt_identity()
     
-    conn = sqlite3.connect('transport_optimizer.db')
-    cursor = conn.cursor()
-    cursor.execute("UPDATE user_sessions SET logout_time = CURRENT_TIMESTAMP WHERE id = ?", 
-                   (current_user['session_id'],))
-    conn.commit()
-    conn.close()
+    auth.get_session_writer().record_logout(current_user['session_id'])
     
     return jsonify({'message': 'Logged out successfully'})
 
-@app.route('/api/auth/profile', methods=['GET'])
+@api.route('/api/auth/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
     """Get user profile information"""
     current_user = get_jwt_identity()
     
-    conn = sqlite3.connect('transport_optimizer.db')
-    cursor = conn.cursor()
-    cursor.execute("""
+    user_data = get_db().execute("""
     SELECT username, email, role, department, phone, last_login, created_at
     FROM users WHERE id = ?
-    """, (current_user['user_id'],))
-    
-    user_data = cursor.fetchone()
-    conn.close()
+    """, (current_user['user_id'],)).fetchone()
     
     if user_data:
         return jsonify({
@@ -418,7 +374,7 @@ def get_profile():
             'role': user_data[2],
             'department': user_data[3],
             'phone': user_data[4],
-            'last_login': user_data[5],
+            'last_login': auth.get_session_writer().pending_last_login(current_user['user_id']) or user_data[5],
             'member_since': user_data[6]
         })
     
@@ -426,24 +382,20 @@ def get_profile():
 
 def get_user_permissions(role):
     """Get permissions based on user role"""
-    permissions = {
-        'admin': ['read', 'write', 'delete', 'manage_users', 'approve_schedules'],
-        'manager': ['read', 'write', 'approve_schedules'],
-        'operator': ['read', 'update_status'],
-        'viewer': ['read']
-    }
-    return permissions.get(role, ['read'])
+    return auth.get_permissions(role)
 
 # Main API Routes (Enhanced)
-@app.route('/api/routes', methods=['GET'])
+@api.route('/api/routes', methods=['GET'])
 @jwt_required()
+@response_cache.cached('routes')
 def get_routes():
     """Get all routes with enhanced data"""
-    conn = sqlite3.connect('transport_optimizer.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM routes")
-    routes = cursor.fetchall()
-    conn.close()
+    routes = get_db().execute("""
+    SELECT r.id, r.name, r.distance, r.travel_time, r.current_buses, r.daily_passengers,
+           COALESCE(d.passengers, 0)
+    FROM routes r
+    LEFT JOIN demand_route_daily_rollup d ON d.route_id = r.id AND d.date_recorded = ?
+    """, (date.today().isoformat(),)).fetchall()
     
     route_list = []
     for route in routes:
@@ -454,77 +406,102 @@ def get_routes():
             'travel_time': route[3],
             'current_buses': route[4],
             'daily_passengers': route[5],
+            'passengers_today': route[6],
             'status': 'active',
             'efficiency': random.randint(85, 95)  # Simulated efficiency
         })
     
     return jsonify(route_list)
 
-@app.route('/api/dashboard-stats', methods=['GET'])
+@api.route('/api/routes', methods=['POST'])
+@jwt_required()
+def save_route():
+    """Create or update a route with its 24-hour base profile and market days"""
+    current_user = get_jwt_identity()
+    if 'write' not in get_user_permissions(current_user['role']):
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    data = request.json or {}
+    try:
+        route = (
+            str(data['id']), str(data['name']), int(data['distance']), int(data['travel_time']),
+            int(data.get('current_buses', 0)), int(data.get('daily_passengers', 0))
+        )
+        base_pattern = data.get('base_pattern')
+        if base_pattern is not None:
+            base_pattern = [int(value) for value in base_pattern]
+        market_days = data.get('market_days')
+        if market_days is not None:
+            market_days = [int(day) for day in market_days]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'id, name, distance and travel_time are required'}), 400
+    
+    if base_pattern is not None and (len(base_pattern) != 24 or min(base_pattern) < 0):
+        return jsonify({'error': 'base_pattern must have 24 non-negative values'}), 400
+    if market_days is not None and any(day < 0 or day > 6 for day in market_days):
+        return jsonify({'error': 'market_days must be weekday numbers 0-6'}), 400
+    
+    route_registry.save_routes(get_db(), [(route, base_pattern, market_days)])
+    response_cache.fire('routes_changed')
+    return jsonify({'status': 'success', 'route_id': route[0]})
+
+@api.route('/api/dashboard-stats', methods=['GET'])
 @jwt_required()
+@response_cache.cached('dashboard')
 def get_dashboard_stats():
     """Get enhanced dashboard statistics"""
-    conn = sqlite3.connect('transport_optimizer.db')
-    cursor = conn.cursor()
-    
-    # Total routes
-    cursor.execute("SELECT COUNT(*) FROM routes")
-    total_routes = cursor.fetchone()[0]
+    cursor = get_db().cursor()
     
-    # Total buses
-    cursor.execute("SELECT SUM(current_buses) FROM routes")
-    total_buses = cursor.fetchone()[0] or 45
+    # Total routes and buses (fleet rollup)
+    cursor.execute("SELECT total_routes, total_buses FROM fleet_rollup WHERE id = 1")
+    total_routes, total_buses = cursor.fetchone() or (0, 0)
+    total_buses = total_buses or 45
     
-    # Total passengers (today's data)
+    # Total passengers so far today (at most 24 hourly rollup rows)
     today = date.today()
     cursor.execute("""
-    SELECT SUM(passenger_count) FROM passenger_demand 
+    SELECT SUM(passengers) FROM demand_hourly_rollup 
     WHERE date_recorded = ? AND hour <= ?
-    """, (today, datetime.now().hour))
+    """, (today.isoformat(), datetime.now().hour))
     
     passengers_today = cursor.fetchone()[0] or 8247
     
     # Weekly savings (calculated)
     weekly_savings = 52500
     
-    # System health metrics
-    prediction_accuracy = random.uniform(85, 92)
+    # Accuracy of the production forecast in the latest backtest (python backtest.py)
+    import backtest
+    latest_backtest = backtest.latest_run(get_db())
+    prediction_accuracy = latest_backtest['accuracy'] if latest_backtest else None
     system_uptime = random.uniform(98, 99.9)
     
-    conn.close()
-    
     return jsonify({
         'total_routes': total_routes,
         'total_buses': total_buses,
         'passengers_today': passengers_today,
         'weekly_savings': weekly_savings,
-        'prediction_accuracy': round(prediction_accuracy, 1),
+        'prediction_accuracy': round(prediction_accuracy, 1) if prediction_accuracy is not None else None,
         'system_uptime': round(system_uptime, 2),
         'last_updated': datetime.now().isoformat(),
         'active_alerts': 2,
         'performance_trend': '+5.2%'
     })
 
-@app.route('/api/live-updates', methods=['GET'])
-@jwt_required()
-def get_live_updates():
-    """Get real-time system updates"""
+def build_live_updates():
+    """Compute one tick of real-time system state"""
     current_time = datetime.now()
+    # Today's cached weather row, the same one the predictor reads
+    service = external_factors.get_service()
+    with get_pool().connection() as conn:
+        weather = dict(service.get(conn, current_time.date()), district=service.district)
+        route_ids = get_registry(conn).route_ids
     
     updates = {
         'current_time': current_time.isoformat(),
-        'weather': get_weather_data(),
+        'weather': weather,
         'active_buses': random.randint(42, 48),
-        'current_load': {
-            'tp_pc': random.randint(65, 85),
-            'tp_cb': random.randint(70, 90),
-            'tp_sl': random.randint(60, 80)
-        },
-        'next_buses': {
-            'tp_pc': random.randint(5, 15),
-            'tp_cb': random.randint(8, 18),
-            'tp_sl': random.randint(10, 20)
-        },
+        'current_load': {route_id: random.randint(60, 90) for route_id in route_ids},
+        'next_buses': {route_id: random.randint(5, 20) for route_id in route_ids},
         'system_alerts': []
     }
     
@@ -536,23 +513,46 @@ def get_live_updates():
             'priority': 'high'
         })
     
-    return jsonify(updates)
+    return updates
+
+# Live state is computed once per tick and shared by every poller and stream subscriber
 
-@app.route('/api/news/transport', methods=['GET'])
+@api.route('/api/live-updates', methods=['GET'])
 @jwt_required()
+def get_live_updates():
+    """Get real-time system updates"""
+    return jsonify(current_app.extensions['live_updates'].current())
+
+@api.route('/api/live-stream', methods=['GET'])
+@jwt_required(locations=['query_string'])  # EventSource cannot send headers
+def stream_live_updates():
+    """Server-Sent Events: a full snapshot on connect, then only changed fields each tick"""
+    live_updates = current_app.extensions['live_updates']
+    try:
+        subscription = live_updates.subscribe()
+    except live_stream.Full:
+        # Every stream pins a server thread; past the cap the dashboard polls /api/live-updates
+        response = jsonify({'error': 'Too many live streams on this worker; poll /api/live-updates'})
+        response.headers['Retry-After'] = str(current_app.config['LIVE_TICK_SECONDS'])
+        return response, 503
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(live_updates.stream(subscription), mimetype='text/event-stream', headers=headers)
+
+@api.route('/api/news/transport', methods=['GET'])
+@jwt_required()
+@response_cache.cached('news')
 def get_transport_news():
     """Get latest transport news"""
     news = get_transportation_news()
     return jsonify(news)
 
-@app.route('/api/notifications', methods=['GET'])
+@api.route('/api/notifications', methods=['GET'])
 @jwt_required()
 def get_notifications():
     """Get user notifications"""
     current_user = get_jwt_identity()
     
-    conn = sqlite3.connect('transport_optimizer.db')
-    cursor = conn.cursor()
+    cursor = get_db().cursor()
     
     cursor.execute("""
     SELECT id, title, message, type, is_read, created_at
@@ -573,176 +573,535 @@ def get_notifications():
             'created_at': row[5]
         })
     
-    conn.close()
     return jsonify(notifications)
 
-@app.route('/api/events/upcoming', methods=['GET'])
+@api.route('/api/events/upcoming', methods=['GET'])
 @jwt_required()
+@response_cache.cached('events')
 def get_upcoming_events():
     """Get upcoming festivals and events"""
     today = date.today()
     upcoming_events = []
     
-    for date_str, event_data in TAMIL_NADU_EVENTS_2025_2026.items():
-        event_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        if event_date >= today:
-            days_away = (event_date - today).days
-            upcoming_events.append({
-                'date': date_str,
-                'name': event_data['name'],
-                'type': event_data['type'],
-                'impact': event_data['multiplier'],
-                'days_away': days_away
-            })
-    
-    # Sort by date and limit to next 10 events
-    upcoming_events.sort(key=lambda x: x['days_away'])
-    return jsonify(upcoming_events[:10])
-
-@app.route('/api/daily-update', methods=['POST'])
+    # Next 10 events that have not ended, from the calendar's date index
+    for event in event_calendar.get_calendar(get_db()).upcoming(today, 10):
+        upcoming_events.append({
+            'date': event['start_date'].isoformat(),
+            'end_date': event['end_date'].isoformat(),
+            'name': event['name'],
+            'type': event['type'],
+            'impact': event['multiplier'],
+            'days_away': max((event['start_date'] - today).days, 0)
+        })
+    
+    return jsonify(upcoming_events)
+
+@api.route('/api/external-factors', methods=['GET'])
 @jwt_required()
-def trigger_daily_update():
-    """Enhanced daily update with ML predictions"""
+def get_external_factors():
+    """Cached daily weather for a district over a date range (default: today and the next 6 days)"""
     try:
-        tomorrow = date.today() + timedelta(days=1)
-        tomorrow_weekday = tomorrow.weekday()
-        
-        weather_data = get_weather_data()
-        is_festival, festival_data = is_festival_day(tomorrow)
-        
-        conn = sqlite3.connect('transport_optimizer.db')
-        cursor = conn.cursor()
-        
-        # Store external factors
+        start = date.fromisoformat(request.args['start']) if 'start' in request.args else date.today()
+    except ValueError:
+        return jsonify({'error': 'start must be an ISO date'}), 400
+    days = request.args.get('days', 7, type=int)
+    if days is None or not 1 <= days <= 366:
+        return jsonify({'error': 'days must be between 1 and 366'}), 400
+    
+    service = external_factors.get_service()
+    district = request.args.get('district') or service.district
+    if not service.known_district(district):
+        return jsonify({'error': 'Unknown district', 'district': district}), 400
+    dates = [start + timedelta(days=offset) for offset in range(days)]
+    series = service.series(get_db(), dates, district)
+    return jsonify({
+        'district': district,
+        'provider': service.provider.name,
+        'days': [dict(weather, date=day.isoformat()) for day, weather in zip(dates, series)]
+    })
+
+@api.route('/api/analytics/hourly-profile', methods=['GET'])
+@jwt_required()
+def get_hourly_profile():
+    """Mean passengers per route-hour by weekday over recorded history, read from the demand cube"""
+    days = request.args.get('days', 90, type=int)
+    if days is None or days < 1:
+        return jsonify({'error': 'days must be a positive number'}), 400
+    
+    cube = demand_cube.get_cube()
+    if cube is None:
+        return jsonify({'error': 'No demand cube yet; it is exported by the daily update'}), 404
+    route_id = request.args.get('route_id')
+    if route_id and route_id not in cube.route_index:
+        return jsonify({'error': 'Unknown route', 'route_id': route_id}), 404
+    
+    profile = cube.hourly_profile(days, route_id)
+    first = max(cube.day_count - days, 0)
+    return jsonify({
+        'route_id': route_id,
+        'start_date': (cube.start + timedelta(days=first)).isoformat(),
+        'end_date': cube.end.isoformat(),
+        'weekdays': [[None if np.isnan(value) else round(float(value), 1) for value in row] for row in profile],
+    })
+
+@api.route('/api/events', methods=['POST'])
+@jwt_required()
+def save_event():
+    """Add or update a calendar event, optionally spanning several days with lead/trail demand windows"""
+    current_user = get_jwt_identity()
+    if 'write' not in get_user_permissions(current_user['role']):
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    data = request.json or {}
+    try:
+        event = {
+            'name': str(data['name']),
+            'start_date': date.fromisoformat(data['start_date']),
+            'end_date': date.fromisoformat(data.get('end_date') or data['start_date']),
+            'multiplier': float(data.get('multiplier', 1.0)),
+            'event_type': str(data.get('type', 'custom')),
+            'lead_days': int(data.get('lead_days', 0)),
+            'trail_days': int(data.get('trail_days', 0)),
+        }
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'name and an ISO start_date are required'}), 400
+    
+    if event['end_date'] < event['start_date']:
+        return jsonify({'error': 'end_date must not be before start_date'}), 400
+    if event['multiplier'] <= 0 or event['lead_days'] < 0 or event['trail_days'] < 0:
+        return jsonify({'error': 'multiplier must be positive and lead/trail days non-negative'}), 400
+    
+    event_calendar.save_events(get_db(), [event])
+    response_cache.fire('events_changed')
+    return jsonify({'status': 'success', 'name': event['name'], 'start_date': event['start_date'].isoformat()})
+
+@api.route('/api/backtest/latest', methods=['GET'])
+@jwt_required()
+def get_latest_backtest():
+    """Latest backtest summary per model variant plus per-route accuracy of the production model"""
+    import backtest
+    conn = get_db()
+    variants = {}
+    for variant in backtest.VARIANTS:
+        run = backtest.latest_run(conn, variant)
+        if run:
+            variants[variant] = run
+    
+    production = variants.get(backtest.DEFAULT_VARIANT)
+    return jsonify({
+        'variants': variants,
+        'route_accuracy': backtest.route_accuracy(conn, production['run_id']) if production else {}
+    })
+
+@api.route('/api/cache/stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    """Response cache hit/miss counters per endpoint"""
+    return jsonify(response_cache.get_cache().stats())
+
+# Set once the process starts draining so load balancers stop routing to it
+shutting_down = threading.Event()
+
+def start_background_services():
+    """Per-process startup: resume queued jobs, schedule the nightly update and start sharing metrics"""
+    metrics.start_flushing()
+    runner = jobs.get_runner()
+    resumed = runner.recover()
+    runner.start_scheduler()
+    return resumed
+
+def shutdown_background_services():
+    """Per-process shutdown: finish running jobs, flush queued sessions and metrics, stop forecast workers, close connections"""
+    shutting_down.set()
+    jobs.get_runner().shutdown(wait=True)
+    auth.shutdown()
+    metrics.flush()
+    if 'forecasting' in sys.modules:
+        sys.modules['forecasting'].shutdown()
+    get_pool().close_all()
+
+@api.route('/api/health/live', methods=['GET'])
+def liveness():
+    """The process is up and serving requests"""
+    return jsonify({'status': 'alive', 'pid': os.getpid()})
+
+@api.route('/api/health/ready', methods=['GET'])
+def readiness():
+    """Ready once the schema is current; 503 while starting up or draining"""
+    if shutting_down.is_set():
+        return jsonify({'status': 'draining', 'pid': os.getpid()}), 503
+    try:
+        version = current_version(get_db())
+    except Exception as e:
+        return jsonify({'status': 'unavailable', 'error': str(e), 'pid': os.getpid()}), 503
+    latest = MIGRATIONS[-1][0]
+    if version < latest:
+        return jsonify({'status': 'migrating', 'schema_version': version, 'pid': os.getpid()}), 503
+    return jsonify({'status': 'ready', 'schema_version': version, 'pid': os.getpid()})
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint for request latency and SQL profiling"""
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+def run_daily_update(conn, params, progress):
+    """Daily update job: refresh demand models, predict tomorrow and allocate the fleet"""
+    tomorrow = date.fromisoformat(params['date']) if params.get('date') else date.today() + timedelta(days=1)
+    tomorrow_weekday = tomorrow.weekday()
+    
+    weather_data = external_factors.get_service().get(conn, tomorrow)
+    # The event on the day, and the multiplier including lead-in/trail-off windows of nearby events
+    calendar = event_calendar.get_calendar(conn)
+    festival = calendar.event_on(tomorrow)
+    is_festival = festival is not None
+    festival_factor = calendar.factor(tomorrow)
+    
+    # Fold newly recorded days into the per-route demand models before locking for writes
+    progress(0.1, 'Updating demand models')
+    demand_model.update_model(conn)
+    
+    progress(0.5, 'Predicting demand')
+    with transaction(conn) as cursor:
+        # Add the day's events to the weather row the external-factors service stored
         cursor.execute("""
-        INSERT OR REPLACE INTO external_factors 
-        (date_recorded, weather_condition, temperature, rainfall, humidity, 
-         is_festival, festival_name, festival_impact, day_type)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO external_factors 
+        (district, date_recorded, is_festival, festival_name, festival_impact, day_type)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (district, date_recorded) DO UPDATE SET
+            is_festival = excluded.is_festival,
+            festival_name = excluded.festival_name,
+            festival_impact = excluded.festival_impact,
+            day_type = excluded.day_type
         """, (
-            tomorrow, weather_data['condition'], weather_data['temperature'],
-            weather_data['rainfall'], weather_data['humidity'], is_festival,
-            festival_data.get('name', ''), festival_data.get('multiplier', 1.0),
+            external_factors.get_service().district, tomorrow.isoformat(), is_festival,
+            festival['name'] if is_festival else '', festival_factor,
             'festival' if is_festival else ('weekend' if tomorrow_weekday >= 5 else 'weekday')
         ))
         
         # Generate predictions for all routes
-        routes = ['tp_pc', 'tp_cb', 'tp_sl']
-        base_patterns = {
-            'tp_pc': [35, 25, 15, 10, 20, 60, 140, 380, 320, 180, 150, 130, 115, 100, 90, 75, 220, 450, 350, 240, 140, 90, 60, 45],
-            'tp_cb': [50, 35, 25, 20, 30, 90, 200, 580, 460, 280, 220, 190, 165, 145, 125, 110, 320, 620, 520, 360, 220, 150, 90, 70],
-            'tp_sl': [40, 30, 22, 18, 28, 75, 175, 440, 380, 240, 195, 165, 145, 125, 110, 95, 280, 500, 400, 290, 185, 125, 75, 55]
-        }
+        registry = get_registry(conn)
         
-        total_cost = 0
-        total_buses_needed = 0
+        # Trained models where routes have enough history, rule-based factors elsewhere
+        model_demand = demand_model.predict_for(
+            registry, [tomorrow], weather_data['weather_factor'], festival_factor)
+        batch = prediction_engine.run_predictions(
+            registry.route_ids, [tomorrow],
+            base_patterns=registry.base_patterns,
+            distances=registry.distances,
+            weather_factor=weather_data['weather_factor'],
+            festival_factor=festival_factor,
+            market_factor=registry.market_factor([tomorrow]),
+            model_demand=model_demand,
+        )
         
-        for route_id in routes:
-            is_market = tomorrow_weekday in MARKET_DAYS.get(route_id, [])
-            market_factor = 1.3 if is_market else 1.0
-            
-            base_pattern = base_patterns[route_id]
-            
-            for hour, base_demand in enumerate(base_pattern):
-                # Apply all factors
-                predicted_demand = base_demand
-                predicted_demand = int(predicted_demand * weather_data['weather_factor'])
-                predicted_demand = int(predicted_demand * festival_data.get('multiplier', 1.0))
-                predicted_demand = int(predicted_demand * market_factor)
-                predicted_demand = int(predicted_demand * random.uniform(0.95, 1.05))
-                predicted_demand = max(0, predicted_demand)
-                
-                # Calculate optimal schedule
-                buses, frequency = calculate_optimal_schedule(predicted_demand)
-                distance = {'tp_pc': 85, 'tp_cb': 65, 'tp_sl': 113}[route_id]
-                cost = calculate_hourly_cost(buses, distance, frequency)
-                utilization = min(predicted_demand / (buses * 45), 1.0) if buses > 0 else 0
-                
-                total_cost += cost
-                total_buses_needed += buses
-                
-                # Store prediction
-                cursor.execute("""
-                INSERT OR REPLACE INTO daily_schedule_predictions
-                (route_id, prediction_date, hour, predicted_passengers, recommended_buses, 
-                 frequency_minutes, cost_per_hour, utilization_rate)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (route_id, tomorrow, hour, predicted_demand, buses, frequency, cost, utilization))
+        # Store predictions
+        progress(0.7, 'Storing predictions')
+        database.bulk_write(cursor, database.UPSERT_SCHEDULE_PREDICTION, batch.rows(),
+                            current_app.config['BULK_WRITE_CHUNK_SIZE'])
         
-        # Create notification for significant changes
-        current_total_buses = 45
-        bus_change = total_buses_needed - current_total_buses
+        # Check tomorrow's peak requirement against the whole fleet
+        progress(0.85, 'Allocating fleet')
+        allocation = allocate_fleet_for_day(cursor, registry, batch.demand[:, 0, :], tomorrow)
+        peak_required = int(allocation.required.sum(axis=0).max())
+        bus_change = peak_required - allocation.fleet_size
         
+        # Create notification for significant changes
         if abs(bus_change) > 5:
             cursor.execute("""
             INSERT INTO notifications (title, message, type)
             VALUES (?, ?, ?)
             """, (
                 "Schedule Update",
-                f"Tomorrow requires {total_buses_needed} buses ({'+' if bus_change > 0 else ''}{bus_change} from today)",
-                "info"
+                f"Tomorrow peaks at {peak_required} buses in service ({'+' if bus_change > 0 else ''}{bus_change} vs fleet of {allocation.fleet_size})",
+                "warning" if allocation.status == 'fleet_limited' else "info"
             ))
+    
+    response_cache.fire('predictions_updated')
+    progress(1.0, 'Daily update completed')
+    
+    return {
+        'prediction_date': tomorrow.strftime('%Y-%m-%d'),
+        'weather_factor': weather_data['weather_factor'],
+        'is_festival': is_festival,
+        'festival_name': festival['name'] if is_festival else None,
+        'total_buses_needed': batch.total_buses,
+        'peak_buses_required': peak_required,
+        'fleet_status': allocation.status,
+        'model_routes': 0 if model_demand is None else int((~np.isnan(model_demand[:, 0, 0])).sum()),
+        'estimated_cost': round(batch.total_cost, 2)
+    }
+
+def submit_job(kind, params):
+    """Queue a job for the current user; ?wait=<seconds> holds the response until it finishes"""
+    current_user = get_jwt_identity()
+    runner = jobs.get_runner()
+    job, created = runner.submit(kind, params, idempotency_key=request.headers.get('Idempotency-Key'),
+                                 created_by=current_user['username'])
+    wait = min(request.args.get('wait', 0, type=float), current_app.config['JOBS_MAX_WAIT_SECONDS'])
+    if wait > 0 and job['status'] in jobs.ACTIVE_STATUSES:
+        job = runner.wait(job['id'], wait)
+    
+    response = jsonify({'status': 'success', 'created': created, 'job': job})
+    response.status_code = 202 if job['status'] in jobs.ACTIVE_STATUSES else 200
+    response.headers['Location'] = f"/api/jobs/{job['id']}"
+    return response
+
+@api.route('/api/jobs', methods=['GET'])
+@jwt_required()
+def list_jobs():
+    """Most recent background jobs, optionally filtered by ?kind="""
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    return jsonify({'jobs': jobs.recent_jobs(get_db(), limit, request.args.get('kind'))})
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Status, progress and result of one background job"""
+    job = jobs.get_runner().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job})
+
+@api.route('/api/daily-update', methods=['POST'])
+@jwt_required()
+def trigger_daily_update():
+    """Queue the daily update; progress and result are on /api/jobs/<job_id>"""
+    tomorrow = date.today() + timedelta(days=1)
+    return submit_job('daily_update', {'date': tomorrow.isoformat()})
+
+@api.route('/api/retention', methods=['GET'])
+@jwt_required()
+def retention_status():
+    """Retention policy, demand partitions and the next compaction step"""
+    return jsonify(retention.status(get_db()))
+
+@api.route('/api/retention/compact', methods=['POST'])
+@jwt_required()
+def trigger_compaction():
+    """Queue a compaction run now instead of waiting for the nightly job"""
+    current_user = get_jwt_identity()
+    if 'delete' not in get_user_permissions(current_user['role']):
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    data = request.json or {}
+    return submit_job('compact_demand', {'max_steps': data.get('max_steps')})
+
+def allocate_fleet_for_day(cursor, registry, demand, allocation_date, fleet_size=None, load_factor=None):
+    """Run the fleet allocator for one day of (routes, hours) demand and log the run"""
+    if fleet_size is None:
+        fleet_size = int(registry.current_buses.sum())
+    allocation = fleet_allocator.allocate_fleet(
+        registry.route_ids, demand, registry.distances, registry.travel_times, fleet_size,
+        load_factor=load_factor or fleet_allocator.DEFAULT_LOAD_FACTOR,
+    )
+    summary = allocation.summary()
+    cursor.execute("""
+    INSERT INTO fleet_allocation_runs
+    (allocation_date, route_count, fleet_size, status, peak_buses_required, bus_hours,
+     unserved_passengers, estimated_cost, solve_ms)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (allocation_date.isoformat(), len(registry), fleet_size, summary['status'],
+          summary['peak_buses_required'], summary['bus_hours'], summary['unserved_passengers'],
+          summary['estimated_cost'], summary['solve_ms']))
+    current_app.logger.info("Fleet allocation for %s: %s in %.1f ms", allocation_date, summary['status'], summary['solve_ms'])
+    return allocation
+
+@api.route('/api/ingest/ridership', methods=['POST'])
+@jwt_required()
+def ingest_ridership():
+    """Stream observed (route_id, timestamp, count) records as NDJSON or CSV into passenger_demand"""
+    current_user = get_jwt_identity()
+    if 'write' not in get_user_permissions(current_user['role']):
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    fmt = ingest.detect_format(request.content_type, request.args.get('format'))
+    mode = request.args.get('mode', 'replace')
+    batch_size = request.args.get('batch_size', current_app.config['BULK_WRITE_CHUNK_SIZE'], type=int)
+    if batch_size is None or batch_size < 1:
+        return jsonify({'error': 'batch_size must be a positive integer'}), 400
+    
+    conn = get_db()
+    festival_factor = event_calendar.get_calendar(conn).factor
+    try:
+        report = ingest.ingest(conn, request.stream, get_registry(conn), fmt, mode, batch_size, festival_factor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ingest.IngestError as e:
+        if e.report.written:
+            response_cache.fire('demand_loaded')
+        return jsonify({'status': 'error', 'message': str(e), **e.report.summary()}), 500
+    
+    if report.written:
+        response_cache.fire('demand_loaded')
+    return jsonify({'status': 'success', 'format': fmt, 'mode': mode, **report.summary()})
+
+@api.route('/api/fleet/allocate', methods=['POST'])
+@jwt_required()
+def allocate_fleet():
+    """Spread the fleet across all routes and hours for a predicted day"""
+    current_user = get_jwt_identity()
+    if 'write' not in get_user_permissions(current_user['role']):
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    data = request.json or {}
+    try:
+        allocation_date = date.fromisoformat(data['date']) if data.get('date') else date.today() + timedelta(days=1)
+        fleet_size = int(data['fleet_size']) if data.get('fleet_size') is not None else None
+        load_factor = float(data['load_factor']) if data.get('load_factor') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid date, fleet_size or load_factor'}), 400
+    if (fleet_size is not None and fleet_size < 0) or (load_factor is not None and not 0 < load_factor <= 1):
+        return jsonify({'error': 'fleet_size must be >= 0 and load_factor in (0, 1]'}), 400
+    
+    conn = get_db()
+    registry = get_registry(conn)
+    demand = np.zeros((len(registry), 24))
+    rows = conn.execute("""
+    SELECT route_id, hour, predicted_passengers FROM daily_schedule_predictions
+    WHERE prediction_date = ?
+    """, (allocation_date.isoformat(),)).fetchall()
+    if not rows:
+        return jsonify({'error': f'No predictions for {allocation_date.isoformat()}; run a forecast first'}), 404
+    for route_id, hour, passengers in rows:
+        if route_id in registry.index:
+            demand[registry.index[route_id], hour] = passengers
+    
+    with transaction(conn) as cursor:
+        allocation = allocate_fleet_for_day(cursor, registry, demand, allocation_date, fleet_size, load_factor)
+    
+    return jsonify({'allocation_date': allocation_date.isoformat(), **allocation.summary()})
+
+def forecast_specs(conn, routes, start_date, horizon):
+    """Dates, daily factors and per-route worker specs for a forecast over horizon days"""
+    dates = [start_date + timedelta(days=offset) for offset in range(horizon)]
+    weather_factors = external_factors.get_service().weather_factors(conn, dates)
+    festival_factors = event_calendar.get_calendar(conn).factors(dates)
+    model_demand = demand_model.predict_for(routes, dates, weather_factors, festival_factors)
+    specs = [{
+        'route_id': route_id,
+        'base_pattern': routes.base_patterns[i],
+        'distance': routes.distances[i],
+        'market_days': routes.market_days(route_id),
+        'model_demand': None if model_demand is None or np.isnan(model_demand[i, 0, 0]) else model_demand[i],
+    } for i, route_id in enumerate(routes.route_ids)]
+    return dates, weather_factors, festival_factors, specs
+
+def run_forecast(conn, params, progress):
+    """Forecast job: predict a date range and store it in one transaction with rollups rebuilt once"""
+    # Loaded on first use; it pulls in multiprocessing for the worker pool
+    import forecasting
+    start_date = date.fromisoformat(params['start_date']) if params.get('start_date') else date.today() + timedelta(days=1)
+    horizon = int(params.get('days', 7))
+    registry = get_registry(conn)
+    routes = registry.subset(params.get('route_ids') or registry.route_ids)
+    dates, weather_factors, festival_factors, specs = forecast_specs(conn, routes, start_date, horizon)
+    
+    results = []
+    for result in forecasting.iter_forecasts(specs, dates, weather_factors, festival_factors):
+        results.append(result)
+        progress(0.8 * len(results) / len(specs), f"Forecast {len(results)} of {len(specs)} routes")
+    
+    progress(0.8, 'Storing forecasts')
+    chunk_size = current_app.config['BULK_WRITE_CHUNK_SIZE']
+    with transaction(conn) as cursor:
+        with rollups.deferred(cursor, prediction_range=(dates[0].isoformat(), dates[-1].isoformat())):
+            for result in results:
+                database.bulk_write(cursor, database.UPSERT_SCHEDULE_PREDICTION, result.pop('batch').rows(), chunk_size)
+    response_cache.fire('predictions_updated')
+    
+    return {
+        'start_date': dates[0].isoformat(),
+        'end_date': dates[-1].isoformat(),
+        'routes': len(results),
+        'total_buses_needed': sum(result['total_buses_needed'] for result in results),
+        'estimated_cost': round(sum(result['estimated_cost'] for result in results), 2)
+    }
+
+def run_compaction(conn, params, progress):
+    """Retention job: seal, compact and prune demand partitions one short transaction at a time"""
+    today = date.fromisoformat(params['today']) if params.get('today') else None
+    # Export any days not yet in the demand cube before their hourly rows can be dropped
+    demand_cube.sync(conn)
+    return retention.compact(conn, today=today, max_steps=params.get('max_steps'), progress=progress)
+
+def run_nightly(conn, params, progress):
+    """Nightly job: the daily update, a week of forecasts for the dashboard, then demand retention"""
+    daily = run_daily_update(conn, {}, lambda fraction, message=None: progress(0.45 * fraction, message))
+    forecast = run_forecast(conn, {'days': current_app.config['JOBS_NIGHTLY_FORECAST_DAYS']},
+                            lambda fraction, message=None: progress(0.45 + 0.45 * fraction, message))
+    compaction = run_compaction(conn, {'max_steps': current_app.config['RETENTION_NIGHTLY_MAX_STEPS']},
+                                lambda fraction, message=None: progress(0.9 + 0.1 * fraction, message))
+    return {'daily_update': daily, 'forecast': forecast, 'retention': compaction}
+
+jobs.register('daily_update')(run_daily_update)
+jobs.register('forecast')(run_forecast)
+jobs.register('compact_demand')(run_compaction)
+jobs.register(jobs.NIGHTLY_KIND)(run_nightly)
+
+@api.route('/api/forecast', methods=['POST'])
+@jwt_required()
+def stream_forecast():
+    """Forecast a date range for a subset of routes, streaming results per route"""
+    import forecasting
+    data = request.json or {}
+    try:
+        start_date = date.fromisoformat(data['start_date']) if data.get('start_date') else date.today() + timedelta(days=1)
+        end_date = date.fromisoformat(data['end_date']) if data.get('end_date') else start_date + timedelta(days=6)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    
+    horizon = (end_date - start_date).days + 1
+    if horizon < 1 or horizon > forecasting.MAX_HORIZON_DAYS:
+        return jsonify({'error': f'Date range must cover 1-{forecasting.MAX_HORIZON_DAYS} days'}), 400
+    
+    conn = get_db()
+    registry = get_registry(conn)
+    route_ids = data.get('route_ids') or registry.route_ids
+    unknown = registry.unknown(route_ids)
+    if unknown:
+        return jsonify({'error': 'Unknown routes', 'route_ids': unknown}), 400
+    
+    # Large ranges can run as a job instead of holding the request open
+    if data.get('background'):
+        return submit_job('forecast', {'start_date': start_date.isoformat(), 'days': horizon,
+                                       'route_ids': data.get('route_ids')})
+    
+    dates, weather_factors, festival_factors, specs = forecast_specs(conn, registry.subset(route_ids), start_date, horizon)
+    chunk_size = current_app.config['BULK_WRITE_CHUNK_SIZE']
+    
+    def generate():
+        total_buses = 0
+        total_cost = 0.0
+        for result in forecasting.iter_forecasts(specs, dates, weather_factors, festival_factors):
+            with transaction(conn) as cursor:
+                database.bulk_write(cursor, database.UPSERT_SCHEDULE_PREDICTION, result.pop('batch').rows(), chunk_size)
+            total_buses += result['total_buses_needed']
+            total_cost += result['estimated_cost']
+            yield json.dumps({'type': 'route', **result}) + '\n'
         
-        conn.commit()
-        conn.close()
-        
-        return jsonify({
-            'status': 'success',
-            'message': 'Daily update completed',
-            'data': {
-                'prediction_date': tomorrow.strftime('%Y-%m-%d'),
-                'weather_factor': weather_data['weather_factor'],
-                'is_festival': is_festival,
-                'festival_name': festival_data.get('name', '') if is_festival else None,
-                'total_buses_needed': total_buses_needed,
-                'estimated_cost': round(total_cost, 2)
-            }
-        })
-        
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+        response_cache.fire('predictions_updated')
+        yield json.dumps({
+            'type': 'summary',
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'routes': len(specs),
+            'total_buses_needed': total_buses,
+            'estimated_cost': round(total_cost, 2)
+        }) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 def calculate_optimal_schedule(demand):
     """Calculate optimal bus schedule based on demand"""
-    if demand == 0:
-        return 0, 120
-    elif demand <= 20:
-        return 1, 90
-    elif demand <= 45:
-        return 1, 60
-    elif demand <= 90:
-        return 2, 45
-    elif demand <= 135:
-        return 2, 30
-    elif demand <= 200:
-        return 3, 25
-    elif demand <= 300:
-        return 4, 20
-    elif demand <= 400:
-        return 5, 15
-    else:
-        buses = max(3, min(8, (demand + 44) // 45))
-        frequency = max(10, 60 // max(1, buses - 2))
-        return buses, frequency
+    buses, frequency = optimizer.optimal_schedule(demand)
+    return int(buses), int(frequency)
 
 def calculate_hourly_cost(buses, distance, frequency):
     """Calculate hourly operational cost"""
-    if buses == 0:
-        return 0
-    
-    fuel_per_km = 8.5
-    driver_per_hour = 120
-    maintenance_per_km = 3.2
-    
-    trips_per_hour = 60 / frequency if frequency > 0 else 0
-    fuel_cost = distance * fuel_per_km * trips_per_hour * buses
-    driver_cost = driver_per_hour * buses
-    maintenance_cost = distance * maintenance_per_km * trips_per_hour * buses
-    
-    return fuel_cost + driver_cost + maintenance_cost
+    return float(optimizer.hourly_cost(buses, distance, frequency))
 
 # Serve static files (for demo)
-@app.route('/')
+@api.route('/')
 def index():
     return '''
     <html>
@@ -765,12 +1124,83 @@ def index():
     </html>
     '''
 
+def create_app(config=None):
+    """
+    Build a configured app. Nothing here touches the database or loads heavy
+    modules; values in config override the environment-derived defaults.
+    """
+    app = Flask(__name__)
+    app.config.update(config or {})
+    CORS(app)
+    
+    # Database Configuration
+    app.config.setdefault('DATABASE_PATH', database.resolve_db_path())
+    app.config.setdefault('DATABASE_POOL_SIZE', int(os.environ.get('TRANSPORT_DB_POOL_SIZE', 8)))
+    database.init_app(app)
+    
+    # Request timing and SQL profiling on /metrics (TRANSPORT_SLOW_REQUEST_MS logs slow requests)
+    metrics.init_app(app)
+    
+    # Operating cost rates (TRANSPORT_FUEL_PER_KM, TRANSPORT_DRIVER_PER_HOUR, TRANSPORT_MAINTENANCE_PER_KM)
+    app.config.setdefault('COST_RATES', optimizer.CostRates.from_env())
+    optimizer.configure(app.config['COST_RATES'])
+    
+    # Daily weather per district from TRANSPORT_WEATHER_PROVIDER ('simulated' or 'file' with TRANSPORT_WEATHER_FILE)
+    external_factors.init_app(app)
+    
+    # Response cache for read-mostly endpoints (TRANSPORT_CACHE_DIR shares it across workers)
+    response_cache.init_app(app)
+    
+    # ETags, 304s and gzip/brotli for JSON responses (HTTP_COMPRESS_MIN_SIZE, default 1 KB)
+    http_caching.init_app(app)
+    
+    # Background jobs (TRANSPORT_JOB_WORKERS threads; nightly update at TRANSPORT_NIGHTLY_AT, '' disables)
+    app.config.setdefault('JOBS_MAX_WAIT_SECONDS', 60)
+    app.config.setdefault('JOBS_NIGHTLY_FORECAST_DAYS', 7)
+    jobs.init_app(app)
+    
+    # Hourly demand kept for TRANSPORT_RETENTION_RAW_DAYS, then folded into weekly rollups (nightly job)
+    retention.init_app(app)
+    
+    # Live updates are computed once per tick and shared by every client
+    app.config.setdefault('LIVE_TICK_SECONDS',
+                          int(os.environ.get('TRANSPORT_LIVE_TICK_SECONDS', live_stream.DEFAULT_TICK_SECONDS)))
+    app.config.setdefault('LIVE_MAX_STREAMS', int(os.environ.get('TRANSPORT_LIVE_MAX_STREAMS', 0)))
+    app.extensions['live_updates'] = live_stream.LiveBroadcaster(
+        build_live_updates, app.config['LIVE_TICK_SECONDS'], app.config['LIVE_MAX_STREAMS'])
+    
+    # Login pipeline (TRANSPORT_AUTH_WORKERS password checks at once; sessions written in batches)
+    auth.init_app(app)
+    
+    # JWT Configuration
+    app.config.setdefault('JWT_SECRET_KEY', 'tn-transport-secret-2025')
+    app.config.setdefault('JWT_ACCESS_TOKEN_EXPIRES', timedelta(hours=8))
+    # Only /api/live-stream reads ?jwt=; everything else takes the Authorization header
+    app.config.setdefault('JWT_TOKEN_LOCATION', ['headers'])
+    app.config.setdefault('JWT_QUERY_STRING_NAME', 'jwt')
+    JWTManager(app)
+    
+    app.register_blueprint(api)
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
-    # Initialize database on startup
-    if not os.path.exists('transport_optimizer.db'):
-        print("🚌 Initializing Enhanced Transport Optimizer Database...")
-        init_enhanced_db()
-        print("✅ Database initialized with sample data")
+    # Development server; run serve.py for multi-process production serving
+    created, applied = prepare_database()
+    if created:
+        print("✅ Database schema created")
+    for version, description in applied:
+        print(f"🛠️  Applied schema migration {version}: {description}")
+    # Seed demo logins and history on first run; python seed_data.py does this ahead of time
+    if not user_count():
+        print("🌱 Loading demo data...")
+        seed_demo_data()
+    
+    # Resume jobs left queued by a previous run and schedule the nightly update
+    resumed = start_background_services()
+    if resumed:
+        print(f"⏳ Resumed {len(resumed)} queued background jobs")
     
     print("🚀 Enhanced Transport Optimizer 2025 Server Starting...")
     print("🔐 Features: Authentication, Real-time Updates, ML Predictions")
@@ -779,4 +1209,4 @@ if __name__ == '__main__':
     print("🔑 Login URL: http://localhost:5000/login.html")
     print("📱 API Documentation: Available at all endpoints")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,196 @@
+"""
+Festival and event calendar with range queries and per-day demand multipliers.
+
+Events live in the events table. An event covers start_date..end_date
+(multi-day festivals) and may ramp demand up over lead_days before it and
+back down over trail_days after it, for the travel home before a festival
+and the return trips after. The calendar is loaded once into arrays sorted
+by start date ordinal; range queries bisect that index and only scan
+events that can overlap, so they cost O(log n + matches). Multipliers are
+precomputed into one array per year (index = day of year), so a forecast
+over months gathers all of its factors in one vectorised lookup.
+
+Triggers bump a version counter whenever events change, so every process
+reloads the calendar on its next lookup after an edit (or immediately after
+invalidate()), the same way route_registry does.
+"""
+
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+import numpy as np
+
+from database import transaction
+
+EVENT_COLUMNS = ('id', 'name', 'type', 'start_date', 'end_date', 'multiplier', 'lead_days', 'trail_days')
+
+UPSERT_EVENT = """
+INSERT INTO events (name, type, start_date, end_date, multiplier, lead_days, trail_days)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (name, start_date) DO UPDATE SET
+    type = excluded.type,
+    end_date = excluded.end_date,
+    multiplier = excluded.multiplier,
+    lead_days = excluded.lead_days,
+    trail_days = excluded.trail_days
+"""
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def window_factors(multiplier, lead_days, span_days, trail_days):
+    """Multiplier for each day of an event's window: linear ramp in, full effect, linear ramp out"""
+    lead = 1 + (multiplier - 1) * np.arange(1, lead_days + 1) / (lead_days + 1)
+    trail = 1 + (multiplier - 1) * np.arange(trail_days, 0, -1) / (trail_days + 1)
+    return np.concatenate([lead, np.full(span_days, multiplier), trail])
+
+
+def _strongest(current, candidate):
+    """Where windows overlap the factor furthest from 1 wins (a strike's 0.5 beats a 1.2 fair)"""
+    return np.where(np.abs(np.log(candidate)) > np.abs(np.log(current)), candidate, current)
+
+
+class EventCalendar:
+    """Immutable snapshot of the events table indexed by date ordinal"""
+
+    def __init__(self, events, version=0):
+        self.events = sorted((dict(event) for event in events), key=lambda e: (e['start_date'], e['name']))
+        for event in self.events:
+            event['start_date'] = _as_date(event['start_date'])
+            event['end_date'] = _as_date(event['end_date'])
+        self.version = version
+        self.starts = [event['start_date'].toordinal() for event in self.events]
+        self.ends = np.array([event['end_date'].toordinal() for event in self.events], dtype=np.int64)
+        # Longest event, so a range query knows how far back an overlapping event can start
+        self.max_span = int((self.ends - np.array(self.starts, dtype=np.int64)).max()) if self.events else 0
+        self.max_lead = max((event['lead_days'] for event in self.events), default=0)
+        self.max_trail = max((event['trail_days'] for event in self.events), default=0)
+        self._years = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.events)
+
+    def _overlapping(self, first, last, windows=False):
+        """Indexes of events whose days (with lead/trail windows if asked) intersect ordinals first..last"""
+        lo = bisect_left(self.starts, first - self.max_span - (self.max_trail if windows else 0))
+        hi = bisect_right(self.starts, last + (self.max_lead if windows else 0))
+        if not windows:
+            return [i for i in range(lo, hi) if self.ends[i] >= first and self.starts[i] <= last]
+        return [i for i in range(lo, hi)
+                if self.ends[i] + self.events[i]['trail_days'] >= first
+                and self.starts[i] - self.events[i]['lead_days'] <= last]
+
+    def between(self, start, end):
+        """Events with at least one day in start..end (inclusive), ordered by start date"""
+        return [self.events[i] for i in self._overlapping(start.toordinal(), end.toordinal())]
+
+    def event_on(self, day):
+        """The event on day with the strongest multiplier, or None"""
+        events = self.between(day, day)
+        return max(events, key=lambda e: abs(np.log(e['multiplier'])), default=None)
+
+    def upcoming(self, today, limit=10):
+        """The next limit events that have not ended yet, including ones in progress"""
+        ordinal = today.toordinal()
+        start = bisect_left(self.starts, ordinal - self.max_span)
+        upcoming = []
+        for i in range(start, len(self.events)):
+            if self.ends[i] >= ordinal:
+                upcoming.append(self.events[i])
+                if len(upcoming) == limit:
+                    break
+        return upcoming
+
+    def year_factors(self, year):
+        """(days in year,) multiplier array indexed by day of year - 1, built once per year"""
+        factors = self._years.get(year)
+        if factors is not None:
+            return factors
+        with self._lock:
+            if year not in self._years:
+                first = date(year, 1, 1).toordinal()
+                last = date(year, 12, 31).toordinal()
+                factors = np.ones(last - first + 1, dtype=np.float64)
+                for i in self._overlapping(first, last, windows=True):
+                    event = self.events[i]
+                    window = window_factors(event['multiplier'], event['lead_days'],
+                                            int(self.ends[i]) - self.starts[i] + 1, event['trail_days'])
+                    window_start = self.starts[i] - event['lead_days']
+                    lo, hi = max(window_start, first), min(window_start + len(window) - 1, last)
+                    factors[lo - first:hi - first + 1] = _strongest(
+                        factors[lo - first:hi - first + 1], window[lo - window_start:hi - window_start + 1])
+                factors.flags.writeable = False
+                self._years[year] = factors
+            return self._years[year]
+
+    def factors(self, dates):
+        """(days,) demand multiplier for each date, one array gather per year spanned"""
+        ordinals = np.fromiter((day.toordinal() for day in dates), dtype=np.int64)
+        years = np.fromiter((day.year for day in dates), dtype=np.int64, count=len(ordinals))
+        result = np.ones(len(ordinals), dtype=np.float64)
+        for year in np.unique(years).tolist():
+            mask = years == year
+            result[mask] = self.year_factors(year)[ordinals[mask] - date(year, 1, 1).toordinal()]
+        return result
+
+    def factor(self, day):
+        """Demand multiplier for a single date"""
+        return float(self.year_factors(day.year)[day.timetuple().tm_yday - 1])
+
+
+def calendar_version(conn):
+    """Current event-calendar version counter maintained by triggers"""
+    row = conn.execute("SELECT version FROM event_calendar_version WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def load_calendar(conn):
+    """Read every event into an EventCalendar"""
+    version = calendar_version(conn)
+    rows = conn.execute(f"SELECT {', '.join(EVENT_COLUMNS)} FROM events").fetchall()
+    return EventCalendar([dict(zip(EVENT_COLUMNS, row)) for row in rows], version)
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+def get_calendar(conn):
+    """Return the cached calendar, reloading it if events changed"""
+    global _calendar
+    version = calendar_version(conn)
+    calendar = _calendar
+    if calendar is not None and calendar.version == version:
+        return calendar
+    with _calendar_lock:
+        if _calendar is None or _calendar.version != version:
+            _calendar = load_calendar(conn)
+        return _calendar
+
+
+def invalidate():
+    """Drop the cached calendar so the next lookup reloads it"""
+    global _calendar
+    with _calendar_lock:
+        _calendar = None
+
+
+def save_event(cursor, name, start_date, end_date=None, multiplier=1.0, event_type='custom',
+               lead_days=0, trail_days=0):
+    """Insert or update the event called name starting on start_date"""
+    start_date = _as_date(start_date)
+    end_date = _as_date(end_date) if end_date else start_date
+    cursor.execute(UPSERT_EVENT, (name, event_type, start_date.isoformat(), end_date.isoformat(),
+                                  multiplier, lead_days, trail_days))
+
+
+def save_events(conn, events):
+    """Save several save_event keyword dicts in one transaction"""
+    with transaction(conn) as cursor:
+        for event in events:
+            save_event(cursor, **event)
+    invalidate()
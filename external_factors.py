@@ -0,0 +1,317 @@
+"""
+Daily external factors (weather) per district from a pluggable provider.
+
+A provider returns weather for a district and a list of dates. Two ship
+with the app: 'simulated' draws seasonal Tamil Nadu weather seeded by
+district and date, so every process and every call agrees on a day, and
+'file' reads a local CSV, filling days missing from the file from the
+simulator. Others can be added with register_provider().
+
+Fetched days are stored in the external_factors table, one row per
+(district, date), and are also kept in process memory. A row for today or
+a later day is refetched once it is older than the TTL. Past days are
+final. Live updates, the daily update and forecasts all read this same
+row. weather_factors() returns a whole date range as one array: cached
+rows come from one SELECT, and the provider is called once for the
+missing days. Only known districts are served: the configured ones
+(Tamil Nadu's districts by default) and any the provider lists.
+"""
+
+import csv
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+from database import transaction
+
+DEFAULT_DISTRICT = 'Tiruppur'
+DEFAULT_TTL_SECONDS = 3 * 3600
+DEFAULT_DISTRICTS = (
+    'Ariyalur', 'Chengalpattu', 'Chennai', 'Coimbatore', 'Cuddalore', 'Dharmapuri', 'Dindigul', 'Erode',
+    'Kallakurichi', 'Kancheepuram', 'Kanniyakumari', 'Karur', 'Krishnagiri', 'Madurai', 'Mayiladuthurai',
+    'Nagapattinam', 'Namakkal', 'Nilgiris', 'Perambalur', 'Pudukkottai', 'Ramanathapuram', 'Ranipet', 'Salem',
+    'Sivaganga', 'Tenkasi', 'Thanjavur', 'Theni', 'Thoothukudi', 'Tiruchirappalli', 'Tirunelveli', 'Tirupathur',
+    'Tiruppur', 'Tiruvallur', 'Tiruvannamalai', 'Tiruvarur', 'Vellore', 'Viluppuram', 'Virudhunagar',
+)
+# Expired in-memory days are dropped once this many are held
+MEMORY_PRUNE_SIZE = 10000
+
+UPSERT_WEATHER = """
+INSERT INTO external_factors
+(district, date_recorded, weather_condition, temperature, rainfall, humidity, weather_factor, provider, fetched_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (district, date_recorded) DO UPDATE SET
+    weather_condition = excluded.weather_condition,
+    temperature = excluded.temperature,
+    rainfall = excluded.rainfall,
+    humidity = excluded.humidity,
+    weather_factor = excluded.weather_factor,
+    provider = excluded.provider,
+    fetched_at = excluded.fetched_at
+"""
+
+
+def derive_weather_factor(rainfall, temperature):
+    """Demand multiplier for a day's weather: rain pushes riders onto buses, and so does heat"""
+    if rainfall >= 5:
+        return 1.2
+    if temperature >= 33:
+        return 1.1
+    return 1.0
+
+
+class UnknownDistrict(ValueError):
+    """The district is neither configured nor listed by the provider"""
+
+
+class WeatherProvider(ABC):
+    """Source of daily weather; fetch() returns {date: {field: value}} for the days it knows"""
+
+    name = 'base'
+
+    @abstractmethod
+    def fetch(self, district, dates):
+        """Weather for the given dates in district"""
+
+    def districts(self):
+        """Districts this provider has data for, beyond the configured ones"""
+        return ()
+
+
+class SimulatedProvider(WeatherProvider):
+    """Seasonal weather, reproducible for a given district and day"""
+
+    name = 'simulated'
+
+    def __init__(self, seed=0):
+        self.seed = seed
+
+    def fetch(self, district, dates):
+        weather = {}
+        for day in dates:
+            rng = random.Random(f"{self.seed}:{district}:{day.isoformat()}")
+            if day.month in (6, 7, 8, 9):  # Monsoon
+                temperature, rainfall = rng.uniform(22, 32), rng.uniform(5, 30)
+                condition, factor = rng.choice(['Rain', 'Heavy Rain', 'Cloudy']), 1.2
+            elif day.month in (3, 4, 5):  # Summer
+                temperature, rainfall = rng.uniform(28, 38), 0.0
+                condition, factor = rng.choice(['Clear', 'Hot', 'Sunny']), 1.1
+            else:  # Winter/Post-monsoon
+                temperature, rainfall = rng.uniform(18, 28), rng.uniform(0, 5)
+                condition, factor = rng.choice(['Clear', 'Partly Cloudy']), 1.0
+            weather[day] = {
+                'condition': condition,
+                'temperature': round(temperature, 1),
+                'rainfall': round(rainfall, 1),
+                'humidity': round(rng.uniform(60, 85), 1),
+                'weather_factor': factor,
+            }
+        return weather
+
+
+class FileProvider(WeatherProvider):
+    """
+    Weather from a local CSV with columns date, district, condition,
+    temperature, rainfall, humidity and optionally weather_factor (derived
+    from rainfall and temperature when blank). Reloaded when the file
+    changes; days it lacks come from fallback.
+    """
+
+    name = 'file'
+
+    def __init__(self, path, fallback=None):
+        self.path = path
+        self.fallback = fallback if fallback is not None else SimulatedProvider()
+        self._rows = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return self._rows
+        with self._lock, open(self.path, newline='') as handle:
+            rows = {}
+            for record in csv.DictReader(handle):
+                rainfall = float(record.get('rainfall') or 0)
+                temperature = float(record['temperature'])
+                rows[(record['district'], date.fromisoformat(record['date']))] = {
+                    'condition': record.get('condition') or 'Unknown',
+                    'temperature': temperature,
+                    'rainfall': rainfall,
+                    'humidity': float(record.get('humidity') or 0),
+                    'weather_factor': float(record.get('weather_factor') or
+                                            derive_weather_factor(rainfall, temperature)),
+                }
+            self._rows, self._mtime = rows, mtime
+        return self._rows
+
+    def districts(self):
+        return {district for district, _ in self._load()}
+
+    def fetch(self, district, dates):
+        rows = self._load()
+        weather = {day: rows[(district, day)] for day in dates if (district, day) in rows}
+        missing = [day for day in dates if day not in weather]
+        if missing and self.fallback is not None:
+            weather.update(self.fallback.fetch(district, missing))
+        return weather
+
+
+PROVIDERS = {
+    SimulatedProvider.name: SimulatedProvider,
+    FileProvider.name: FileProvider,
+}
+
+
+def register_provider(name, factory):
+    """Make a provider available to EXTERNAL_FACTORS_PROVIDER by name"""
+    PROVIDERS[name] = factory
+
+
+def _utc_now():
+    # Same format and timezone as SQLite's CURRENT_TIMESTAMP
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ExternalFactors:
+    """Per-district daily weather cached in memory and in the external_factors table"""
+
+    def __init__(self, provider=None, ttl=DEFAULT_TTL_SECONDS, district=DEFAULT_DISTRICT,
+                 districts=DEFAULT_DISTRICTS):
+        self.provider = provider or SimulatedProvider()
+        self.ttl = ttl
+        self.district = district
+        self.districts = frozenset(districts) | {district}
+        self._memory = {}
+        self._memory_lock = threading.Lock()
+        self.fetches = 0
+
+    def known_district(self, district):
+        return district in self.districts or district in self.provider.districts()
+
+    def series(self, conn, dates, district=None):
+        """Weather dicts for each date, fetching and storing only what is missing or stale"""
+        district = district or self.district
+        if not self.known_district(district):
+            raise UnknownDistrict(district)
+        dates = list(dates)
+        now = time.monotonic()
+        today = date.today()
+        found = {}
+        for day in dates:
+            cached = self._memory.get((district, day))
+            if cached is not None and cached[0] > now:
+                found[day] = cached[1]
+        if len(found) < len(dates):
+            found.update(self._load(conn, district, [day for day in dates if day not in found], today, now))
+        return [found[day] for day in dates]
+
+    def _load(self, conn, district, dates, today, now):
+        first, last = min(dates), max(dates)
+        wanted = set(dates)
+        # Rows for today or later fetched before this are stale
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=self.ttl)).strftime('%Y-%m-%d %H:%M:%S')
+        found = {}
+        for day, condition, temperature, rainfall, humidity, factor, fetched_at in conn.execute("""
+        SELECT date_recorded, weather_condition, temperature, rainfall, humidity, weather_factor, fetched_at
+        FROM external_factors
+        WHERE district = ? AND date_recorded BETWEEN ? AND ? AND weather_factor IS NOT NULL
+        """, (district, first.isoformat(), last.isoformat())):
+            day = date.fromisoformat(day)
+            if day not in wanted:
+                continue
+            if day >= today and (fetched_at is None or fetched_at < cutoff):
+                continue
+            found[day] = {'condition': condition, 'temperature': temperature, 'rainfall': rainfall,
+                          'humidity': humidity, 'weather_factor': factor}
+
+        missing = [day for day in dates if day not in found]
+        if missing:
+            fetched = self.provider.fetch(district, missing)
+            self.fetches += 1
+            stamp = _utc_now()
+            rows = [(district, day.isoformat(), weather['condition'], weather['temperature'], weather['rainfall'],
+                     weather['humidity'], weather['weather_factor'], self.provider.name, stamp)
+                    for day, weather in fetched.items()]
+            if conn.in_transaction:
+                conn.executemany(UPSERT_WEATHER, rows)
+            else:
+                with transaction(conn) as cursor:
+                    cursor.executemany(UPSERT_WEATHER, rows)
+            found.update(fetched)
+            for day in missing:
+                # Days the provider could not supply count as neutral weather
+                found.setdefault(day, {'condition': 'Unknown', 'temperature': None, 'rainfall': 0.0,
+                                       'humidity': None, 'weather_factor': 1.0})
+
+        with self._memory_lock:
+            for day, weather in found.items():
+                self._memory[(district, day)] = (now + self.ttl, weather)
+            if len(self._memory) > MEMORY_PRUNE_SIZE:
+                for key in [key for key, (expires, _) in self._memory.items() if expires <= now]:
+                    del self._memory[key]
+        return found
+
+    def get(self, conn, day=None, district=None):
+        """Weather dict for one day (default today)"""
+        return self.series(conn, [day or date.today()], district)[0]
+
+    def weather_factors(self, conn, dates, district=None):
+        """(days,) weather multiplier for each date"""
+        return np.array([weather['weather_factor'] for weather in self.series(conn, dates, district)],
+                        dtype=np.float64)
+
+    def invalidate(self):
+        with self._memory_lock:
+            self._memory.clear()
+
+
+def make_provider(name, path=None):
+    """Build a registered provider; the file provider reads path"""
+    if name == FileProvider.name:
+        if not path:
+            raise ValueError("The file weather provider needs EXTERNAL_FACTORS_FILE (TRANSPORT_WEATHER_FILE)")
+        return FileProvider(path)
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown weather provider {name!r}; choose one of {', '.join(sorted(PROVIDERS))}")
+    return PROVIDERS[name]()
+
+
+_service = None
+
+
+def configure(provider=None, ttl=DEFAULT_TTL_SECONDS, district=DEFAULT_DISTRICT, districts=DEFAULT_DISTRICTS):
+    """Create (or replace) the process-wide external-factors service"""
+    global _service
+    _service = ExternalFactors(provider, ttl, district, districts)
+    return _service
+
+
+def get_service():
+    if _service is None:
+        return configure()
+    return _service
+
+
+def init_app(app):
+    """Configure the shared service from EXTERNAL_FACTORS_* settings"""
+    app.config.setdefault('EXTERNAL_FACTORS_PROVIDER', os.environ.get('TRANSPORT_WEATHER_PROVIDER', 'simulated'))
+    app.config.setdefault('EXTERNAL_FACTORS_FILE', os.environ.get('TRANSPORT_WEATHER_FILE') or None)
+    app.config.setdefault('EXTERNAL_FACTORS_TTL_SECONDS',
+                          int(os.environ.get('TRANSPORT_WEATHER_TTL_SECONDS', DEFAULT_TTL_SECONDS)))
+    app.config.setdefault('EXTERNAL_FACTORS_DISTRICT', os.environ.get('TRANSPORT_DISTRICT', DEFAULT_DISTRICT))
+    districts = os.environ.get('TRANSPORT_DISTRICTS')
+    app.config.setdefault('EXTERNAL_FACTORS_DISTRICTS',
+                          [name.strip() for name in districts.split(',') if name.strip()] if districts
+                          else DEFAULT_DISTRICTS)
+    provider = app.config['EXTERNAL_FACTORS_PROVIDER']
+    if isinstance(provider, str):
+        provider = make_provider(provider, app.config['EXTERNAL_FACTORS_FILE'])
+    return configure(provider, app.config['EXTERNAL_FACTORS_TTL_SECONDS'], app.config['EXTERNAL_FACTORS_DISTRICT'],
+                     app.config['EXTERNAL_FACTORS_DISTRICTS'])
@@ -0,0 +1,148 @@
+"""
+Fleet-wide bus allocation across routes and hours.
+
+Each route-hour needs enough buses in rotation to carry its demand at the
+target load factor. One bus completes a round trip every cycle (twice the
+one-way travel_time plus layover), so its hourly capacity and its share of
+the headway both follow from the route's cycle time. Cost is linear in
+buses, so when the fleet covers every requirement the minimum-cost plan
+simply meets each requirement. When it does not, buses go to the route-hours
+with the highest passengers served per rupee. Minimum service always comes
+first. Served passengers are concave in buses, so taking the top increments
+hour by hour is an exact greedy solution.
+"""
+
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+import optimizer
+from optimizer import BUS_CAPACITY
+
+DEFAULT_LOAD_FACTOR = 0.85
+DEFAULT_LAYOVER_MINUTES = 10
+DEFAULT_MAX_HEADWAY_MINUTES = 120
+
+# Score offset that keeps minimum-service buses ahead of every demand-driven bus
+_MIN_SERVICE_PRIORITY = 1e12
+
+
+@dataclass
+class AllocationResult:
+    """Per route-hour allocation arrays shaped (routes, hours) plus solver metrics"""
+    route_ids: list
+    buses: np.ndarray
+    required: np.ndarray
+    headway_minutes: np.ndarray
+    load_factor: np.ndarray
+    served: np.ndarray
+    unserved: np.ndarray
+    cost: np.ndarray
+    fleet_size: int
+    solve_seconds: float
+    status: str
+    idle_buses: np.ndarray = field(default=None)
+
+    def summary(self):
+        """JSON-ready totals and per-route breakdown"""
+        return {
+            'status': self.status,
+            'fleet_size': self.fleet_size,
+            'peak_buses_in_service': int(self.buses.sum(axis=0).max()) if self.buses.size else 0,
+            'peak_buses_required': int(self.required.sum(axis=0).max()) if self.required.size else 0,
+            'bus_hours': int(self.buses.sum()),
+            'unserved_passengers': int(self.unserved.sum()),
+            'estimated_cost': round(float(self.cost.sum()), 2),
+            'solve_ms': round(self.solve_seconds * 1000, 3),
+            'routes': [
+                {
+                    'route_id': route_id,
+                    'buses_by_hour': self.buses[r].tolist(),
+                    'headway_minutes': [round(value, 1) for value in self.headway_minutes[r].tolist()],
+                    'peak_buses': int(self.buses[r].max()),
+                    'unserved_passengers': int(self.unserved[r].sum()),
+                    'estimated_cost': round(float(self.cost[r].sum()), 2),
+                }
+                for r, route_id in enumerate(self.route_ids)
+            ],
+        }
+
+
+def cycle_minutes(travel_times, layover_minutes=DEFAULT_LAYOVER_MINUTES):
+    """Round-trip cycle per route: out, back and one layover"""
+    return 2 * np.asarray(travel_times, dtype=np.float64) + layover_minutes
+
+
+def allocate_fleet(route_ids, demand, distances, travel_times, fleet_size,
+                   load_factor=DEFAULT_LOAD_FACTOR, capacity=BUS_CAPACITY,
+                   layover_minutes=DEFAULT_LAYOVER_MINUTES,
+                   max_headway_minutes=DEFAULT_MAX_HEADWAY_MINUTES, rates=None):
+    """
+    Spread fleet_size buses across a (routes, hours) demand grid.
+
+    demand is passengers per route-hour; distances (km) and travel_times
+    (one-way minutes) come from the routes table.
+    """
+    started = time.perf_counter()
+    rates = rates or optimizer.get_table().rates
+
+    demand = np.maximum(np.asarray(demand, dtype=np.float64), 0)
+    cycle = cycle_minutes(travel_times, layover_minutes)[:, np.newaxis]
+    distances = np.asarray(distances, dtype=np.float64)[:, np.newaxis]
+
+    # Passengers one bus can carry per hour and what one bus-hour costs on each route
+    seats_per_bus_hour = capacity * 60.0 / cycle
+    km_per_bus_hour = 2 * distances * 60.0 / cycle
+    cost_per_bus_hour = rates.driver_per_hour + rates.per_km * km_per_bus_hour
+
+    # Buses needed at the load factor, and the floor that keeps headways under the maximum
+    needed = np.ceil(demand / (seats_per_bus_hour * load_factor))
+    min_service = np.where(demand > 0, np.ceil(cycle / max_headway_minutes), 0)
+    required = np.maximum(needed, min_service).astype(np.int64)
+
+    route_count = demand.shape[0]
+    buses = required.copy()
+    status = 'optimal'
+    hourly_required = required.sum(axis=0)
+
+    short_hours = np.flatnonzero(hourly_required > fleet_size)
+    if short_hours.size:
+        status = 'fleet_limited'
+        max_k = int(required.max())
+        k = np.arange(1, max_k + 1)[np.newaxis, np.newaxis, :]
+
+        # Passengers gained by the k-th bus, per rupee; min-service buses rank first
+        gain = np.clip(demand[:, :, np.newaxis] - (k - 1) * seats_per_bus_hour[:, :, np.newaxis],
+                       0, seats_per_bus_hour[:, :, np.newaxis])
+        score = gain / cost_per_bus_hour[:, :, np.newaxis]
+        score = np.where(k <= min_service[:, :, np.newaxis], score + _MIN_SERVICE_PRIORITY, score)
+        score = np.where(k <= required[:, :, np.newaxis], score, -np.inf)
+
+        for hour in short_hours:
+            flat = score[:, hour, :].ravel()
+            chosen = np.argpartition(-flat, fleet_size - 1)[:fleet_size] if fleet_size > 0 else []
+            counts = np.zeros(route_count * max_k, dtype=np.int64)
+            counts[chosen] = 1
+            buses[:, hour] = counts.reshape(route_count, max_k).sum(axis=1)
+
+    offered = buses * seats_per_bus_hour
+    served = np.minimum(demand, offered)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        headway = np.where(buses > 0, cycle / np.maximum(buses, 1), np.inf)
+        load = np.where(offered > 0, demand / np.maximum(offered, 1e-9), 0.0)
+
+    return AllocationResult(
+        route_ids=list(route_ids),
+        buses=buses,
+        required=required,
+        headway_minutes=np.where(np.isinf(headway), 0.0, headway),
+        load_factor=load,
+        served=served,
+        unserved=demand - served,
+        cost=buses * cost_per_bus_hour,
+        fleet_size=int(fleet_size),
+        solve_seconds=time.perf_counter() - started,
+        status=status,
+        idle_buses=fleet_size - buses.sum(axis=0),
+    )
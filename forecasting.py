@@ -0,0 +1,135 @@
+"""
+Multi-day, multi-route forecasting across a process pool.
+
+Routes are split into small groups and forecast in worker processes with
+the vectorized prediction engine. Results are yielded per route as each
+group finishes so callers can stream and store them incrementally.
+"""
+
+import atexit
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import prediction_engine
+
+MAX_HORIZON_DAYS = 62
+TASKS_PER_WORKER = 4
+FORECAST_WORKERS_ENV = 'TRANSPORT_FORECAST_WORKERS'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def configured_workers():
+    """Worker process count; 0 runs forecasts inline in the calling thread"""
+    value = os.environ.get(FORECAST_WORKERS_ENV)
+    return int(value) if value is not None else (os.cpu_count() or 1)
+
+
+def _mp_context():
+    """
+    Workers are started from a clean process: the pool is created lazily in
+    threaded servers, and forking there could copy locks held by other threads
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def get_executor(workers=None):
+    """Return the shared process pool, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers or configured_workers(), mp_context=_mp_context())
+        return _executor
+
+
+def shutdown():
+    """Stop the shared process pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+atexit.register(shutdown)
+
+
+def forecast_route_group(specs, dates, weather_factors, festival_factors, seed):
+    """
+    Worker entry point: forecast a group of routes over the given dates.
+
+    Each spec is a dict with route_id, base_pattern, distance and market_days,
+    plus an optional (days, hours) model_demand from the trained demand model.
+    Returns one result dict per route with its PredictionBatch (arrays pickle
+    far cheaper than row tuples) and a per-day summary.
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for spec in specs:
+        route_id = spec['route_id']
+        market = prediction_engine.market_factor_matrix(
+            [route_id], dates, {route_id: spec['market_days']})
+        batch = prediction_engine.run_predictions(
+            [route_id], dates,
+            base_patterns=[spec['base_pattern']],
+            distances=[spec['distance']],
+            weather_factor=weather_factors,
+            festival_factor=festival_factors,
+            market_factor=market,
+            rng=rng,
+            model_demand=spec.get('model_demand'),
+        )
+        days = [
+            {
+                'date': day.isoformat(),
+                'predicted_passengers': int(batch.demand[0, d].sum()),
+                'bus_hours': int(batch.buses[0, d].sum()),
+                'peak_buses': int(batch.buses[0, d].max()),
+                'estimated_cost': round(float(batch.cost[0, d].sum()), 2),
+            }
+            for d, day in enumerate(dates)
+        ]
+        results.append({
+            'route_id': route_id,
+            'batch': batch,
+            'days': days,
+            'total_buses_needed': batch.total_buses,
+            'estimated_cost': round(batch.total_cost, 2),
+        })
+    return results
+
+
+def iter_forecasts(specs, dates, weather_factors, festival_factors, workers=None,
+                   routes_per_task=None, seed=None):
+    """Yield per-route forecast results in completion order"""
+    weather_factors = np.asarray(weather_factors, dtype=np.float64)
+    festival_factors = np.asarray(festival_factors, dtype=np.float64)
+    workers = configured_workers() if workers is None else workers
+    if routes_per_task is None:
+        routes_per_task = max(1, math.ceil(len(specs) / (max(workers, 1) * TASKS_PER_WORKER)))
+    groups = [specs[i:i + routes_per_task] for i in range(0, len(specs), routes_per_task)]
+    seeds = np.random.SeedSequence(seed).spawn(len(groups))
+
+    if workers == 0 or len(groups) <= 1:
+        for group, group_seed in zip(groups, seeds):
+            yield from forecast_route_group(group, dates, weather_factors, festival_factors, group_seed)
+        return
+
+    executor = get_executor(workers)
+    futures = [
+        executor.submit(forecast_route_group, group, dates, weather_factors, festival_factors, group_seed)
+        for group, group_seed in zip(groups, seeds)
+    ]
+    try:
+        for future in as_completed(futures):
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
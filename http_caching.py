@@ -0,0 +1,91 @@
+"""
+Conditional GET and compression for JSON API responses.
+
+Every complete JSON response gets a content-hash ETag; a matching
+If-None-Match turns it into an empty 304. Bodies above a size threshold are
+compressed with brotli (when the brotli package is installed and the client
+accepts it) or gzip. Streaming responses pass through untouched.
+"""
+
+import gzip
+import hashlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_MIMETYPES = ('application/json',)
+
+
+def content_etag(body):
+    """Strong validator for a response body"""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def choose_encoding(request):
+    """Best supported content coding the client accepts, or None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br'] > 0:
+        return 'br'
+    if accepted['gzip'] > 0:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding, level=DEFAULT_GZIP_LEVEL):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def process_response(response, request, min_size=DEFAULT_MIN_SIZE,
+                     gzip_level=DEFAULT_GZIP_LEVEL, mimetypes=DEFAULT_MIMETYPES):
+    """Add ETag/304 handling and compression to a finished response"""
+    if (request.method not in ('GET', 'HEAD') or response.status_code != 200
+            or response.is_streamed or response.direct_passthrough
+            or response.mimetype not in mimetypes or 'Content-Encoding' in response.headers):
+        return response
+
+    body = response.get_data()
+    encoding = choose_encoding(request) if len(body) >= min_size else None
+
+    # Each representation needs its own strong ETag
+    etag = content_etag(body)
+    if encoding:
+        etag = f"{etag}-{encoding}"
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    if not response.cache_control.no_store:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        response.set_data(b'')
+        return response
+
+    if encoding:
+        response.set_data(compress(body, encoding, gzip_level))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    """Register the after_request hook using HTTP_COMPRESS_* settings"""
+    app.config.setdefault('HTTP_COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE)
+    app.config.setdefault('HTTP_COMPRESS_LEVEL', DEFAULT_GZIP_LEVEL)
+    app.config.setdefault('HTTP_COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+
+    @app.after_request
+    def conditional_response(response):
+        return process_response(
+            response, request,
+            min_size=app.config['HTTP_COMPRESS_MIN_SIZE'],
+            gzip_level=app.config['HTTP_COMPRESS_LEVEL'],
+            mimetypes=app.config['HTTP_COMPRESS_MIMETYPES'],
+        )
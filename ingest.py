@@ -0,0 +1,217 @@
+"""
+Streaming ingestion of observed ridership counts.
+
+Ticket machines and automatic passenger counters push (route_id, timestamp,
+count) records as newline-delimited JSON or CSV. Records flow through a
+generator pipeline (decode, parse, validate) and are written in fixed-size
+batches that each commit on their own, so a full day of counts for hundreds
+of routes goes through in one request with constant memory.
+"""
+
+import csv
+import io
+import json
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+
+import database
+import retention
+from database import transaction
+from route_registry import MARKET_DAY_FACTOR
+
+FORMATS = ('ndjson', 'csv')
+CSV_COLUMNS = ('route_id', 'timestamp', 'count')
+MAX_REPORTED_ERRORS = 20
+READ_BUFFER_SIZE = 64 * 1024
+
+# replace: each record is the hour's total; accumulate: records add up (per-trip counts)
+MODES = {
+    'replace': database.UPSERT_PASSENGER_DEMAND,
+    'accumulate': database.ACCUMULATE_PASSENGER_DEMAND,
+}
+
+
+class IngestError(Exception):
+    """Storage failed part-way; report holds what was committed"""
+
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+
+@dataclass
+class IngestReport:
+    """Running totals for one ingestion request"""
+    accepted: int = 0
+    rejected: int = 0
+    written: int = 0
+    batches: int = 0
+    elapsed_seconds: float = 0.0
+    first_date: str = None
+    last_date: str = None
+    errors: list = field(default_factory=list)
+
+    def reject(self, line_number, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'error': message})
+
+    def summary(self):
+        return {
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'written': self.written,
+            'batches': self.batches,
+            'elapsed_ms': round(self.elapsed_seconds * 1000, 1),
+            'first_date': self.first_date,
+            'last_date': self.last_date,
+            'errors': self.errors,
+        }
+
+
+def detect_format(content_type, requested=None):
+    """Pick ndjson or csv from an explicit ?format= or the Content-Type"""
+    if requested:
+        return requested.lower()
+    if content_type and 'csv' in content_type.lower():
+        return 'csv'
+    return 'ndjson'
+
+
+def iter_lines(stream, report):
+    """Decode a byte stream into (line_number, text) pairs, skipping blank lines"""
+    # Raw request streams readline() a byte at a time; buffer them
+    if isinstance(stream, io.RawIOBase):
+        stream = io.BufferedReader(stream, READ_BUFFER_SIZE)
+    for line_number, raw in enumerate(stream, start=1):
+        try:
+            text = raw.decode('utf-8-sig' if line_number == 1 else 'utf-8').strip()
+        except UnicodeDecodeError:
+            report.reject(line_number, 'not valid UTF-8')
+            continue
+        if text:
+            yield line_number, text
+
+
+def parse_ndjson(lines, report):
+    """One JSON object per line -> (line_number, record)"""
+    for line_number, text in lines:
+        try:
+            record = json.loads(text)
+        except ValueError:
+            report.reject(line_number, 'invalid JSON')
+            continue
+        if not isinstance(record, dict):
+            report.reject(line_number, 'expected a JSON object')
+            continue
+        yield line_number, record
+
+
+def parse_csv(lines, report):
+    """CSV with a route_id,timestamp,count header -> (line_number, record)"""
+    lines = iter(lines)
+    header = next(lines, None)
+    if header is None:
+        return
+    columns = [name.strip() for name in next(csv.reader([header[1]]))]
+    missing = [name for name in CSV_COLUMNS if name not in columns]
+    if missing:
+        report.reject(header[0], f"CSV header is missing {', '.join(missing)}")
+        return
+    for line_number, text in lines:
+        values = next(csv.reader([text]))
+        if len(values) != len(columns):
+            report.reject(line_number, f"expected {len(columns)} columns, got {len(values)}")
+            continue
+        yield line_number, dict(zip(columns, values))
+
+
+def parse_timestamp(value):
+    """ISO 8601 string or epoch seconds -> naive local datetime"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value)
+    stamp = datetime.fromisoformat(str(value).strip())
+    if stamp.tzinfo is not None:
+        stamp = stamp.astimezone().replace(tzinfo=None)
+    return stamp
+
+
+def validate(records, registry, report, festival_factor=None):
+    """Turn parsed records into passenger_demand rows, rejecting bad ones"""
+    festival_cache = {}
+    for line_number, record in records:
+        route_id = record.get('route_id')
+        if not isinstance(route_id, str) or route_id not in registry:
+            report.reject(line_number, f"unknown route_id {route_id!r}")
+            continue
+        try:
+            stamp = parse_timestamp(record['timestamp'])
+        except (KeyError, TypeError, ValueError, OverflowError, OSError):
+            report.reject(line_number, 'missing or invalid timestamp')
+            continue
+        try:
+            count = int(record['count'])
+        except (KeyError, TypeError, ValueError):
+            report.reject(line_number, 'missing or invalid count')
+            continue
+        if count < 0:
+            report.reject(line_number, 'count must be non-negative')
+            continue
+
+        day = stamp.date()
+        date_str = day.isoformat()
+        if date_str not in festival_cache:
+            festival_cache[date_str] = festival_factor(day) if festival_factor else 1.0
+        weekday = day.weekday()
+        market = MARKET_DAY_FACTOR if registry.market_mask[registry.index[route_id], weekday] else 1.0
+
+        report.accepted += 1
+        if report.first_date is None or date_str < report.first_date:
+            report.first_date = date_str
+        if report.last_date is None or date_str > report.last_date:
+            report.last_date = date_str
+        yield (route_id, stamp.hour, weekday, count, date_str, False, festival_cache[date_str], market)
+
+
+def write_batches(conn, rows, sql, batch_size, report):
+    """Commit rows in batches of batch_size, one transaction each"""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        with transaction(conn) as cursor:
+            # Late rows for days already moved into a monthly partition land on the sealed totals
+            retention.unseal_days(cursor, {row[4] for row in batch})
+            cursor.executemany(sql, batch)
+        report.written += len(batch)
+        report.batches += 1
+
+
+def ingest(conn, stream, registry, fmt='ndjson', mode='replace', batch_size=None, festival_factor=None):
+    """
+    Validate and store a stream of ridership records.
+
+    Batches committed before a storage error stay committed; the
+    IngestError raised then carries the report so far.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+
+    report = IngestReport()
+    started = time.perf_counter()
+    parse = parse_csv if fmt == 'csv' else parse_ndjson
+    records = parse(iter_lines(stream, report), report)
+    rows = validate(records, registry, report, festival_factor)
+    try:
+        write_batches(conn, rows, MODES[mode], batch_size or database.DEFAULT_BULK_CHUNK_SIZE, report)
+    except sqlite3.Error as exc:
+        raise IngestError(str(exc), report) from exc
+    finally:
+        report.elapsed_seconds = time.perf_counter() - started
+    return report
@@ -0,0 +1,394 @@
+"""
+Background jobs for daily updates, forecasts and other heavy work.
+
+Jobs are rows in the jobs table, so their status, progress and results
+survive restarts and are visible to every worker process. A thread pool
+runs them off the request path; each run first claims its row with a
+conditional UPDATE, so a job queued by one process is only ever run once.
+Handlers must be idempotent (upserts, one transaction per write) because a
+failed attempt is retried with backoff up to max_attempts times. The backoff
+is stored as run_after, which every process's claim respects.
+
+While a job runs, a heartbeat thread refreshes its updated_at from its own
+connection, since progress is not written while a handler holds a
+transaction. That beat needs the write lock too, so a handler transaction
+longer than STALE_AFTER_SECONDS also silences it; recover() therefore only
+requeues a stale job once the process named in its worker column is gone
+(checked by pid on this host; other hosts only have the heartbeat).
+
+Submitting with an idempotency key returns the existing job for that key
+instead of queueing another, and an identical job that is still queued or
+running is reused the same way. The nightly schedule relies on this: every
+process schedules it, but only one job per night is created.
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import date
+
+import database
+import metrics
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY_SECONDS = 30
+# A running job with no heartbeat for this long is requeued unless its process is still alive
+STALE_AFTER_SECONDS = 900
+HEARTBEAT_SECONDS = 60
+SCHEDULER_POLL_SECONDS = 30
+DEFAULT_NIGHTLY_AT = '01:30'
+NIGHTLY_KIND = 'nightly'
+
+logger = logging.getLogger('transport.jobs')
+
+JOB_COLUMNS = ('id', 'kind', 'status', 'params', 'idempotency_key', 'progress', 'message', 'result',
+               'error', 'attempts', 'max_attempts', 'worker', 'created_by', 'created_at', 'started_at',
+               'finished_at', 'updated_at', 'run_after')
+
+
+def _row_to_job(row):
+    job = dict(zip(JOB_COLUMNS, row))
+    for name in ('params', 'result'):
+        job[name] = json.loads(job[name]) if job[name] else None
+    return job
+
+
+def get_job(conn, job_id):
+    row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def recent_jobs(conn, limit=20, kind=None):
+    sql = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs"
+    params = ()
+    if kind:
+        sql += " WHERE kind = ?"
+        params = (kind,)
+    rows = conn.execute(sql + " ORDER BY created_at DESC, rowid DESC LIMIT ?", params + (limit,))
+    return [_row_to_job(row) for row in rows]
+
+
+class Progress:
+    """Callback handed to handlers: progress(fraction, message)"""
+
+    def __init__(self, runner, job_id, conn):
+        self.runner = runner
+        self.job_id = job_id
+        self.conn = conn
+
+    def __call__(self, fraction, message=None):
+        fraction = round(min(max(float(fraction), 0.0), 1.0), 4)
+        self.runner._live[self.job_id] = (fraction, message)
+        # Another connection would wait on the write lock the handler holds; persist later instead
+        if not self.conn.in_transaction:
+            self.conn.execute("""
+            UPDATE jobs SET progress = ?, message = COALESCE(?, message), updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            """, (fraction, message, self.job_id))
+
+
+class JobRunner:
+    """Thread pool running registered handlers for jobs stored in the database"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 retry_delay=DEFAULT_RETRY_DELAY_SECONDS):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.handlers = {}
+        # Handlers run inside this app's context when set (see init_app)
+        self.app = None
+        self.nightly_at = DEFAULT_NIGHTLY_AT
+        self._executor = None
+        self._lock = threading.Lock()
+        self._live = {}
+        self._done = {}
+        self._timers = set()
+        self._running = set()
+        self._heartbeat = None
+        self._scheduler = None
+        self._stopping = threading.Event()
+
+    @property
+    def worker_name(self):
+        # Read per call: the runner may be created before server workers fork
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def register(self, kind, handler):
+        """handler(conn, params, progress) -> JSON-serialisable result"""
+        self.handlers[kind] = handler
+        return handler
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+            return self._executor
+
+    def submit(self, kind, params=None, idempotency_key=None, created_by=None, max_attempts=None):
+        """Queue a job, or return the existing one for the same key or identical active job"""
+        if kind not in self.handlers:
+            raise ValueError(f"unknown job kind {kind!r}")
+        params_json = json.dumps(params or {}, sort_keys=True)
+        with database.get_pool().connection() as conn:
+            with database.transaction(conn) as cursor:
+                if idempotency_key:
+                    row = cursor.execute("SELECT id FROM jobs WHERE idempotency_key = ?",
+                                         (idempotency_key,)).fetchone()
+                else:
+                    row = cursor.execute("""
+                    SELECT id FROM jobs WHERE kind = ? AND params = ? AND status IN (?, ?)
+                    ORDER BY created_at DESC LIMIT 1
+                    """, (kind, params_json) + ACTIVE_STATUSES).fetchone()
+                if row:
+                    return get_job(conn, row[0]), False
+                job_id = uuid.uuid4().hex
+                cursor.execute("""
+                INSERT INTO jobs (id, kind, status, params, idempotency_key, max_attempts, created_by)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (job_id, kind, QUEUED, params_json, idempotency_key,
+                      max_attempts or self.max_attempts, created_by))
+            job = get_job(conn, job_id)
+        self._done[job_id] = threading.Event()
+        self._get_executor().submit(self._run, job_id)
+        return job, True
+
+    def get(self, job_id):
+        """Stored job merged with progress not yet written by a handler mid-transaction"""
+        with database.get_pool().connection() as conn:
+            job = get_job(conn, job_id)
+        live = self._live.get(job_id)
+        if job and live and job['status'] == RUNNING:
+            job['progress'], message = live
+            job['message'] = message or job['message']
+        return job
+
+    def wait(self, job_id, timeout):
+        """Block up to timeout seconds for a job this process is running"""
+        done = self._done.get(job_id)
+        if done is not None:
+            done.wait(timeout)
+        return self.get(job_id)
+
+    def _claim(self, conn, job_id):
+        claimed = conn.execute("""
+        UPDATE jobs SET status = ?, attempts = attempts + 1, progress = 0, error = NULL, run_after = NULL,
+            worker = ?, started_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = ? AND (run_after IS NULL OR run_after <= CURRENT_TIMESTAMP)
+        """, (RUNNING, self.worker_name, job_id, QUEUED)).rowcount
+        return claimed == 1
+
+    def _wait_seconds(self, conn, job_id):
+        """Seconds until a queued job's run_after, or None if it is not waiting"""
+        row = conn.execute("""
+        SELECT (julianday(run_after) - julianday('now')) * 86400 FROM jobs
+        WHERE id = ? AND status = ? AND run_after > CURRENT_TIMESTAMP
+        """, (job_id, QUEUED)).fetchone()
+        return max(row[0], 1) if row else None
+
+    def _ensure_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat = threading.Thread(target=self._beat, name='job-heartbeat', daemon=True)
+                self._heartbeat.start()
+
+    def _beat(self):
+        """Refresh updated_at of this process's running jobs until the runner stops"""
+        while not self._stopping.wait(HEARTBEAT_SECONDS):
+            job_ids = list(self._running)
+            if not job_ids:
+                continue
+            try:
+                with database.get_pool().connection() as conn:
+                    conn.execute(f"""
+                    UPDATE jobs SET updated_at = CURRENT_TIMESTAMP
+                    WHERE status = ? AND worker = ? AND id IN ({', '.join('?' * len(job_ids))})
+                    """, (RUNNING, self.worker_name, *job_ids))
+            except sqlite3.OperationalError:
+                # A handler is holding the write lock; recover() falls back to checking the pid
+                logger.debug("Job heartbeat skipped", exc_info=True)
+
+    def _run(self, job_id):
+        retry_in = None
+        try:
+            with database.get_pool().connection() as conn:
+                if not self._claim(conn, job_id):
+                    # Backing off after a failure here or in another process: come back when it is due
+                    retry_in = self._wait_seconds(conn, job_id)
+                    return
+                self._running.add(job_id)
+                self._ensure_heartbeat()
+                job = get_job(conn, job_id)
+                started = time.perf_counter()
+                context = self.app.app_context() if self.app else nullcontext()
+                try:
+                    with context, metrics.profiled(f"job:{job['kind']}"):
+                        result = self.handlers[job['kind']](conn, job['params'], Progress(self, job_id, conn))
+                except Exception as exc:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    logger.exception("Job %s (%s) attempt %s failed", job_id, job['kind'], job['attempts'])
+                    retry = job['attempts'] < job['max_attempts'] and not self._stopping.is_set()
+                    delay = self.retry_delay * 2 ** (job['attempts'] - 1)
+                    conn.execute("""
+                    UPDATE jobs SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP,
+                        run_after = CASE WHEN ? THEN datetime('now', ?) END,
+                        finished_at = CASE WHEN ? THEN NULL ELSE CURRENT_TIMESTAMP END
+                    WHERE id = ?
+                    """, (QUEUED if retry else FAILED, f"{type(exc).__name__}: {exc}", retry, f'+{delay} seconds',
+                          retry, job_id))
+                    if retry:
+                        retry_in = delay
+                    return
+                conn.execute("""
+                UPDATE jobs SET status = ?, progress = 1, result = ?, error = NULL,
+                    message = COALESCE(?, message), finished_at = CURRENT_TIMESTAMP,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                """, (SUCCEEDED, json.dumps(result), (self._live.get(job_id) or (None, None))[1], job_id))
+                logger.info("Job %s (%s) finished in %.2fs", job_id, job['kind'], time.perf_counter() - started)
+        finally:
+            self._running.discard(job_id)
+            self._live.pop(job_id, None)
+            if retry_in is not None:
+                self._schedule_retry(job_id, retry_in)
+            else:
+                done = self._done.pop(job_id, None)
+                if done is not None:
+                    done.set()
+
+    def _schedule_retry(self, job_id, delay):
+        def resubmit():
+            self._timers.discard(timer)
+            if not self._stopping.is_set():
+                self._get_executor().submit(self._run, job_id)
+
+        timer = threading.Timer(delay, resubmit)
+        timer.daemon = True
+        self._timers.add(timer)
+        timer.start()
+
+    def recover(self):
+        """Requeue jobs whose process died and resume queued ones once their backoff is over"""
+        stale_after = f'-{STALE_AFTER_SECONDS} seconds'
+        with database.get_pool().connection() as conn:
+            stale = conn.execute("""
+            SELECT id, worker FROM jobs WHERE status = ? AND updated_at < datetime('now', ?)
+            """, (RUNNING, stale_after)).fetchall()
+            dead = [job_id for job_id, worker in stale if not self._worker_alive(job_id, worker)]
+            if dead:
+                conn.execute(f"""
+                UPDATE jobs SET status = ?, run_after = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE status = ? AND updated_at < datetime('now', ?) AND id IN ({', '.join('?' * len(dead))})
+                """, (QUEUED, RUNNING, stale_after, *dead))
+            queued = [row[0] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,))]
+        for job_id in queued:
+            self._done.setdefault(job_id, threading.Event())
+            self._get_executor().submit(self._run, job_id)
+        return queued
+
+    def _worker_alive(self, job_id, worker):
+        """Whether the process that claimed a job still runs; unknown (another host) counts as dead"""
+        host, _, pid = (worker or '').rpartition(':')
+        if host != socket.gethostname() or not pid.isdigit():
+            return False
+        pid = int(pid)
+        if pid == os.getpid():
+            return job_id in self._running
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def start_scheduler(self, nightly_at=None):
+        """Queue the nightly job every day at nightly_at (HH:MM local time)"""
+        nightly_at = self.nightly_at if nightly_at is None else nightly_at
+        try:
+            import schedule
+        except ImportError:
+            logger.warning("schedule is not installed; nightly jobs are disabled")
+            return None
+        if self._scheduler is not None or not nightly_at or NIGHTLY_KIND not in self.handlers:
+            return self._scheduler
+
+        scheduler = schedule.Scheduler()
+        scheduler.every().day.at(nightly_at).do(
+            lambda: self.submit(NIGHTLY_KIND, idempotency_key=f"{NIGHTLY_KIND}-{date.today().isoformat()}"))
+
+        def loop():
+            while not self._stopping.wait(SCHEDULER_POLL_SECONDS):
+                try:
+                    scheduler.run_pending()
+                except Exception:
+                    logger.exception("Scheduled job submission failed")
+
+        self._scheduler = threading.Thread(target=loop, name='job-scheduler', daemon=True)
+        self._scheduler.start()
+        return self._scheduler
+
+    def shutdown(self, wait=True):
+        self._stopping.set()
+        for timer in list(self._timers):
+            timer.cancel()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_runner = None
+
+
+def configure(workers=DEFAULT_WORKERS, max_attempts=DEFAULT_MAX_ATTEMPTS, retry_delay=DEFAULT_RETRY_DELAY_SECONDS):
+    """Create (or replace) the process-wide job runner"""
+    global _runner
+    handlers = _runner.handlers if _runner is not None else {}
+    if _runner is not None:
+        _runner.shutdown(wait=False)
+    _runner = JobRunner(workers, max_attempts, retry_delay)
+    _runner.handlers.update(handlers)
+    return _runner
+
+
+def get_runner():
+    if _runner is None:
+        return configure()
+    return _runner
+
+
+def register(kind):
+    """Decorator registering a job handler on the shared runner"""
+    def decorator(handler):
+        return get_runner().register(kind, handler)
+    return decorator
+
+
+def init_app(app):
+    """Configure the shared runner from JOBS_* settings"""
+    app.config.setdefault('JOBS_WORKERS', int(os.environ.get('TRANSPORT_JOB_WORKERS', DEFAULT_WORKERS)))
+    app.config.setdefault('JOBS_MAX_ATTEMPTS', int(os.environ.get('TRANSPORT_JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)))
+    app.config.setdefault('JOBS_RETRY_DELAY_SECONDS', DEFAULT_RETRY_DELAY_SECONDS)
+    app.config.setdefault('JOBS_NIGHTLY_AT', os.environ.get('TRANSPORT_NIGHTLY_AT', DEFAULT_NIGHTLY_AT))
+    runner = configure(app.config['JOBS_WORKERS'], app.config['JOBS_MAX_ATTEMPTS'],
+                       app.config['JOBS_RETRY_DELAY_SECONDS'])
+    runner.app = app
+    runner.nightly_at = app.config['JOBS_NIGHTLY_AT']
+    return runner
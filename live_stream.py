@@ -0,0 +1,167 @@
+"""
+Server-Sent Events broadcast for live dashboard updates.
+
+One producer thread computes the live state once per tick and fans out only
+what changed to every subscriber, so the work scales with ticks rather than
+with open tabs. New subscribers first receive a full snapshot.
+
+Each open stream holds a server thread for as long as the tab stays open,
+so a broadcaster can cap its subscribers; past the cap subscribe() raises
+Full and the client polls /api/live-updates instead.
+"""
+
+import json
+import queue
+import threading
+import time
+
+DEFAULT_TICK_SECONDS = 15
+KEEPALIVE_SECONDS = 20
+SUBSCRIBER_QUEUE_SIZE = 64
+
+
+class Full(Exception):
+    """The broadcaster already has max_subscribers streams open"""
+
+
+def diff_state(old, new):
+    """Return the keys of new that differ from old, recursing into dicts; removed keys map to None"""
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new
+    delta = {}
+    for key, value in new.items():
+        if key not in old:
+            delta[key] = value
+        elif old[key] != value:
+            delta[key] = diff_state(old[key], value)
+    for key in old:
+        if key not in new:
+            delta[key] = None
+    return delta
+
+
+def format_sse(event, data, event_id=None):
+    """Encode one SSE message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """A subscriber's bounded message queue"""
+
+    def __init__(self):
+        self.messages = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.closed = False
+
+    def push(self, message):
+        try:
+            self.messages.put_nowait(message)
+        except queue.Full:
+            # Too slow to keep up: drop it and let the browser reconnect for a fresh snapshot
+            self.closed = True
+
+
+class LiveBroadcaster:
+    """Computes live state once per tick and fans deltas out to subscribers"""
+
+    def __init__(self, producer, tick_seconds=DEFAULT_TICK_SECONDS, max_subscribers=None):
+        self.producer = producer
+        self.tick_seconds = tick_seconds
+        # None or 0: unlimited
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        # Serializes producer calls, which do I/O, without blocking readers of the state
+        self._produce_lock = threading.Lock()
+        self._subscribers = set()
+        self._state = None
+        self._state_time = 0.0
+        self._sequence = 0
+        self._thread = None
+        self.ticks = 0
+
+    def _stale(self):
+        return self._state is None or time.monotonic() - self._state_time >= self.tick_seconds
+
+    def current(self):
+        """Latest state, recomputed at most once per tick (also serves polling clients)"""
+        if self._stale():
+            with self._produce_lock:
+                if self._stale():
+                    self._advance()
+        return self._state
+
+    def _advance(self):
+        """
+        Compute a new state and push its delta to every subscriber, so no
+        advance is ever skipped by a stream. Caller holds the produce lock.
+        """
+        new_state = self.producer()
+        with self._lock:
+            delta = diff_state(self._state, new_state) if self._state is not None else new_state
+            self._state = new_state
+            self._state_time = time.monotonic()
+            self._sequence += 1
+            self.ticks += 1
+            if not delta:
+                return
+            message = format_sse('delta', delta, self._sequence)
+            for subscription in list(self._subscribers):
+                subscription.push(message)
+                if subscription.closed:
+                    self._subscribers.discard(subscription)
+
+    def subscribe(self):
+        """Register a subscriber and queue a full snapshot for it; raises Full at max_subscribers"""
+        if self._at_capacity():
+            raise Full(self.max_subscribers)
+        subscription = Subscription()
+        self.current()
+        with self._lock:
+            if self._at_capacity():
+                raise Full(self.max_subscribers)
+            # Snapshot and registration under one lock: every later delta applies to this snapshot
+            subscription.push(format_sse('snapshot', self._state, self._sequence))
+            self._subscribers.add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='live-broadcaster', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+        subscription.closed = True
+
+    def _at_capacity(self):
+        return bool(self.max_subscribers) and len(self._subscribers) >= self.max_subscribers
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _run(self):
+        """Producer loop; exits once the last subscriber leaves"""
+        while True:
+            time.sleep(self.tick_seconds)
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            with self._produce_lock:
+                self._advance()
+
+    def stream(self, subscription):
+        """Generator of SSE text for one subscriber, with keepalive comments"""
+        try:
+            yield f"retry: {self.tick_seconds * 1000}\n\n"
+            while not subscription.closed:
+                try:
+                    yield subscription.messages.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscription)
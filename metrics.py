@@ -0,0 +1,621 @@
+"""
+Request timing and SQL profiling with a Prometheus text endpoint.
+
+Every request is timed from before_request until its response (including
+any streamed body) is finished, and pooled connections are opened as
+ProfiledConnection so each statement's execute and fetch time, rows and
+operation are charged to the endpoint that ran it. Per-request totals are
+folded into per-endpoint histograms and counters once the request ends, so
+the SQL share of an endpoint is sql_seconds / request_duration_seconds.
+Statements run outside a request are labelled endpoint="background".
+
+With METRICS_SLOW_REQUEST_MS set, requests slower than that are logged as
+one JSON line listing their statements in order.
+
+Rows read by iterating a cursor are only timed and counted with
+METRICS_PROFILE_ROWS, since that runs Python for every row; fetchone,
+fetchmany and fetchall are always profiled. With METRICS_DIR set (serve.py
+sets it for gunicorn), each process writes its totals to a file there every
+few seconds and /metrics sums every process's file, so a scrape served by
+any worker sees the same monotonic counters. When a worker exits, the
+gunicorn master folds its file into RETIRED_FILE and deletes it, so totals
+keep counting what exited workers served while a scrape only reads one
+file per live worker plus that aggregate.
+"""
+
+import glob
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache
+from sqlite3 import Connection, Cursor
+
+from flask import g, request
+
+import database
+
+try:
+    import fcntl
+except ImportError:  # Windows runs a single server process
+    fcntl = None
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TASK_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+BACKGROUND = 'background'
+UNMATCHED = 'unmatched'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+SLOW_REQUEST_LOGGER = 'transport.slow_requests'
+MAX_LOGGED_STATEMENTS = 200
+MAX_LOGGED_SQL_CHARS = 500
+
+METRICS_DIR_ENV = 'TRANSPORT_METRICS_DIR'
+# Summed totals of exited processes in METRICS_DIR
+RETIRED_FILE = 'retired.json'
+FLUSH_SECONDS = 5
+
+_whitespace = re.compile(r'\s+')
+_local = threading.local()
+
+
+@lru_cache(maxsize=1024)
+def statement_operation(sql):
+    """Leading keyword of a statement (SELECT, INSERT, BEGIN, ...)"""
+    words = sql.split(None, 1)
+    return words[0].upper() if words else 'EMPTY'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic totals keyed by a tuple of label values"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dump(self):
+        return [[list(labels), value] for labels, value in self.values.items()]
+
+    def merge(self, dumped):
+        for labels, value in dumped:
+            self.inc(tuple(labels), value)
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{_label_text(self.labels, labels)} {_number(value)}"
+
+
+class Histogram:
+    """Fixed-bucket histogram keyed by a tuple of label values"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, labels, value):
+        series = self.values.get(labels)
+        if series is None:
+            # one slot per bucket plus +Inf, then sum
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def dump(self):
+        return [[list(labels), series] for labels, series in self.values.items()]
+
+    def merge(self, dumped):
+        for labels, series in dumped:
+            mine = self.values.setdefault(tuple(labels), [0] * (len(self.buckets) + 1) + [0.0])
+            for i, value in enumerate(series):
+                mine[i] += value
+
+    def samples(self):
+        for labels, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                extra = f'le="{bound}"'
+                yield f"{self.name}_bucket{_label_text(self.labels, labels, extra)} {cumulative}"
+            label_text = _label_text(self.labels, labels)
+            yield f"{self.name}_sum{label_text} {_number(series[-1])}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+class Statement:
+    """Time and rows for one execute() plus the fetches that followed it"""
+
+    __slots__ = ('sql', 'operation', 'seconds', 'rows')
+
+    def __init__(self, sql, operation):
+        self.sql = sql
+        self.operation = operation
+        self.seconds = 0.0
+        self.rows = 0
+
+
+class RequestProfile:
+    """Statements run by one request, or by one thread outside any request"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.statements = []
+        self.status = None
+        self.response_size = None
+        self.streamed = False
+
+    def add(self, sql):
+        if self.endpoint == BACKGROUND and self.statements:
+            # No request end to wait for; fold in what earlier statements did
+            get_metrics().record_sql(self.endpoint, self.statements)
+            self.statements = []
+        statement = Statement(sql, statement_operation(sql))
+        self.statements.append(statement)
+        return statement
+
+    def sql_seconds(self):
+        return sum(statement.seconds for statement in self.statements)
+
+
+def current_profile():
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        profile = _local.profile = RequestProfile(BACKGROUND)
+    return profile
+
+
+class ProfiledCursor(Cursor):
+    """Cursor that charges execute and fetch time to the current profile; iteration is not profiled"""
+
+    _statement = None
+
+    def _start(self, sql):
+        self._statement = current_profile().add(sql)
+        return self._statement
+
+    def _finish(self, statement, started):
+        statement.seconds += time.perf_counter() - started
+        if self.rowcount > 0:
+            statement.rows += self.rowcount
+
+    def execute(self, sql, parameters=()):
+        statement = self._start(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._finish(statement, started)
+
+    def executemany(self, sql, seq_of_parameters):
+        statement = self._start(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._finish(statement, started)
+
+    def executescript(self, sql_script):
+        statement = self._start(sql_script)
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            statement.seconds += time.perf_counter() - started
+
+    def _fetched(self, started, rows):
+        statement = self._statement
+        if statement is not None:
+            statement.seconds += time.perf_counter() - started
+            statement.rows += rows
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+
+class RowProfiledCursor(ProfiledCursor):
+    """ProfiledCursor that also times every row read by iterating it (METRICS_PROFILE_ROWS)"""
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0)
+            raise
+        self._fetched(started, 1)
+        return row
+
+
+class ProfiledConnection(Connection):
+    """Connection whose execute shortcuts and commits are profiled too"""
+
+    cursor_class = ProfiledCursor
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or self.cursor_class)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def _timed(self, operation, method):
+        statement = current_profile().add(operation)
+        started = time.perf_counter()
+        try:
+            method()
+        finally:
+            statement.seconds += time.perf_counter() - started
+
+    def commit(self):
+        self._timed('COMMIT', super().commit)
+
+    def rollback(self):
+        self._timed('ROLLBACK', super().rollback)
+
+
+class RowProfiledConnection(ProfiledConnection):
+    cursor_class = RowProfiledCursor
+
+
+class Metrics:
+    """Process-wide request and SQL metrics plus the slow-request log"""
+
+    def __init__(self, slow_request_ms=None, latency_buckets=LATENCY_BUCKETS, size_buckets=SIZE_BUCKETS,
+                 shared_dir=None):
+        self.slow_request_ms = slow_request_ms
+        self.shared_dir = shared_dir
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._flusher = None
+        self.requests = Counter(
+            'transport_http_requests_total', 'Requests by endpoint, method and status',
+            ('endpoint', 'method', 'status'))
+        self.duration = Histogram(
+            'transport_http_request_duration_seconds', 'Time from request start until the response is finished',
+            ('endpoint', 'method'), latency_buckets)
+        self.request_sql = Histogram(
+            'transport_http_request_sql_seconds', 'SQL time spent by each request',
+            ('endpoint', 'method'), latency_buckets)
+        self.response_size = Histogram(
+            'transport_http_response_size_bytes', 'Response body size as sent (after compression)',
+            ('endpoint',), size_buckets)
+        self.request_size = Histogram(
+            'transport_http_request_size_bytes', 'Request body size for requests that have one',
+            ('endpoint',), size_buckets)
+        self.slow_requests = Counter(
+            'transport_http_slow_requests_total', 'Requests over METRICS_SLOW_REQUEST_MS',
+            ('endpoint',))
+        self.sql_statements = Counter(
+            'transport_sql_statements_total', 'SQL statements executed',
+            ('endpoint', 'operation'))
+        self.sql_seconds = Counter(
+            'transport_sql_seconds_total', 'Time spent executing statements and fetching their rows',
+            ('endpoint', 'operation'))
+        self.sql_rows = Counter(
+            'transport_sql_rows_total', 'Rows fetched by queries or changed by writes',
+            ('endpoint', 'operation'))
+        self.task_duration = Histogram(
+            'transport_task_duration_seconds', 'Duration of background jobs and other profiled work',
+            ('task',), TASK_BUCKETS)
+        self.task_sql = Histogram(
+            'transport_task_sql_seconds', 'SQL time spent by background jobs and other profiled work',
+            ('task',), TASK_BUCKETS)
+        self.families = (self.requests, self.duration, self.request_sql, self.response_size,
+                         self.request_size, self.slow_requests, self.sql_statements, self.sql_seconds,
+                         self.sql_rows, self.task_duration, self.task_sql)
+
+    def _own_process(self):
+        """After a fork, drop the totals copied from the parent"""
+        if os.getpid() == self._pid:
+            return
+        with self._lock:
+            if os.getpid() != self._pid:
+                for family in self.families:
+                    family.values = {}
+                self._pid = os.getpid()
+                self._flusher = None
+
+    def start_flushing(self):
+        """Flush to METRICS_DIR every FLUSH_SECONDS from a thread; call once per worker after forking"""
+        self._own_process()
+        if self.shared_dir is not None and self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_SECONDS)
+            self.flush()
+
+    def flush(self):
+        """Write this process's totals to METRICS_DIR, atomically, so /metrics can sum them"""
+        if self.shared_dir is None or self._pid != os.getpid():
+            return
+        with self._lock:
+            dumped = self.dump()
+        try:
+            os.makedirs(self.shared_dir, exist_ok=True)
+            _write_json(self.shared_dir, f'metrics-{self._pid}.json', dumped)
+        except OSError:
+            logging.getLogger(__name__).exception("Could not write metrics to %s", self.shared_dir)
+
+    def dump(self):
+        return {family.name: family.dump() for family in self.families}
+
+    def merge(self, dumped):
+        families = {family.name: family for family in self.families}
+        for name, values in dumped.items():
+            if name in families:
+                families[name].merge(values)
+
+    def record_sql(self, endpoint, statements):
+        self._own_process()
+        with self._lock:
+            for statement in statements:
+                key = (endpoint, statement.operation)
+                self.sql_statements.inc(key)
+                self.sql_seconds.inc(key, statement.seconds)
+                self.sql_rows.inc(key, statement.rows)
+
+    def record_request(self, profile, method, path, request_size=None):
+        self._own_process()
+        elapsed = time.perf_counter() - profile.started
+        sql_seconds = profile.sql_seconds()
+        labels = (profile.endpoint, method)
+        slow = self.slow_request_ms is not None and elapsed * 1000 >= self.slow_request_ms
+        with self._lock:
+            self.requests.inc((profile.endpoint, method, str(profile.status)))
+            # An event stream stays open for as long as the client listens
+            if not profile.streamed:
+                self.duration.observe(labels, elapsed)
+                self.request_sql.observe(labels, sql_seconds)
+            if profile.response_size is not None:
+                self.response_size.observe((profile.endpoint,), profile.response_size)
+            if request_size:
+                self.request_size.observe((profile.endpoint,), request_size)
+            if slow:
+                self.slow_requests.inc((profile.endpoint,))
+        self.record_sql(profile.endpoint, profile.statements)
+        if slow:
+            self.log_slow_request(profile, method, path, elapsed, sql_seconds)
+
+    def record_task(self, profile):
+        self._own_process()
+        elapsed = time.perf_counter() - profile.started
+        with self._lock:
+            self.task_duration.observe((profile.endpoint,), elapsed)
+            self.task_sql.observe((profile.endpoint,), profile.sql_seconds())
+        self.record_sql(profile.endpoint, profile.statements)
+
+    def log_slow_request(self, profile, method, path, elapsed, sql_seconds):
+        statements = [{
+            'sql': _whitespace.sub(' ', statement.sql).strip()[:MAX_LOGGED_SQL_CHARS],
+            'ms': round(statement.seconds * 1000, 3),
+            'rows': statement.rows,
+        } for statement in profile.statements[:MAX_LOGGED_STATEMENTS]]
+        logging.getLogger(SLOW_REQUEST_LOGGER).warning(json.dumps({
+            'method': method,
+            'path': path,
+            'endpoint': profile.endpoint,
+            'status': profile.status,
+            'duration_ms': round(elapsed * 1000, 3),
+            'sql_ms': round(sql_seconds * 1000, 3),
+            'python_ms': round((elapsed - sql_seconds) * 1000, 3),
+            'statement_count': len(profile.statements),
+            'statements': statements,
+        }))
+
+    def render(self):
+        """Prometheus text exposition of every metric family, summed over every process in METRICS_DIR"""
+        if self.shared_dir is not None:
+            self._own_process()
+            self.flush()
+            return self._combined().render()
+        lines = []
+        with self._lock:
+            for family in self.families:
+                lines.append(f"# HELP {family.name} {family.help_text}")
+                lines.append(f"# TYPE {family.name} {family.kind}")
+                lines.extend(family.samples())
+        return '\n'.join(lines) + '\n'
+
+    def _combined(self):
+        """A local Metrics holding the sum of every live process's last flush and RETIRED_FILE"""
+        combined = Metrics()
+        # Shared lock: a worker being retired is counted exactly once, in its file or in RETIRED_FILE
+        with _shared_dir_lock(self.shared_dir, exclusive=False):
+            paths = glob.glob(os.path.join(self.shared_dir, 'metrics-*.json'))
+            for path in paths + [os.path.join(self.shared_dir, RETIRED_FILE)]:
+                combined.merge(_read_json(path))
+        return combined
+
+
+def _read_json(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(directory, name, data):
+    """Replace directory/name atomically so readers never see a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as handle:
+        json.dump(data, handle)
+    os.replace(tmp_path, os.path.join(directory, name))
+
+
+@contextmanager
+def _shared_dir_lock(path, exclusive):
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, '.lock'), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+_metrics = None
+
+
+def configure(slow_request_ms=None, slow_log_path=None, shared_dir=None):
+    """Create (or replace) the process-wide metrics"""
+    global _metrics
+    if slow_log_path:
+        logger = logging.getLogger(SLOW_REQUEST_LOGGER)
+        if not any(getattr(handler, 'baseFilename', None) == os.path.abspath(slow_log_path)
+                   for handler in logger.handlers):
+            logger.addHandler(logging.FileHandler(slow_log_path))
+    _metrics = Metrics(slow_request_ms, shared_dir=shared_dir)
+    return _metrics
+
+
+def get_metrics():
+    if _metrics is None:
+        return configure()
+    return _metrics
+
+
+def render():
+    return get_metrics().render()
+
+
+def start_flushing():
+    get_metrics().start_flushing()
+
+
+def flush():
+    """Write this process's totals to METRICS_DIR now (on worker exit)"""
+    if _metrics is not None:
+        _metrics.flush()
+
+
+def retire_process(path, pid):
+    """
+    Fold the last flushed totals of exited process pid into RETIRED_FILE and
+    delete its file (the gunicorn master calls this as each worker exits).
+    Returns False if the process left no file.
+    """
+    own_path = os.path.join(path, f'metrics-{pid}.json')
+    with _shared_dir_lock(path, exclusive=True):
+        if not os.path.exists(own_path):
+            return False
+        retired = Metrics()
+        retired.merge(_read_json(os.path.join(path, RETIRED_FILE)))
+        retired.merge(_read_json(own_path))
+        _write_json(path, RETIRED_FILE, retired.dump())
+        os.remove(own_path)
+    return True
+
+
+def clear_shared_dir(path):
+    """Remove the previous run's files and aggregate; call before starting workers"""
+    for pattern in ('metrics-*.json', '*.tmp', RETIRED_FILE):
+        for stale in glob.glob(os.path.join(path, pattern)):
+            os.remove(stale)
+
+
+@contextmanager
+def profiled(task):
+    """Charge SQL run by this thread inside the block to task instead of background"""
+    previous = getattr(_local, 'profile', None)
+    profile = _local.profile = RequestProfile(task)
+    try:
+        yield profile
+    finally:
+        _local.profile = previous
+        get_metrics().record_task(profile)
+
+
+def init_app(app):
+    """Profile pooled connections and time requests using METRICS_* settings"""
+    slow_ms = os.environ.get('TRANSPORT_SLOW_REQUEST_MS')
+    app.config.setdefault('METRICS_SLOW_REQUEST_MS', float(slow_ms) if slow_ms else None)
+    app.config.setdefault('METRICS_SLOW_REQUEST_LOG', os.environ.get('TRANSPORT_SLOW_REQUEST_LOG'))
+    app.config.setdefault('METRICS_PROFILE_ROWS', os.environ.get('TRANSPORT_METRICS_PROFILE_ROWS') == '1')
+    app.config.setdefault('METRICS_DIR', os.environ.get(METRICS_DIR_ENV))
+    configure(app.config['METRICS_SLOW_REQUEST_MS'], app.config['METRICS_SLOW_REQUEST_LOG'],
+              app.config['METRICS_DIR'])
+    database.set_connection_factory(RowProfiledConnection if app.config['METRICS_PROFILE_ROWS']
+                                    else ProfiledConnection)
+
+    @app.before_request
+    def start_request_profile():
+        g.metrics_profile = _local.profile = RequestProfile(request.endpoint or UNMATCHED)
+
+    # Registered before other after_request hooks so it runs last and sees the final body
+    @app.after_request
+    def note_response(response):
+        profile = g.get('metrics_profile')
+        if profile is not None:
+            profile.status = response.status_code
+            profile.streamed = response.mimetype == 'text/event-stream'
+            if not response.is_streamed:
+                profile.response_size = response.calculate_content_length()
+        return response
+
+    @app.teardown_request
+    def finish_request_profile(exc=None):
+        profile = g.pop('metrics_profile', None)
+        _local.profile = None
+        if profile is not None:
+            if profile.status is None:
+                profile.status = 500
+            get_metrics().record_request(profile, request.method, request.path, request.content_length)
@@ -0,0 +1,488 @@
+"""
+Schema migrations for the Transport Optimizer database.
+
+Each migration runs once, in order, and bumps PRAGMA user_version so that
+existing databases are upgraded in place on startup.
+"""
+
+from database import get_pool, transaction
+from retention import rebuild_view
+from seed_data import DEFAULT_EVENTS, DEMO_BASE_PROFILES, DEMO_MARKET_DAYS
+
+
+def _dedupe(cursor, table, key_columns):
+    """Keep only the newest row for each key so a unique index can be built"""
+    keys = ', '.join(key_columns)
+    cursor.execute(f"""
+    DELETE FROM {table}
+    WHERE id NOT IN (SELECT MAX(id) FROM {table} GROUP BY {keys})
+    """)
+
+
+def _demand_indexes(cursor):
+    """Unique keys and covering indexes for demand and prediction tables"""
+    _dedupe(cursor, 'passenger_demand', ('route_id', 'date_recorded', 'hour'))
+    _dedupe(cursor, 'daily_schedule_predictions', ('route_id', 'prediction_date', 'hour'))
+
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_passenger_demand_route_date_hour
+    ON passenger_demand (route_id, date_recorded, hour)
+    """)
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_predictions_route_date_hour
+    ON daily_schedule_predictions (route_id, prediction_date, hour)
+    """)
+
+    # Covers the dashboard's "passengers so far today" query without touching the table
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS ix_passenger_demand_date_hour_count
+    ON passenger_demand (date_recorded, hour, passenger_count)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS ix_predictions_date_route
+    ON daily_schedule_predictions (prediction_date, route_id, hour, recommended_buses, cost_per_hour)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS ix_notifications_created_at
+    ON notifications (created_at)
+    """)
+
+
+def _route_registry_tables(cursor):
+    """Route base profiles, market-day calendars and a change counter"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS route_base_profiles (
+        route_id TEXT NOT NULL,
+        hour INTEGER NOT NULL CHECK (hour >= 0 AND hour <= 23),
+        base_demand INTEGER NOT NULL CHECK (base_demand >= 0),
+        PRIMARY KEY (route_id, hour),
+        FOREIGN KEY (route_id) REFERENCES routes (id)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS route_market_days (
+        route_id TEXT NOT NULL,
+        day_of_week INTEGER NOT NULL CHECK (day_of_week >= 0 AND day_of_week <= 6),
+        PRIMARY KEY (route_id, day_of_week),
+        FOREIGN KEY (route_id) REFERENCES routes (id)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS route_registry_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO route_registry_version (id, version) VALUES (1, 0)")
+
+    # Any change to route data bumps the version so cached registries reload
+    for table in ('routes', 'route_base_profiles', 'route_market_days'):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_registry_version
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE route_registry_version SET version = version + 1 WHERE id = 1;
+            END
+            """)
+
+    # Backfill the profiles that used to be hardcoded, for routes already present
+    existing = {row[0] for row in cursor.execute("SELECT id FROM routes").fetchall()}
+    cursor.executemany("""
+    INSERT OR IGNORE INTO route_base_profiles (route_id, hour, base_demand) VALUES (?, ?, ?)
+    """, [(route_id, hour, value)
+          for route_id, pattern in DEMO_BASE_PROFILES.items() if route_id in existing
+          for hour, value in enumerate(pattern)])
+    cursor.executemany("""
+    INSERT OR IGNORE INTO route_market_days (route_id, day_of_week) VALUES (?, ?)
+    """, [(route_id, day)
+          for route_id, days in DEMO_MARKET_DAYS.items() if route_id in existing
+          for day in days])
+
+
+def _fleet_allocation_runs(cursor):
+    """Log of fleet allocator runs with solver timing"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS fleet_allocation_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        allocation_date DATE NOT NULL,
+        route_count INTEGER NOT NULL,
+        fleet_size INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        peak_buses_required INTEGER NOT NULL,
+        bus_hours INTEGER NOT NULL,
+        unserved_passengers INTEGER NOT NULL,
+        estimated_cost REAL NOT NULL,
+        solve_ms REAL NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS ix_fleet_allocation_runs_date
+    ON fleet_allocation_runs (allocation_date, created_at)
+    """)
+
+
+def _dashboard_rollups(cursor):
+    """
+    Rollup tables kept current by triggers on every demand/prediction write.
+
+    Only INSERT and UPDATE are tracked (UPSERTs fire one or the other);
+    deleting raw rows, e.g. when pruning history, leaves the rollups intact.
+    Bulk loaders may suspend the triggers inside their own transaction and
+    refresh the affected range in one pass instead (see rollups.py).
+    """
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS demand_hourly_rollup (
+        date_recorded DATE NOT NULL,
+        hour INTEGER NOT NULL,
+        passengers INTEGER NOT NULL DEFAULT 0,
+        route_hours INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (date_recorded, hour)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS demand_route_daily_rollup (
+        route_id TEXT NOT NULL,
+        date_recorded DATE NOT NULL,
+        passengers INTEGER NOT NULL DEFAULT 0,
+        hours_recorded INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (route_id, date_recorded)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS prediction_route_daily_rollup (
+        route_id TEXT NOT NULL,
+        prediction_date DATE NOT NULL,
+        predicted_passengers INTEGER NOT NULL DEFAULT 0,
+        bus_hours INTEGER NOT NULL DEFAULT 0,
+        estimated_cost REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (route_id, prediction_date)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS fleet_rollup (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_routes INTEGER NOT NULL DEFAULT 0,
+        total_buses INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+    # passenger_demand -> hourly (all routes) and route/day rollups
+    add_demand = """
+        INSERT INTO demand_hourly_rollup (date_recorded, hour, passengers, route_hours)
+        VALUES (NEW.date_recorded, NEW.hour, NEW.passenger_count, 1)
+        ON CONFLICT (date_recorded, hour) DO UPDATE SET
+            passengers = passengers + excluded.passengers,
+            route_hours = route_hours + 1;
+        INSERT INTO demand_route_daily_rollup (route_id, date_recorded, passengers, hours_recorded)
+        VALUES (NEW.route_id, NEW.date_recorded, NEW.passenger_count, 1)
+        ON CONFLICT (route_id, date_recorded) DO UPDATE SET
+            passengers = passengers + excluded.passengers,
+            hours_recorded = hours_recorded + 1;
+    """
+    remove_old_demand = """
+        UPDATE demand_hourly_rollup
+        SET passengers = passengers - OLD.passenger_count, route_hours = route_hours - 1
+        WHERE date_recorded = OLD.date_recorded AND hour = OLD.hour;
+        UPDATE demand_route_daily_rollup
+        SET passengers = passengers - OLD.passenger_count, hours_recorded = hours_recorded - 1
+        WHERE route_id = OLD.route_id AND date_recorded = OLD.date_recorded;
+    """
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_passenger_demand_insert_rollup
+    AFTER INSERT ON passenger_demand
+    BEGIN {add_demand} END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_passenger_demand_update_rollup
+    AFTER UPDATE OF route_id, date_recorded, hour, passenger_count ON passenger_demand
+    BEGIN {remove_old_demand} {add_demand} END
+    """)
+
+    # daily_schedule_predictions -> route/day prediction rollup
+    add_prediction = """
+        INSERT INTO prediction_route_daily_rollup
+        (route_id, prediction_date, predicted_passengers, bus_hours, estimated_cost)
+        VALUES (NEW.route_id, NEW.prediction_date, NEW.predicted_passengers,
+                NEW.recommended_buses, NEW.cost_per_hour)
+        ON CONFLICT (route_id, prediction_date) DO UPDATE SET
+            predicted_passengers = predicted_passengers + excluded.predicted_passengers,
+            bus_hours = bus_hours + excluded.bus_hours,
+            estimated_cost = estimated_cost + excluded.estimated_cost;
+    """
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_predictions_insert_rollup
+    AFTER INSERT ON daily_schedule_predictions
+    BEGIN {add_prediction} END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_predictions_update_rollup
+    AFTER UPDATE OF route_id, prediction_date, predicted_passengers, recommended_buses, cost_per_hour
+    ON daily_schedule_predictions
+    BEGIN
+        UPDATE prediction_route_daily_rollup SET
+            predicted_passengers = predicted_passengers - OLD.predicted_passengers,
+            bus_hours = bus_hours - OLD.recommended_buses,
+            estimated_cost = estimated_cost - OLD.cost_per_hour
+        WHERE route_id = OLD.route_id AND prediction_date = OLD.prediction_date;
+        {add_prediction}
+    END
+    """)
+
+    # routes -> fleet totals (the routes table is small, so recount on change)
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_routes_{event.lower()}_fleet_rollup
+        AFTER {event} ON routes
+        BEGIN
+            UPDATE fleet_rollup SET
+                total_routes = (SELECT COUNT(*) FROM routes),
+                total_buses = (SELECT COALESCE(SUM(current_buses), 0) FROM routes)
+            WHERE id = 1;
+        END
+        """)
+
+    # Backfill from existing rows
+    cursor.execute("""
+    INSERT OR REPLACE INTO demand_hourly_rollup (date_recorded, hour, passengers, route_hours)
+    SELECT date_recorded, hour, SUM(passenger_count), COUNT(*)
+    FROM passenger_demand GROUP BY date_recorded, hour
+    """)
+    cursor.execute("""
+    INSERT OR REPLACE INTO demand_route_daily_rollup (route_id, date_recorded, passengers, hours_recorded)
+    SELECT route_id, date_recorded, SUM(passenger_count), COUNT(*)
+    FROM passenger_demand GROUP BY route_id, date_recorded
+    """)
+    cursor.execute("""
+    INSERT OR REPLACE INTO prediction_route_daily_rollup
+    (route_id, prediction_date, predicted_passengers, bus_hours, estimated_cost)
+    SELECT route_id, prediction_date, SUM(predicted_passengers), SUM(recommended_buses), SUM(cost_per_hour)
+    FROM daily_schedule_predictions GROUP BY route_id, prediction_date
+    """)
+    cursor.execute("""
+    INSERT OR REPLACE INTO fleet_rollup (id, total_routes, total_buses)
+    SELECT 1, COUNT(*), COALESCE(SUM(current_buses), 0) FROM routes
+    """)
+
+
+def _external_factor_weather(cursor):
+    """Record the weather multiplier applied on each day so demand models can learn from it"""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(external_factors)")]
+    if 'weather_factor' not in columns:
+        cursor.execute("ALTER TABLE external_factors ADD COLUMN weather_factor REAL DEFAULT 1.0")
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS ix_external_factors_date
+    ON external_factors (date_recorded)
+    """)
+
+
+def _backtest_results(cursor):
+    """Backtest summaries per model variant and error breakdown per route-hour"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS backtest_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_id TEXT NOT NULL,
+        variant TEXT NOT NULL,
+        start_date DATE NOT NULL,
+        end_date DATE NOT NULL,
+        folds INTEGER NOT NULL,
+        route_count INTEGER NOT NULL,
+        samples INTEGER NOT NULL,
+        mape REAL,
+        rmse REAL,
+        accuracy REAL,
+        wall_seconds REAL NOT NULL,
+        peak_memory_kb REAL NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS ix_backtest_runs_variant_created
+    ON backtest_runs (variant, created_at)
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS backtest_route_hour_errors (
+        run_id TEXT NOT NULL,
+        variant TEXT NOT NULL,
+        route_id TEXT NOT NULL,
+        hour INTEGER NOT NULL,
+        samples INTEGER NOT NULL,
+        mape REAL,
+        rmse REAL,
+        PRIMARY KEY (run_id, variant, route_id, hour)
+    ) WITHOUT ROWID
+    """)
+
+
+def _background_jobs(cursor):
+    """Persistent job queue with progress, retries and idempotency keys"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+        params TEXT,
+        idempotency_key TEXT UNIQUE,
+        progress REAL NOT NULL DEFAULT 0,
+        message TEXT,
+        result TEXT,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL DEFAULT 3,
+        worker TEXT,
+        created_by TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP,
+        finished_at TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS ix_jobs_status_created
+    ON jobs (status, created_at)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS ix_jobs_kind_created
+    ON jobs (kind, created_at)
+    """)
+
+
+def _event_calendar(cursor):
+    """Festival/event calendar with multi-day events, lead/trail windows and a change counter"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        type TEXT NOT NULL DEFAULT 'custom',
+        start_date DATE NOT NULL,
+        end_date DATE NOT NULL,
+        multiplier REAL NOT NULL DEFAULT 1.0 CHECK (multiplier > 0),
+        lead_days INTEGER NOT NULL DEFAULT 0 CHECK (lead_days >= 0),
+        trail_days INTEGER NOT NULL DEFAULT 0 CHECK (trail_days >= 0),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (name, start_date),
+        CHECK (end_date >= start_date)
+    )
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS ix_events_start_end
+    ON events (start_date, end_date)
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS event_calendar_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO event_calendar_version (id, version) VALUES (1, 0)")
+
+    # Any change to events bumps the version so cached calendars reload
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_events_{event.lower()}_calendar_version
+        AFTER {event} ON events
+        BEGIN
+            UPDATE event_calendar_version SET version = version + 1 WHERE id = 1;
+        END
+        """)
+
+    # Load the calendar that used to be hardcoded in the server
+    cursor.executemany("""
+    INSERT OR IGNORE INTO events (name, type, start_date, end_date, multiplier, lead_days, trail_days)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, DEFAULT_EVENTS)
+
+
+def _external_factor_cache(cursor):
+    """One weather row per district and day, with its provider and fetch time for TTL checks"""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(external_factors)")]
+    if 'district' not in columns:
+        cursor.execute("ALTER TABLE external_factors ADD COLUMN district TEXT NOT NULL DEFAULT 'Tiruppur'")
+    if 'provider' not in columns:
+        cursor.execute("ALTER TABLE external_factors ADD COLUMN provider TEXT")
+    if 'fetched_at' not in columns:
+        cursor.execute("ALTER TABLE external_factors ADD COLUMN fetched_at TIMESTAMP")
+    # Past daily updates appended a row per run; keep the latest for each day
+    _dedupe(cursor, 'external_factors', ('district', 'date_recorded'))
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_external_factors_district_date
+    ON external_factors (district, date_recorded)
+    """)
+
+
+def _demand_retention(cursor):
+    """Monthly demand partition catalog, weekly rollups and the view over every partition"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS demand_partitions (
+        month TEXT PRIMARY KEY,
+        table_name TEXT,
+        state TEXT NOT NULL CHECK (state IN ('sealed', 'dropping', 'compacted')),
+        rows_sealed INTEGER NOT NULL DEFAULT 0,
+        sealed_through DATE,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS demand_route_weekly_rollup (
+        route_id TEXT NOT NULL,
+        week_start DATE NOT NULL,
+        passengers INTEGER NOT NULL DEFAULT 0,
+        days_recorded INTEGER NOT NULL DEFAULT 0,
+        hours_recorded INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (route_id, week_start)
+    ) WITHOUT ROWID
+    """)
+    rebuild_view(cursor)
+
+
+def _job_run_after(cursor):
+    """Earliest time a queued job may be claimed, so retry backoff holds across processes"""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(jobs)")]
+    if 'run_after' not in columns:
+        cursor.execute("ALTER TABLE jobs ADD COLUMN run_after TIMESTAMP")
+
+
+# (version, description, function) - append only, never reorder
+MIGRATIONS = [
+    (1, 'demand and prediction unique keys plus dashboard covering indexes', _demand_indexes),
+    (2, 'route base profiles, market days and registry version', _route_registry_tables),
+    (3, 'fleet allocation run log', _fleet_allocation_runs),
+    (4, 'trigger-maintained dashboard rollups', _dashboard_rollups),
+    (5, 'weather factor on external factors', _external_factor_weather),
+    (6, 'backtest results', _backtest_results),
+    (7, 'background job queue', _background_jobs),
+    (8, 'event calendar', _event_calendar),
+    (9, 'external factor cache keyed by district and day', _external_factor_cache),
+    (10, 'monthly demand partitions, weekly rollups and retention', _demand_retention),
+    (11, 'retry backoff for queued jobs', _job_run_after),
+]
+
+
+def current_version(conn):
+    """Return the schema version recorded in the database"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(cursor):
+    """Apply pending migrations using an open transaction cursor"""
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    applied = []
+    for target, description, migrate in MIGRATIONS:
+        if target <= version:
+            continue
+        migrate(cursor)
+        cursor.execute(f"PRAGMA user_version = {target}")
+        applied.append((target, description))
+    return applied
+
+
+def migrate():
+    """Bring the configured database up to the latest schema version"""
+    with get_pool().connection() as conn:
+        with transaction(conn) as cursor:
+            applied = apply_migrations(cursor)
+        if applied:
+            conn.execute("ANALYZE")
+    return applied
@@ -0,0 +1,147 @@
+"""
+Lookup-table schedule and cost optimizer.
+
+The demand -> (buses, frequency) ladder saturates at MAX_LADDER_DEMAND, so it
+is precomputed once into arrays covering the full demand range. Sizing any
+number of demand cells is then one clipped gather, and hourly cost is one
+fused multiply-add against per-demand lookup columns.
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+BUS_CAPACITY = 45
+
+# Above this demand every route-hour gets 8 buses every 10 minutes
+MAX_LADDER_DEMAND = 401
+
+# Upper demand bound of each fixed tier and the (buses, frequency) it gets
+LADDER_TIERS = (
+    (0, 0, 120),
+    (20, 1, 90),
+    (45, 1, 60),
+    (90, 2, 45),
+    (135, 2, 30),
+    (200, 3, 25),
+    (300, 4, 20),
+    (400, 5, 15),
+)
+
+
+@dataclass(frozen=True)
+class CostRates:
+    """Operating cost rates in rupees"""
+    fuel_per_km: float = 8.5
+    driver_per_hour: float = 120.0
+    maintenance_per_km: float = 3.2
+
+    @property
+    def per_km(self):
+        return self.fuel_per_km + self.maintenance_per_km
+
+    @classmethod
+    def from_env(cls):
+        """Read TRANSPORT_FUEL_PER_KM, TRANSPORT_DRIVER_PER_HOUR and TRANSPORT_MAINTENANCE_PER_KM"""
+        defaults = cls()
+        return cls(
+            fuel_per_km=float(os.environ.get('TRANSPORT_FUEL_PER_KM', defaults.fuel_per_km)),
+            driver_per_hour=float(os.environ.get('TRANSPORT_DRIVER_PER_HOUR', defaults.driver_per_hour)),
+            maintenance_per_km=float(os.environ.get('TRANSPORT_MAINTENANCE_PER_KM', defaults.maintenance_per_km)),
+        )
+
+
+def _ladder(demand):
+    """Reference schedule ladder evaluated over an array of demand values"""
+    buses = np.clip((demand + 44) // 45, 3, 8)
+    frequency = np.maximum(10, 60 // np.maximum(1, buses - 2))
+    for ceiling, tier_buses, tier_frequency in reversed(LADDER_TIERS):
+        buses = np.where(demand <= ceiling, tier_buses, buses)
+        frequency = np.where(demand <= ceiling, tier_frequency, frequency)
+    return buses, frequency
+
+
+class ScheduleTable:
+    """Precomputed demand-indexed lookup arrays for schedule and cost"""
+
+    def __init__(self, rates=None, max_demand=MAX_LADDER_DEMAND):
+        self.rates = rates or CostRates()
+        self.max_demand = max_demand
+
+        demand = np.arange(max_demand + 1, dtype=np.int64)
+        buses, frequency = _ladder(demand)
+        self.buses = buses.astype(np.int64)
+        self.frequency = frequency.astype(np.int64)
+
+        # Bus-trips per hour; cost = buses * driver + distance * per_km * trips
+        self.trips = np.where(self.buses > 0, self.buses * 60.0 / self.frequency, 0.0)
+        self.driver_cost = self.buses * self.rates.driver_per_hour
+
+    def _index(self, demand):
+        return np.clip(np.asarray(demand, dtype=np.int64), 0, self.max_demand)
+
+    def schedule(self, demand):
+        """Array of demand -> (buses, frequency)"""
+        index = self._index(demand)
+        return self.buses[index], self.frequency[index]
+
+    def cost_for_demand(self, demand, distance):
+        """Hourly cost straight from demand: one gather and one fused multiply-add"""
+        index = self._index(demand)
+        distance = _align(distance, index.ndim)
+        return self.driver_cost[index] + (distance * self.rates.per_km) * self.trips[index]
+
+    def hourly_cost(self, buses, distance, frequency):
+        """Array version of calculate_hourly_cost for arbitrary buses/frequency"""
+        buses = np.asarray(buses)
+        frequency = np.asarray(frequency, dtype=np.float64)
+        distance = _align(distance, buses.ndim)
+        trips = np.where(frequency > 0, 60.0 / np.where(frequency > 0, frequency, 1.0), 0.0) * buses
+        cost = buses * self.rates.driver_per_hour + distance * self.rates.per_km * trips
+        return np.where(buses > 0, cost, 0.0)
+
+
+def _align(distance, ndim):
+    """Reshape per-route distances so they broadcast over trailing axes"""
+    distance = np.asarray(distance, dtype=np.float64)
+    if distance.ndim == 0:
+        return distance
+    return distance.reshape(distance.shape + (1,) * (ndim - distance.ndim))
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def configure(rates=None, **rate_values):
+    """Rebuild the shared table from CostRates or keyword rate overrides"""
+    global _table
+    if rates is None:
+        rates = CostRates(**rate_values) if rate_values else CostRates.from_env()
+    with _table_lock:
+        _table = ScheduleTable(rates)
+    return _table
+
+
+def get_table():
+    """Return the shared schedule table, building it from the environment if needed"""
+    if _table is None:
+        return configure()
+    return _table
+
+
+def optimal_schedule(demand):
+    """Array-in/array-out calculate_optimal_schedule"""
+    return get_table().schedule(demand)
+
+
+def hourly_cost(buses, distance, frequency):
+    """Array-in/array-out calculate_hourly_cost using the configured rates"""
+    return get_table().hourly_cost(buses, distance, frequency)
+
+
+def cost_for_demand(demand, distance):
+    """Hourly cost of the optimal schedule for each demand cell"""
+    return get_table().cost_for_demand(demand, distance)
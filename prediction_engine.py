@@ -0,0 +1,139 @@
+"""
+Vectorized demand-prediction engine.
+
+Works on (routes x days x hours) arrays instead of walking every
+route-hour in Python: base patterns are scaled by weather, festival,
+market and noise factors, then sized into buses, frequency, cost and
+utilization in a handful of NumPy operations.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+import optimizer
+from optimizer import BUS_CAPACITY
+
+HOURS_PER_DAY = 24
+MARKET_DAY_FACTOR = 1.3
+NOISE_RANGE = (0.95, 1.05)
+
+
+@dataclass
+class PredictionBatch:
+    """Arrays shaped (routes, days, hours) produced by run_predictions"""
+    route_ids: list
+    dates: list
+    demand: np.ndarray
+    buses: np.ndarray
+    frequency: np.ndarray
+    cost: np.ndarray
+    utilization: np.ndarray
+
+    @property
+    def total_buses(self):
+        return int(self.buses.sum())
+
+    @property
+    def total_cost(self):
+        return float(self.cost.sum())
+
+    def rows(self):
+        """Yield daily_schedule_predictions rows in (route, date, hour) order"""
+        hours = list(range(self.demand.shape[2]))
+        columns = [self.demand.tolist(), self.buses.tolist(), self.frequency.tolist(),
+                   self.cost.tolist(), self.utilization.tolist()]
+        for r, route_id in enumerate(self.route_ids):
+            for d, day in enumerate(self.dates):
+                day_str = day.isoformat()
+                cells = [column[r][d] for column in columns]
+                for hour, values in zip(hours, zip(*cells)):
+                    yield (route_id, day_str, hour) + values
+
+
+def market_factor_matrix(route_ids, dates, market_days, factor=MARKET_DAY_FACTOR):
+    """Build a (routes, days) market multiplier from per-route weekday lists"""
+    weekdays = np.array([day.weekday() for day in dates])
+    mask = np.zeros((len(route_ids), 7), dtype=bool)
+    for r, route_id in enumerate(route_ids):
+        mask[r, market_days.get(route_id, [])] = True
+    return np.where(mask[:, weekdays], factor, 1.0)
+
+
+def predict_demand(base_patterns, weather_factor=1.0, festival_factor=1.0,
+                   market_factor=1.0, noise=None):
+    """
+    Scale base patterns into integer demand.
+
+    base_patterns is (routes, hours) or (routes, days, hours). Weather and
+    festival factors are per-day (days,) arrays or scalars, the market factor
+    is (routes, days) or scalar, and noise broadcasts to the output shape.
+    Each factor is applied with int() truncation in the same order as the
+    original per-hour loop, so results match it exactly for the same noise.
+    """
+    base = np.asarray(base_patterns, dtype=np.float64)
+    if base.ndim == 2:
+        base = base[:, np.newaxis, :]
+
+    weather = np.asarray(weather_factor, dtype=np.float64)
+    festival = np.asarray(festival_factor, dtype=np.float64)
+    market = np.asarray(market_factor, dtype=np.float64)
+
+    # Per-day factors broadcast along routes and hours, per-route-day along hours
+    if weather.ndim == 1:
+        weather = weather[np.newaxis, :, np.newaxis]
+    if festival.ndim == 1:
+        festival = festival[np.newaxis, :, np.newaxis]
+    if market.ndim == 2:
+        market = market[:, :, np.newaxis]
+
+    demand = np.floor(base * weather)
+    demand = np.floor(demand * festival)
+    demand = np.floor(demand * market)
+    if noise is not None:
+        demand = np.floor(demand * noise)
+    return np.maximum(demand, 0).astype(np.int64)
+
+
+def utilization_rate(demand, buses, capacity=BUS_CAPACITY):
+    """Share of offered seats taken, capped at 1.0 and 0 when no bus runs"""
+    seats = buses * capacity
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(seats > 0, demand / np.maximum(seats, 1), 0.0)
+    return np.minimum(rate, 1.0)
+
+
+def run_predictions(route_ids, dates, base_patterns, distances, weather_factor=1.0,
+                    festival_factor=1.0, market_factor=1.0, rng=None, noise_range=NOISE_RANGE,
+                    model_demand=None):
+    """
+    Predict demand and size the schedule for every route, day and hour at once.
+
+    model_demand, if given, is a (routes, days, hours) array from a trained
+    demand model; its non-NaN cells replace the rule-based estimate.
+    """
+    base = np.asarray(base_patterns, dtype=np.float64)
+    shape = (len(route_ids), len(dates), base.shape[-1])
+
+    noise = None
+    if noise_range is not None:
+        rng = rng or np.random.default_rng()
+        noise = rng.uniform(noise_range[0], noise_range[1], size=shape)
+
+    demand = predict_demand(base, weather_factor, festival_factor, market_factor, noise)
+    if model_demand is not None:
+        model_demand = np.asarray(model_demand, dtype=np.float64).reshape(shape)
+        demand = np.where(np.isnan(model_demand), demand, model_demand).astype(np.int64)
+    buses, frequency = optimizer.optimal_schedule(demand)
+    cost = optimizer.cost_for_demand(demand, distances)
+    utilization = utilization_rate(demand, buses)
+
+    return PredictionBatch(
+        route_ids=list(route_ids),
+        dates=list(dates),
+        demand=demand,
+        buses=buses,
+        frequency=frequency,
+        cost=cost,
+        utilization=utilization,
+    )
@@ -0,0 +1,270 @@
+"""
+Response cache for read-mostly endpoints.
+
+Serialized JSON responses are kept per namespace (one per endpoint) with a
+TTL and LRU eviction. The default backend lives in process memory; pointing
+RESPONSE_CACHE_DIR (TRANSPORT_CACHE_DIR) at a directory switches to a
+file-backed store that every worker process shares, so one worker's miss
+fills the cache for the others and invalidations reach all of them. Writers
+fire named events such as 'routes_changed', which drop the namespaces
+registered for them.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import date
+from functools import wraps
+
+from flask import Response, current_app, request
+
+DEFAULT_MAX_ENTRIES = 512
+
+# Seconds each endpoint's response stays fresh unless RESPONSE_CACHE_TTLS overrides it
+DEFAULT_TTLS = {
+    'routes': 300,
+    'dashboard': 30,
+    'events': 3600,
+    'news': 600,
+}
+
+# Writer events and the namespaces they make stale
+INVALIDATION_EVENTS = {
+    'routes_changed': ('routes', 'dashboard'),
+    'predictions_updated': ('dashboard',),
+    'demand_loaded': ('routes', 'dashboard'),
+    'events_changed': ('events',),
+}
+
+
+class MemoryBackend:
+    """Per-process LRU store of (expires_at, entry) keyed by (namespace, key)"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, namespace, key):
+        with self._lock:
+            item = self._entries.get((namespace, key))
+            if item is None:
+                return None
+            if item[0] <= time.time():
+                del self._entries[(namespace, key)]
+                return None
+            self._entries.move_to_end((namespace, key))
+            return item[1]
+
+    def set(self, namespace, key, entry, ttl):
+        with self._lock:
+            self._entries[(namespace, key)] = (time.time() + ttl, entry)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, namespace):
+        with self._lock:
+            for cache_key in [k for k in self._entries if k[0] == namespace]:
+                del self._entries[cache_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileBackend:
+    """Directory of JSON entry files shared by every worker process"""
+
+    def __init__(self, directory, max_entries=DEFAULT_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, namespace, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, f"{namespace}-{digest}.json")
+
+    def get(self, namespace, key):
+        path = self._path(namespace, key)
+        try:
+            with open(path) as f:
+                item = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if item['expires_at'] <= time.time():
+            self._remove(path)
+            return None
+        # Touch so the LRU sweep sees recent use
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return item['entry']
+
+    def set(self, namespace, key, entry, ttl):
+        # Write to a temp file and rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'expires_at': time.time() + ttl, 'entry': entry}, f)
+        os.replace(tmp_path, self._path(namespace, key))
+        self._evict()
+
+    def _entry_files(self):
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')]
+
+    def _evict(self):
+        files = self._entry_files()
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - self.max_entries]:
+            self._remove(entry.path)
+            self.evictions += 1
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def invalidate(self, namespace):
+        for entry in self._entry_files():
+            if entry.name.startswith(namespace + '-'):
+                self._remove(entry.path)
+
+    def clear(self):
+        for entry in self._entry_files():
+            self._remove(entry.path)
+
+    def __len__(self):
+        return len(self._entry_files())
+
+
+class ResponseCache:
+    """TTL/LRU cache front-end with per-namespace hit and miss counters"""
+
+    def __init__(self, backend=None, ttls=None, events=None):
+        self.backend = MemoryBackend() if backend is None else backend
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.events = {name: set(namespaces) for name, namespaces in (events or INVALIDATION_EVENTS).items()}
+        self._counters = defaultdict(lambda: {'hits': 0, 'misses': 0, 'invalidations': 0})
+        self._lock = threading.Lock()
+
+    def _count(self, namespace, counter):
+        with self._lock:
+            self._counters[namespace][counter] += 1
+
+    def get(self, namespace, key):
+        entry = self.backend.get(namespace, key)
+        self._count(namespace, 'hits' if entry is not None else 'misses')
+        return entry
+
+    def set(self, namespace, key, entry, ttl=None):
+        ttl = self.ttls.get(namespace, 60) if ttl is None else ttl
+        if ttl > 0:
+            self.backend.set(namespace, key, entry, ttl)
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            self.backend.invalidate(namespace)
+            self._count(namespace, 'invalidations')
+
+    def on(self, event, *namespaces):
+        """Register namespaces to drop when event fires"""
+        self.events.setdefault(event, set()).update(namespaces)
+
+    def fire(self, event):
+        """Drop every namespace registered for event"""
+        self.invalidate(*sorted(self.events.get(event, ())))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            namespaces = {name: dict(counts) for name, counts in self._counters.items()}
+        for counts in namespaces.values():
+            lookups = counts['hits'] + counts['misses']
+            counts['hit_rate'] = round(counts['hits'] / lookups, 3) if lookups else 0.0
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'evictions': self.backend.evictions,
+            'ttls': self.ttls,
+            'namespaces': namespaces,
+        }
+
+
+_cache = None
+
+
+def configure(directory=None, max_entries=DEFAULT_MAX_ENTRIES, ttls=None):
+    """Replace the shared cache; a directory selects the file-backed backend"""
+    global _cache
+    backend = FileBackend(directory, max_entries) if directory else MemoryBackend(max_entries)
+    _cache = ResponseCache(backend, ttls)
+    return _cache
+
+
+def get_cache():
+    """Return the shared cache, creating an in-memory one if needed"""
+    if _cache is None:
+        return configure()
+    return _cache
+
+
+def invalidate(*namespaces):
+    get_cache().invalidate(*namespaces)
+
+
+def fire(event):
+    get_cache().fire(event)
+
+
+def cached(namespace):
+    """
+    Cache a view's successful JSON response under namespace.
+
+    Entries are keyed by path, query string and the current date, since
+    several endpoints report values relative to today.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            key = f"{request.full_path}|{date.today().isoformat()}"
+            entry = cache.get(namespace, key)
+            if entry is not None:
+                return Response(entry['body'], status=entry['status'], mimetype=entry['mimetype'])
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                cache.set(namespace, key, {
+                    'body': response.get_data(as_text=True),
+                    'status': response.status_code,
+                    'mimetype': response.mimetype,
+                })
+            return response
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    """Configure the shared cache from app.config"""
+    app.config.setdefault('RESPONSE_CACHE_DIR', os.environ.get('TRANSPORT_CACHE_DIR') or None)
+    app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES',
+                          int(os.environ.get('TRANSPORT_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)))
+    app.config.setdefault('RESPONSE_CACHE_TTLS', {})
+    configure(app.config['RESPONSE_CACHE_DIR'], app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+              app.config['RESPONSE_CACHE_TTLS'])
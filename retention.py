@@ -0,0 +1,390 @@
+"""
+Retention for hourly passenger demand: monthly partitions, rollups and pruning.
+
+passenger_demand is the hot partition: every writer upserts into it and the
+rollup triggers fire there. Once a whole month is older than hot_days, its
+rows are moved a day at a time into passenger_demand_YYYY_MM, a WITHOUT
+ROWID table clustered by (route_id, date_recorded, hour), so the hot table
+and its indexes stay a few weeks deep. The passenger_demand_all view is a
+UNION ALL of the hot table and every partition; it is rebuilt whenever a
+partition is created or dropped, and readers that want history use it.
+
+Once a month is older than raw_days, its daily rollups are folded into
+demand_route_weekly_rollup and the partition is dropped with one DROP TABLE.
+Freed pages are reused, so the file stops growing. Daily and hourly rollups
+are kept for daily_days (0 keeps them forever); weekly rollups are kept
+forever. Partitions are listed in demand_partitions.
+
+Every step is one short transaction, so compaction can run in the background
+next to live writes. Writers call unseal_days() before writing late rows
+for an already sealed day: the day moves back into the hot table, so
+accumulated counts add onto the sealed totals and the view never holds an
+hour twice. The next compaction seals it again and rebuilds its rollups.
+
+    python retention.py             # run every due compaction step
+    python retention.py --status    # show partitions and the next step
+"""
+
+import argparse
+import os
+from datetime import date, timedelta
+
+import metrics
+import rollups
+from database import DEMAND_VIEW, transaction
+
+DEFAULT_HOT_DAYS = 45
+DEFAULT_RAW_DAYS = 400
+DEFAULT_DAILY_DAYS = 800
+
+PARTITION_COLUMNS = ('route_id', 'date_recorded', 'hour', 'day_of_week', 'passenger_count', 'is_predicted',
+                     'weather_factor', 'festival_factor', 'market_factor', 'confidence_score')
+PARTITION_COLUMNS_SQL = ', '.join(PARTITION_COLUMNS)
+
+# Rows sampled per index when refreshing a partition's planner statistics
+ANALYSIS_LIMIT = 400
+
+SEALED = 'sealed'
+DROPPING = 'dropping'
+COMPACTED = 'compacted'
+
+
+def month_bounds(month):
+    """First and last date of a 'YYYY-MM' month"""
+    first = date.fromisoformat(f'{month}-01')
+    following = (first + timedelta(days=31)).replace(day=1)
+    return first, following - timedelta(days=1)
+
+
+def partition_table(month):
+    return f"passenger_demand_{month.replace('-', '_')}"
+
+
+class RetentionPolicy:
+    """How long hourly rows stay hot, stay raw at all, and how long daily rollups are kept"""
+
+    def __init__(self, hot_days=DEFAULT_HOT_DAYS, raw_days=DEFAULT_RAW_DAYS, daily_days=DEFAULT_DAILY_DAYS):
+        if not 0 < hot_days <= raw_days:
+            raise ValueError("Retention needs 0 < hot_days <= raw_days")
+        # Weekly rollups are built from daily ones when a month's raw rows are dropped
+        if daily_days and daily_days < raw_days + 31:
+            raise ValueError("daily_days must be 0 (keep forever) or at least raw_days + 31")
+        self.hot_days = hot_days
+        self.raw_days = raw_days
+        self.daily_days = daily_days
+
+    def seal_before(self, today):
+        """Days before this leave the hot table (whole months only)"""
+        return (today - timedelta(days=self.hot_days)).replace(day=1)
+
+    def raw_before(self, today):
+        """Hourly rows before this are dropped (whole months only)"""
+        return (today - timedelta(days=self.raw_days)).replace(day=1)
+
+    def daily_before(self, today):
+        """Daily and hourly rollups before this are deleted, or None to keep them"""
+        return today - timedelta(days=self.daily_days) if self.daily_days else None
+
+    def to_dict(self):
+        return {'hot_days': self.hot_days, 'raw_days': self.raw_days, 'daily_days': self.daily_days}
+
+
+def rebuild_view(cursor):
+    """Recreate passenger_demand_all over the hot table and every partition still holding rows"""
+    tables = ['passenger_demand'] + [row[0] for row in cursor.execute(f"""
+    SELECT table_name FROM demand_partitions
+    WHERE table_name IS NOT NULL AND state != '{COMPACTED}' ORDER BY month
+    """)]
+    cursor.execute(f"DROP VIEW IF EXISTS {DEMAND_VIEW}")
+    cursor.execute(f"CREATE VIEW {DEMAND_VIEW} AS " + "\nUNION ALL ".join(
+        f"SELECT {PARTITION_COLUMNS_SQL} FROM {table}" for table in tables))
+
+
+def _create_partition(cursor, month):
+    table = partition_table(month)
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        route_id TEXT NOT NULL,
+        date_recorded DATE NOT NULL,
+        hour INTEGER NOT NULL,
+        day_of_week INTEGER NOT NULL,
+        passenger_count INTEGER NOT NULL,
+        is_predicted BOOLEAN DEFAULT FALSE,
+        weather_factor REAL DEFAULT 1.0,
+        festival_factor REAL DEFAULT 1.0,
+        market_factor REAL DEFAULT 1.0,
+        confidence_score REAL DEFAULT 0.8,
+        PRIMARY KEY (route_id, date_recorded, hour)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+    INSERT INTO demand_partitions (month, table_name, state) VALUES (?, ?, ?)
+    ON CONFLICT (month) DO UPDATE SET table_name = excluded.table_name, state = excluded.state
+    """, (month, table, SEALED))
+    rebuild_view(cursor)
+    return table
+
+
+def _analyze(cursor, table):
+    """
+    Sampled statistics let date-range reads over all routes skip-scan the
+    (route_id, date_recorded, hour) key instead of reading the whole partition
+    """
+    limit = cursor.execute("PRAGMA analysis_limit").fetchone()[0]
+    cursor.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    cursor.execute(f"ANALYZE {table}")
+    cursor.execute(f"PRAGMA analysis_limit = {limit}")
+
+
+def seal_day(cursor, day):
+    """Move one day of hourly rows from the hot table into its month's partition"""
+    month = day[:7]
+    row = cursor.execute("SELECT table_name, sealed_through FROM demand_partitions WHERE month = ?",
+                         (month,)).fetchone()
+    table, sealed_through = row if row else (None, None)
+    if table is None:
+        table = _create_partition(cursor, month)
+    moved = cursor.execute(f"""
+    INSERT OR REPLACE INTO {table} ({PARTITION_COLUMNS_SQL})
+    SELECT {PARTITION_COLUMNS_SQL} FROM passenger_demand WHERE date_recorded = ?
+    """, (day,)).rowcount
+    cursor.execute("DELETE FROM passenger_demand WHERE date_recorded = ?", (day,))
+    _analyze(cursor, table)
+    cursor.execute("""
+    UPDATE demand_partitions
+    SET rows_sealed = rows_sealed + ?, sealed_through = MAX(COALESCE(sealed_through, ''), ?),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE month = ?
+    """, (moved, day, month))
+    if sealed_through and day <= sealed_through:
+        # Late rows replaced sealed ones; the triggers counted both, so recount the day
+        rollups.refresh_demand_rollups(cursor, day, day)
+    return moved
+
+
+def unseal_days(cursor, days):
+    """Move the given days that are sealed in a partition back into the hot table; returns rows moved"""
+    sealed = {month: (table, through) for month, table, through in cursor.execute(f"""
+    SELECT month, table_name, sealed_through FROM demand_partitions
+    WHERE state = '{SEALED}' AND table_name IS NOT NULL
+    """)}
+    moved = 0
+    for day in sorted(set(days)):
+        table, through = sealed.get(day[:7], (None, None))
+        if table is None or through is None or day > through:
+            continue
+        # Rows already written late for the day are newer than the sealed ones
+        count = cursor.execute(f"""
+        INSERT INTO passenger_demand ({PARTITION_COLUMNS_SQL})
+        SELECT {PARTITION_COLUMNS_SQL} FROM {table} WHERE date_recorded = ?
+        ON CONFLICT (route_id, date_recorded, hour) DO NOTHING
+        """, (day,)).rowcount
+        removed = cursor.execute(f"DELETE FROM {table} WHERE date_recorded = ?", (day,)).rowcount
+        cursor.execute("""
+        UPDATE demand_partitions SET rows_sealed = MAX(rows_sealed - ?, 0), updated_at = CURRENT_TIMESTAMP
+        WHERE month = ?
+        """, (removed, day[:7]))
+        # The insert triggers counted the moved rows a second time
+        rollups.refresh_demand_rollups(cursor, day, day)
+        moved += count
+    return moved
+
+
+def drop_day(cursor, day):
+    """Delete one day of hourly rows that is already past the raw window"""
+    cursor.execute(f"""
+    INSERT INTO demand_partitions (month, state) VALUES (?, '{DROPPING}')
+    ON CONFLICT (month) DO NOTHING
+    """, (day[:7],))
+    return cursor.execute("DELETE FROM passenger_demand WHERE date_recorded = ?", (day,)).rowcount
+
+
+def compact_month(cursor, month):
+    """Fold a month's daily rollups into weekly ones and drop its hourly partition"""
+    first, last = month_bounds(month)
+    # A week that spans two months gets each month's days added when that month is compacted
+    weeks = cursor.execute("""
+    INSERT INTO demand_route_weekly_rollup (route_id, week_start, passengers, days_recorded, hours_recorded)
+    SELECT route_id, date(date_recorded, '-6 days', 'weekday 1') AS week, SUM(passengers), COUNT(*),
+           SUM(hours_recorded)
+    FROM demand_route_daily_rollup WHERE date_recorded BETWEEN ? AND ?
+    GROUP BY route_id, week
+    ON CONFLICT (route_id, week_start) DO UPDATE SET
+        passengers = passengers + excluded.passengers,
+        days_recorded = days_recorded + excluded.days_recorded,
+        hours_recorded = hours_recorded + excluded.hours_recorded
+    """, (first.isoformat(), last.isoformat())).rowcount
+    table = cursor.execute("SELECT table_name FROM demand_partitions WHERE month = ?", (month,)).fetchone()[0]
+    cursor.execute(f"""
+    UPDATE demand_partitions SET state = '{COMPACTED}', table_name = NULL, updated_at = CURRENT_TIMESTAMP
+    WHERE month = ?
+    """, (month,))
+    if table is not None:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        rebuild_view(cursor)
+    return weeks
+
+
+def prune_rollups(cursor, month, before):
+    """Delete one month's daily and hourly rollups that are older than before"""
+    first, last = month_bounds(month)
+    dates = (first.isoformat(), min(last, before - timedelta(days=1)).isoformat())
+    deleted = cursor.execute("DELETE FROM demand_route_daily_rollup WHERE date_recorded BETWEEN ? AND ?",
+                             dates).rowcount
+    cursor.execute("DELETE FROM demand_hourly_rollup WHERE date_recorded BETWEEN ? AND ?", dates)
+    return deleted
+
+
+STEPS = {
+    'drop_day': drop_day,
+    'compact_month': compact_month,
+    'seal_day': seal_day,
+    'prune_rollups': prune_rollups,
+}
+
+
+def next_step(conn, policy, today):
+    """The next due step as (action, args), or None; every lookup is an index seek"""
+    raw_before = policy.raw_before(today).isoformat()
+    oldest = conn.execute("SELECT MIN(date_recorded) FROM passenger_demand").fetchone()[0]
+    if oldest and oldest < raw_before:
+        return 'drop_day', (oldest,)
+    row = conn.execute(f"""
+    SELECT month FROM demand_partitions WHERE state != '{COMPACTED}' AND month < ? ORDER BY month LIMIT 1
+    """, (raw_before[:7],)).fetchone()
+    if row:
+        return 'compact_month', (row[0],)
+    if oldest and oldest < policy.seal_before(today).isoformat():
+        return 'seal_day', (oldest,)
+    daily_before = policy.daily_before(today)
+    if daily_before is not None:
+        # The hourly rollup is keyed by date first, so its minimum is cheap; both are pruned together
+        oldest_rollup = conn.execute("SELECT MIN(date_recorded) FROM demand_hourly_rollup").fetchone()[0]
+        if oldest_rollup and oldest_rollup < daily_before.isoformat():
+            return 'prune_rollups', (oldest_rollup[:7], daily_before)
+    return None
+
+
+def _estimate_steps(conn, policy, today):
+    """Rough number of steps due, for progress reporting"""
+    oldest = conn.execute("SELECT MIN(date_recorded) FROM passenger_demand").fetchone()[0]
+    days = max(0, (policy.seal_before(today) - date.fromisoformat(oldest)).days) if oldest else 0
+    months = conn.execute(f"SELECT COUNT(*) FROM demand_partitions WHERE state != '{COMPACTED}'").fetchone()[0]
+    return days + months + 1
+
+
+def compact(conn, policy=None, today=None, max_steps=None, progress=None):
+    """
+    Run due steps, one transaction each, until none is left or max_steps
+    have run. Returns {'steps', 'remaining', <action>: count, 'rows_sealed',
+    'rows_dropped'}.
+    """
+    policy = policy or get_policy()
+    today = today or date.today()
+    summary = dict.fromkeys(STEPS, 0)
+    summary.update(steps=0, rows_sealed=0, rows_dropped=0, remaining=False)
+    estimate = _estimate_steps(conn, policy, today) if progress else None
+    while True:
+        step = next_step(conn, policy, today)
+        if step is None:
+            break
+        if max_steps is not None and summary['steps'] >= max_steps:
+            summary['remaining'] = True
+            break
+        action, args = step
+        with metrics.profiled(f'retention:{action}'), transaction(conn) as cursor:
+            count = STEPS[action](cursor, *args)
+        summary[action] += 1
+        summary['steps'] += 1
+        if action == 'seal_day':
+            summary['rows_sealed'] += count
+        elif action == 'drop_day':
+            summary['rows_dropped'] += count
+        if progress:
+            progress(min(0.99, summary['steps'] / max(estimate, summary['steps'] + 1)), f"{action} {args[0]}")
+    return summary
+
+
+def status(conn, policy=None, today=None):
+    """Policy, partitions, hot-table range and the next due step"""
+    policy = policy or get_policy()
+    today = today or date.today()
+    columns = ('month', 'table_name', 'state', 'rows_sealed', 'sealed_through', 'updated_at')
+    partitions = [dict(zip(columns, row)) for row in conn.execute(
+        f"SELECT {', '.join(columns)} FROM demand_partitions ORDER BY month")]
+    first, last = conn.execute("SELECT MIN(date_recorded), MAX(date_recorded) FROM passenger_demand").fetchone()
+    step = next_step(conn, policy, today)
+    return {
+        'policy': policy.to_dict(),
+        'hot': {'first_date': first, 'last_date': last},
+        'partitions': partitions,
+        'weekly_from': conn.execute("SELECT MIN(week_start) FROM demand_route_weekly_rollup").fetchone()[0],
+        'next_step': None if step is None else {'action': step[0], 'month_or_day': step[1][0]},
+    }
+
+
+_policy = None
+
+
+def configure(hot_days=DEFAULT_HOT_DAYS, raw_days=DEFAULT_RAW_DAYS, daily_days=DEFAULT_DAILY_DAYS):
+    """Set (or replace) the process-wide retention policy"""
+    global _policy
+    _policy = RetentionPolicy(hot_days, raw_days, daily_days)
+    return _policy
+
+
+def get_policy():
+    if _policy is None:
+        return configure()
+    return _policy
+
+
+def _env_days():
+    """hot, raw and daily windows from TRANSPORT_RETENTION_{HOT,RAW,DAILY}_DAYS"""
+    return (int(os.environ.get('TRANSPORT_RETENTION_HOT_DAYS', DEFAULT_HOT_DAYS)),
+            int(os.environ.get('TRANSPORT_RETENTION_RAW_DAYS', DEFAULT_RAW_DAYS)),
+            int(os.environ.get('TRANSPORT_RETENTION_DAILY_DAYS', DEFAULT_DAILY_DAYS)))
+
+
+def init_app(app):
+    """Configure the retention policy from RETENTION_* settings"""
+    hot_days, raw_days, daily_days = _env_days()
+    app.config.setdefault('RETENTION_HOT_DAYS', hot_days)
+    app.config.setdefault('RETENTION_RAW_DAYS', raw_days)
+    app.config.setdefault('RETENTION_DAILY_DAYS', daily_days)
+    app.config.setdefault('RETENTION_NIGHTLY_MAX_STEPS', None)
+    return configure(app.config['RETENTION_HOT_DAYS'], app.config['RETENTION_RAW_DAYS'],
+                     app.config['RETENTION_DAILY_DAYS'])
+
+
+def main():
+    from database import get_pool
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--status', action='store_true', help='show partitions and the next step only')
+    parser.add_argument('--max-steps', type=int, default=None)
+    args = parser.parse_args()
+
+    policy = configure(*_env_days())
+    with get_pool().connection() as conn:
+        if args.status:
+            info = status(conn, policy)
+            print(f"🗄️  Hot rows {info['hot']['first_date']} .. {info['hot']['last_date']}, "
+                  f"policy {info['policy']}")
+            for partition in info['partitions']:
+                print(f"   {partition['month']}  {partition['state']:<9} {partition['rows_sealed']:>10,} rows")
+            print(f"⏭️  Next step: {info['next_step']}")
+            return
+        # Days still missing from the demand cube are exported before their hourly rows can go
+        import demand_cube
+        demand_cube.sync(conn)
+        summary = compact(conn, policy, max_steps=args.max_steps)
+    print(f"🧹 Ran {summary['steps']} steps: sealed {summary['seal_day']} days ({summary['rows_sealed']:,} rows), "
+          f"dropped {summary['rows_dropped']:,} expired rows, compacted {summary['compact_month']} months, "
+          f"pruned rollups for {summary['prune_rollups']} months")
+    if summary['remaining']:
+        print("⏭️  More steps are due; run again to continue")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Helpers for the trigger-maintained rollup tables.
+
+Triggers keep the rollups current row by row. Bulk loaders that write
+hundreds of thousands of rows can instead suspend the rollup triggers inside
+their own transaction and rebuild the affected date range with one GROUP BY,
+which is much cheaper than per-row upserts. Trigger DDL is transactional, so
+other connections never see the triggers missing.
+"""
+
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from database import DEMAND_VIEW
+
+
+def retained_from(cursor):
+    """First date that may still have hourly rows; older months were compacted away"""
+    month = cursor.execute("""
+    SELECT MAX(month) FROM demand_partitions WHERE state IN ('dropping', 'compacted')
+    """).fetchone()[0]
+    if month is None:
+        return ''
+    return (date.fromisoformat(f'{month}-01') + timedelta(days=31)).replace(day=1).isoformat()
+
+
+def refresh_demand_rollups(cursor, start_date, end_date):
+    """
+    Rebuild demand rollups for dates in [start_date, end_date] from raw rows
+    in every partition. Dates whose hourly rows were pruned keep their rollups.
+    """
+    dates = (max(str(start_date), retained_from(cursor)), str(end_date))
+    cursor.execute("DELETE FROM demand_hourly_rollup WHERE date_recorded BETWEEN ? AND ?", dates)
+    cursor.execute(f"""
+    INSERT INTO demand_hourly_rollup (date_recorded, hour, passengers, route_hours)
+    SELECT date_recorded, hour, SUM(passenger_count), COUNT(*)
+    FROM {DEMAND_VIEW} WHERE date_recorded BETWEEN ? AND ?
+    GROUP BY date_recorded, hour
+    """, dates)
+    cursor.execute("DELETE FROM demand_route_daily_rollup WHERE date_recorded BETWEEN ? AND ?", dates)
+    cursor.execute(f"""
+    INSERT INTO demand_route_daily_rollup (route_id, date_recorded, passengers, hours_recorded)
+    SELECT route_id, date_recorded, SUM(passenger_count), COUNT(*)
+    FROM {DEMAND_VIEW} WHERE date_recorded BETWEEN ? AND ?
+    GROUP BY route_id, date_recorded
+    """, dates)
+
+
+def refresh_prediction_rollups(cursor, start_date, end_date):
+    """Rebuild prediction rollups for dates in [start_date, end_date]"""
+    dates = (str(start_date), str(end_date))
+    cursor.execute("DELETE FROM prediction_route_daily_rollup WHERE prediction_date BETWEEN ? AND ?", dates)
+    cursor.execute("""
+    INSERT INTO prediction_route_daily_rollup
+    (route_id, prediction_date, predicted_passengers, bus_hours, estimated_cost)
+    SELECT route_id, prediction_date, SUM(predicted_passengers), SUM(recommended_buses), SUM(cost_per_hour)
+    FROM daily_schedule_predictions WHERE prediction_date BETWEEN ? AND ?
+    GROUP BY route_id, prediction_date
+    """, dates)
+
+
+ROLLUP_TRIGGER_PATTERN = 'trg_%_rollup'
+
+
+@contextmanager
+def deferred(cursor, demand_range=None, prediction_range=None):
+    """
+    Suspend rollup triggers for a bulk write inside an open transaction.
+
+    On exit the given (start_date, end_date) ranges are rebuilt and the
+    triggers recreated; on error the caller's rollback restores them.
+    """
+    tables = []
+    if demand_range:
+        tables.append('passenger_demand')
+    if prediction_range:
+        tables.append('daily_schedule_predictions')
+    placeholders = ', '.join('?' * len(tables))
+    triggers = cursor.execute(f"""
+    SELECT name, sql FROM sqlite_master
+    WHERE type = 'trigger' AND name LIKE ? AND tbl_name IN ({placeholders})
+    """, (ROLLUP_TRIGGER_PATTERN, *tables)).fetchall()
+
+    for name, _ in triggers:
+        cursor.execute(f"DROP TRIGGER {name}")
+    yield cursor
+    if demand_range:
+        refresh_demand_rollups(cursor, *demand_range)
+    if prediction_range:
+        refresh_prediction_rollups(cursor, *prediction_range)
+    for _, sql in triggers:
+        cursor.execute(sql)
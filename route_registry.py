@@ -0,0 +1,154 @@
+"""
+In-memory, array-backed registry of route metadata.
+
+Routes, their 24-hour base profiles and market-day calendars are loaded from
+the database once into NumPy arrays. Triggers bump a version counter whenever
+any of those tables change, so every process reloads the registry on its next
+lookup after an edit (or immediately after invalidate()).
+"""
+
+import threading
+
+import numpy as np
+
+from database import transaction
+
+HOURS_PER_DAY = 24
+MARKET_DAY_FACTOR = 1.3
+
+UPSERT_ROUTE = """
+INSERT INTO routes (id, name, distance, travel_time, current_buses, daily_passengers)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    name = excluded.name,
+    distance = excluded.distance,
+    travel_time = excluded.travel_time,
+    current_buses = excluded.current_buses,
+    daily_passengers = excluded.daily_passengers
+"""
+
+
+class RouteRegistry:
+    """Immutable snapshot of routes with per-route arrays aligned by index"""
+
+    def __init__(self, route_ids, names, distances, travel_times, current_buses,
+                 base_patterns, market_mask, version=0):
+        self.route_ids = list(route_ids)
+        self.names = list(names)
+        self.distances = np.asarray(distances, dtype=np.float64)
+        self.travel_times = np.asarray(travel_times, dtype=np.int64)
+        self.current_buses = np.asarray(current_buses, dtype=np.int64)
+        self.base_patterns = np.asarray(base_patterns, dtype=np.float64).reshape(-1, HOURS_PER_DAY)
+        self.market_mask = np.asarray(market_mask, dtype=bool).reshape(-1, 7)
+        self.version = version
+        self.index = {route_id: i for i, route_id in enumerate(self.route_ids)}
+
+    def __len__(self):
+        return len(self.route_ids)
+
+    def __contains__(self, route_id):
+        return route_id in self.index
+
+    def unknown(self, route_ids):
+        """Return the ids that are not in the registry"""
+        return [route_id for route_id in route_ids if route_id not in self.index]
+
+    def subset(self, route_ids):
+        """Registry restricted to route_ids, in the given order"""
+        rows = np.array([self.index[route_id] for route_id in route_ids], dtype=np.int64)
+        return RouteRegistry(
+            route_ids, [self.names[i] for i in rows], self.distances[rows], self.travel_times[rows],
+            self.current_buses[rows], self.base_patterns[rows], self.market_mask[rows], self.version,
+        )
+
+    def market_days(self, route_id):
+        """Weekday numbers with a market on this route"""
+        return np.flatnonzero(self.market_mask[self.index[route_id]]).tolist()
+
+    def market_factor(self, dates, factor=MARKET_DAY_FACTOR):
+        """(routes, days) market multiplier for the given dates"""
+        weekdays = np.array([day.weekday() for day in dates], dtype=np.int64)
+        return np.where(self.market_mask[:, weekdays], factor, 1.0)
+
+
+def registry_version(conn):
+    """Current route-data version counter maintained by triggers"""
+    row = conn.execute("SELECT version FROM route_registry_version WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def load_registry(conn):
+    """Read every route and its profile/market calendar into a RouteRegistry"""
+    version = registry_version(conn)
+    routes = conn.execute("""
+    SELECT id, name, distance, travel_time, current_buses FROM routes ORDER BY id
+    """).fetchall()
+    index = {row[0]: i for i, row in enumerate(routes)}
+
+    base_patterns = np.zeros((len(routes), HOURS_PER_DAY), dtype=np.float64)
+    for route_id, hour, base_demand in conn.execute(
+            "SELECT route_id, hour, base_demand FROM route_base_profiles"):
+        if route_id in index:
+            base_patterns[index[route_id], hour] = base_demand
+
+    market_mask = np.zeros((len(routes), 7), dtype=bool)
+    for route_id, day_of_week in conn.execute("SELECT route_id, day_of_week FROM route_market_days"):
+        if route_id in index:
+            market_mask[index[route_id], day_of_week] = True
+
+    columns = list(zip(*routes)) if routes else [[]] * 5
+    return RouteRegistry(columns[0], columns[1], columns[2], columns[3], columns[4],
+                         base_patterns, market_mask, version)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry(conn):
+    """Return the cached registry, reloading it if route data changed"""
+    global _registry
+    version = registry_version(conn)
+    registry = _registry
+    if registry is not None and registry.version == version:
+        return registry
+    with _registry_lock:
+        if _registry is None or _registry.version != version:
+            _registry = load_registry(conn)
+        return _registry
+
+
+def invalidate():
+    """Drop the cached registry so the next lookup reloads it"""
+    global _registry
+    with _registry_lock:
+        _registry = None
+
+
+def save_route(cursor, route, base_pattern=None, market_days=None):
+    """
+    Insert or update a route with its profile and market days.
+
+    route is an (id, name, distance, travel_time, current_buses,
+    daily_passengers) tuple; base_pattern and market_days replace the stored
+    values when given.
+    """
+    route_id = route[0]
+    cursor.execute(UPSERT_ROUTE, route)
+    if base_pattern is not None:
+        cursor.executemany("""
+        INSERT INTO route_base_profiles (route_id, hour, base_demand) VALUES (?, ?, ?)
+        ON CONFLICT (route_id, hour) DO UPDATE SET base_demand = excluded.base_demand
+        """, [(route_id, hour, int(value)) for hour, value in enumerate(base_pattern)])
+    if market_days is not None:
+        cursor.execute("DELETE FROM route_market_days WHERE route_id = ?", (route_id,))
+        cursor.executemany("INSERT INTO route_market_days (route_id, day_of_week) VALUES (?, ?)",
+                           [(route_id, int(day)) for day in sorted(set(market_days))])
+
+
+def save_routes(conn, routes):
+    """Save several (route, base_pattern, market_days) entries in one transaction"""
+    with transaction(conn) as cursor:
+        for route, base_pattern, market_days in routes:
+            save_route(cursor, route, base_pattern, market_days)
+    invalidate()
@@ -0,0 +1,91 @@
+"""
+Demo route data and the built-in event calendar used to seed a database.
+
+Once seeded, routes live in the routes, route_base_profiles and
+route_market_days tables and events in the events table (loaded by
+migration 8); nothing at request time reads these constants.
+Server startup only creates the schema; load the demo users, routes and
+history with:
+
+    python seed_data.py            # 30 days of demand history
+    python seed_data.py --days 90
+"""
+
+import argparse
+import time
+
+# (id, name, distance km, travel_time minutes, current_buses, daily_passengers)
+DEMO_ROUTES = [
+    ('tp_pc', 'Tiruppur to Pollachi', 85, 120, 12, 2800),
+    ('tp_cb', 'Tiruppur to Coimbatore', 65, 90, 18, 4200),
+    ('tp_sl', 'Tiruppur to Salem', 113, 150, 15, 3500),
+]
+
+# Typical 24-hour passenger profile for each route
+DEMO_BASE_PROFILES = {
+    'tp_pc': [35, 25, 15, 10, 20, 60, 140, 380, 320, 180, 150, 130, 115, 100, 90, 75, 220, 450, 350, 240, 140, 90, 60, 45],
+    'tp_cb': [50, 35, 25, 20, 30, 90, 200, 580, 460, 280, 220, 190, 165, 145, 125, 110, 320, 620, 520, 360, 220, 150, 90, 70],
+    'tp_sl': [40, 30, 22, 18, 28, 75, 175, 440, 380, 240, 195, 165, 145, 125, 110, 95, 280, 500, 400, 290, 185, 125, 75, 55],
+}
+
+# Market days for each route (0 = Monday)
+DEMO_MARKET_DAYS = {
+    'tp_pc': [1, 4],  # Tuesday, Friday
+    'tp_cb': [0, 2, 5],  # Monday, Wednesday, Saturday
+    'tp_sl': [2, 5],  # Wednesday, Saturday
+}
+
+# Tamil Nadu festivals and events 2025-2026:
+# (name, type, start_date, end_date, multiplier, lead_days, trail_days)
+DEFAULT_EVENTS = [
+    # September 2025
+    ('Ganesh Chaturthi', 'major', '2025-09-12', '2025-09-12', 1.8, 0, 0),
+    ('Onam', 'regional', '2025-09-17', '2025-09-17', 1.5, 0, 0),
+    # October 2025
+    ('Gandhi Jayanti', 'national', '2025-10-02', '2025-10-02', 1.4, 0, 0),
+    ('Vijaya Dashami', 'major', '2025-10-12', '2025-10-12', 1.7, 0, 0),
+    ('Halloween', 'cultural', '2025-10-31', '2025-10-31', 1.2, 0, 0),
+    # November 2025
+    ('Diwali', 'major', '2025-11-01', '2025-11-01', 1.9, 0, 0),
+    ('Karthikai Deepam', 'regional', '2025-11-15', '2025-11-15', 1.6, 0, 0),
+    # December 2025
+    ('Christmas', 'national', '2025-12-25', '2025-12-25', 1.5, 0, 0),
+    ('New Year Eve', 'celebration', '2025-12-31', '2025-12-31', 1.8, 0, 0),
+    # 2026 events
+    ('Thai Pusam', 'regional', '2026-01-14', '2026-01-14', 1.7, 0, 0),
+    ('Republic Day', 'national', '2026-01-26', '2026-01-26', 1.4, 0, 0),
+    ('Maha Shivratri', 'religious', '2026-02-13', '2026-02-13', 1.5, 0, 0),
+    ('Holi', 'national', '2026-03-13', '2026-03-13', 1.6, 0, 0),
+    ('Tamil New Year', 'regional', '2026-04-14', '2026-04-14', 1.8, 0, 0),
+    ('Independence Day', 'national', '2026-08-15', '2026-08-15', 1.4, 0, 0),
+    # Special events
+    ('Global Investors Meet TN', 'economic', '2025-12-01', '2025-12-01', 1.3, 0, 0),
+    ('Auto Expo Chennai', 'industrial', '2026-01-20', '2026-01-20', 1.4, 0, 0),
+]
+
+
+def main():
+    from enhanced_backend_server_2025 import prepare_database, seed_demo_data, user_count
+
+    parser = argparse.ArgumentParser(description='Load demo users, routes and demand history')
+    parser.add_argument('--days', type=int, default=30, help='days of demand history to generate')
+    parser.add_argument('--if-empty', action='store_true', help='do nothing when users already exist')
+    args = parser.parse_args()
+
+    created, applied = prepare_database()
+    if created:
+        print("✅ Database schema created")
+    for version, description in applied:
+        print(f"🛠️  Applied schema migration {version}: {description}")
+    if args.if_empty and user_count():
+        print("👥 Users already exist; nothing to seed")
+        return
+
+    started = time.perf_counter()
+    seed_demo_data(args.days)
+    print(f"🌱 Seeded {len(DEMO_ROUTES)} demo routes, {user_count()} users and {args.days} days of history "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Production server for the Transport Optimizer.
+
+Runs the app under gunicorn with gthread workers: --workers processes of
+--threads threads each (defaults: one process per core, 4 threads). The
+master creates or migrates the database once under a file lock before
+forking; each worker then resumes queued jobs and schedules the nightly
+update, and pools its /metrics totals with the others in
+TRANSPORT_METRICS_DIR (default <database name>_metrics), where the master
+folds each exited worker's totals into one aggregate file. Each open
+/api/live-stream tab holds one thread, so a worker accepts at most
+TRANSPORT_LIVE_MAX_STREAMS streams (default: half its threads) and answers
+the rest with 503, after which the dashboard polls; raise --threads to
+serve more streaming tabs. On SIGTERM workers
+stop accepting connections, finish in-flight requests and running jobs
+within --graceful-timeout, and close their connections. Without gunicorn
+(or with --server werkzeug) a single threaded werkzeug process serves
+instead.
+
+    python serve.py
+    python serve.py --workers 4 --threads 8 --bind 0.0.0.0:8000
+"""
+
+import argparse
+import os
+import signal
+import sys
+
+
+def parse_args(argv=None):
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bind', default=os.environ.get('TRANSPORT_BIND', '0.0.0.0:5000'),
+                        help='host:port to listen on (TRANSPORT_BIND)')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('TRANSPORT_WORKERS', cpus)),
+                        help='worker processes (TRANSPORT_WORKERS, default: CPU count)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('TRANSPORT_THREADS', 4)),
+                        help='threads per worker (TRANSPORT_THREADS, default 4)')
+    parser.add_argument('--timeout', type=int, default=120, help='seconds before a stuck worker is restarted')
+    parser.add_argument('--graceful-timeout', type=int, default=60,
+                        help='seconds to finish in-flight requests and jobs on shutdown')
+    parser.add_argument('--max-requests', type=int, default=0,
+                        help='recycle a worker after this many requests (0 = never)')
+    parser.add_argument('--access-log', default=None, help="access log file, or '-' for stdout")
+    parser.add_argument('--server', choices=('auto', 'gunicorn', 'werkzeug'), default='auto')
+    return parser.parse_args(argv)
+
+
+def share_cores(workers):
+    """Split the forecast process pool across workers unless it is set explicitly"""
+    if 'TRANSPORT_FORECAST_WORKERS' not in os.environ:
+        os.environ['TRANSPORT_FORECAST_WORKERS'] = str(max(1, (os.cpu_count() or 1) // max(workers, 1)))
+
+
+def share_threads(threads):
+    """Keep half of each worker's threads free of live streams unless the cap is set explicitly"""
+    if 'TRANSPORT_LIVE_MAX_STREAMS' not in os.environ:
+        os.environ['TRANSPORT_LIVE_MAX_STREAMS'] = str(max(1, threads // 2))
+
+
+def share_metrics():
+    """Have gunicorn workers pool /metrics totals in one directory, emptied at startup"""
+    import database
+    import metrics
+
+    path = os.environ.setdefault(metrics.METRICS_DIR_ENV,
+                                 f"{os.path.splitext(database.resolve_db_path())[0]}_metrics")
+    os.makedirs(path, exist_ok=True)
+    metrics.clear_shared_dir(path)
+
+
+def prepare():
+    import database
+    from enhanced_backend_server_2025 import prepare_database, user_count
+
+    created, applied = prepare_database()
+    if created:
+        print("✅ Database schema created")
+    for version, description in applied:
+        print(f"🛠️  Applied schema migration {version}: {description}")
+    if not user_count():
+        print("⚠️  No users yet; run python seed_data.py to load the demo logins and data")
+    # Workers fork from this process and must not inherit its connections
+    database.get_pool().close_all()
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    import enhanced_backend_server_2025 as server
+    import metrics
+
+    def post_worker_init(worker):
+        resumed = server.start_background_services()
+        if resumed:
+            worker.log.info("Resumed %d queued background jobs", len(resumed))
+
+    def worker_exit(arbiter, worker):
+        server.shutdown_background_services()
+
+    def child_exit(arbiter, worker):
+        # In the master, after the worker's final flush (or its crash): keep its totals, drop its file
+        metrics.retire_process(os.environ[metrics.METRICS_DIR_ENV], worker.pid)
+
+    class TransportApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return server.app
+
+    TransportApplication({
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': 5,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10,
+        'accesslog': args.access_log,
+        # The app is imported once in the master and shared copy-on-write
+        'preload_app': True,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+        'child_exit': child_exit,
+    }).run()
+
+
+def run_werkzeug(args):
+    from werkzeug.serving import run_simple
+
+    import enhanced_backend_server_2025 as server
+
+    if args.workers > 1:
+        print("⚠️  gunicorn is not installed; serving from a single process (pip install gunicorn)")
+    host, _, port = args.bind.rpartition(':')
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    server.start_background_services()
+    try:
+        run_simple(host or '0.0.0.0', int(port), server.app, threaded=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown_background_services()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    share_cores(args.workers)
+
+    server_kind = args.server
+    if server_kind == 'auto':
+        try:
+            import gunicorn  # noqa: F401
+            server_kind = 'gunicorn'
+        except ImportError:
+            server_kind = 'werkzeug'
+    if server_kind == 'gunicorn' and sys.platform == 'win32':
+        server_kind = 'werkzeug'
+
+    if server_kind == 'gunicorn':
+        share_threads(args.threads)
+        share_metrics()
+    prepare()
+    print(f"🚀 Serving on {args.bind} with {server_kind}: {args.workers} workers x {args.threads} threads")
+    if server_kind == 'gunicorn':
+        run_gunicorn(args)
+    else:
+        run_werkzeug(args)
+
+
+if __name__ == '__main__':
+    main()